@@ -5,6 +5,50 @@ The PCATS application programming interface (API) implements two Bayesian's non
 
 """
 
-from .pcats_api import job_status, staticgp, dynamicgp, uploadfile, wait_for_result, printgp, ploturl, staticgp_cate, dynamicgp_cate, results
+import importlib
+
+# Public names and the modules defining them. Modules are imported when a
+# name is first used (PEP 562), so importing the package does not load
+# requests or any optional backend.
+_EXPORTS = {
+    'pcats_api': ('PcatsClient', 'default_client', 'set_default_client',
+                  'job_status', 'staticgp', 'dynamicgp', 'uploadfile',
+                  'wait_for_result', 'printgp', 'ploturl', 'staticgp_cate',
+                  'dynamicgp_cate', 'results'),
+    'batch': ('submit_many', 'JobHandle'),
+    'sweep': ('Sweep', 'expand_grid'),
+    'cate': ('cate_many',),
+    'download': ('download_artifacts', 'Download'),
+    'upload_cache': ('UploadCache',),
+    'result_cache': ('ResultCache',),
+    'registry': ('JobRegistry',),
+    'preflight': ('PreflightError',),
+    'dataset': ('Dataset',),
+    'result': ('PcatsResult',),
+    'retry': ('RetryPolicy', 'CircuitBreaker', 'CircuitOpenError'),
+    'push': ('WebhookReceiver',),
+    'pool': ('EndpointPool',),
+    'limits': ('Scheduler', 'RateLimiter', 'JobBudget'),
+    'stream': ('stream_results',),
+}
+
+_MODULES = dict((name, module) for module, names in _EXPORTS.items()
+                for name in names)
+
+__all__ = sorted(_MODULES)
+
+
+def __getattr__(name):
+    module = _MODULES.get(name)
+    if module is None:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(
+            __name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_MODULES))
 
 # from .pcats_api_staticgp2 import staticgp2
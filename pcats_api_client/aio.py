@@ -0,0 +1,210 @@
+"""
+asyncio client for the PCATS REST API.
+
+Requires aiohttp (``pip install pcats_api_client[async]``).
+"""
+
+import asyncio
+import inspect
+import json
+
+import aiohttp
+
+from . import pcats_api
+from .pcats_api import DEFAULT_URL
+from .poller import Backoff
+
+
+def _bind(func, args, kwargs):
+    """Return the arguments of a call to func with defaults filled in"""
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    return bound.arguments
+
+
+def _form_data(fields):
+    """Convert requests style multipart fields to aiohttp FormData"""
+    form = aiohttp.FormData()
+    for name, (filename, value) in fields.items():
+        if value is None:
+            continue
+        if filename is not None:
+            form.add_field(name, value, filename=str(filename))
+        else:
+            form.add_field(name, value if isinstance(value, bytes)
+                           else str(value))
+    return form
+
+
+def _close_files(fields):
+    for filename, value in fields.values():
+        if hasattr(value, 'close'):
+            value.close()
+
+
+class AsyncPcatsClient(object):
+    """asyncio PCATS REST API client.
+
+    Mirrors the module level API with coroutines. Requests share one
+    aiohttp connection pool and the number of requests in flight is capped,
+    so a single event loop can submit and track thousands of jobs.
+
+    Parameters
+    ----------
+    base_url : string
+            PCATS server URL. The default value is https://pcats.research.cchmc.org.
+    token : string
+            Authentication token sent with every request unless a call
+            passes its own token.
+    max_concurrency : int
+            Maximum number of requests in flight at once.
+    backoff : Backoff
+            Status poll schedule used by wait_for_result.
+    timeout : float
+            Total timeout of a single request in seconds (None waits forever).
+    """
+
+    def __init__(self, base_url=DEFAULT_URL, token=None, max_concurrency=100,
+                 backoff=None, timeout=None):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.max_concurrency = max_concurrency
+        self.backoff = backoff if backoff is not None else Backoff()
+        self.timeout = timeout
+        self._semaphore = None
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """Close the underlying aiohttp session"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    def url(self, path):
+        return self.base_url + path
+
+    def headers(self, token=None, headers=None):
+        headers = dict(headers) if headers else dict()
+        token = token if token is not None else self.token
+        if token is not None:
+            headers["Authorization"] = "Bearer {}".format(token)
+        return headers
+
+    async def request(self, method, path, token=None, headers=None, **kwargs):
+        """Send a request and return (status code, body bytes)"""
+        session = self._get_session()
+        async with self._semaphore:
+            async with session.request(method, self.url(path),
+                                       headers=self.headers(token, headers),
+                                       **kwargs) as res:
+                return res.status, await res.read()
+
+    async def _json(self, method, path, key, **kwargs):
+        status, body = await self.request(method, path, **kwargs)
+        if status == 200:
+            res_json = json.loads(body.decode("utf-8"))
+            if key in res_json:
+                return res_json[key]
+        return None
+
+    async def _submit(self, path, fields, headers, token):
+        try:
+            return await self._json('POST', path, 'jobid',
+                                    data=_form_data(fields),
+                                    headers=headers, token=token)
+        finally:
+            _close_files(fields)
+
+    async def job_status(self, jobid):
+        """Return job status (see pcats_api_client.job_status)"""
+        if jobid is None:
+            return "Error"
+        return await self._json('GET', '/api/job/{}/status'.format(jobid),
+                                'status')
+
+    async def wait_for_result(self, jobid):
+        """Wait while the job status is pending (see pcats_api_client.wait_for_result)"""
+        if jobid is None:
+            return "Error"
+        attempt = 0
+        while True:
+            status = await self.job_status(jobid)
+            if status is None or status.startswith("Error"):
+                return "Error"
+            if status == "Done":
+                return status
+            await asyncio.sleep(self.backoff.delay(attempt))
+            attempt += 1
+
+    async def staticgp(self, *args, **kwargs):
+        """Submit a staticgp job (see pcats_api_client.staticgp)"""
+        p = _bind(pcats_api.staticgp, args, kwargs)
+        fields, headers = pcats_api._staticgp_form(p)
+        return await self._submit('/api/staticgp', fields, headers, p['token'])
+
+    async def dynamicgp(self, *args, **kwargs):
+        """Submit a dynamicgp job (see pcats_api_client.dynamicgp)"""
+        p = _bind(pcats_api.dynamicgp, args, kwargs)
+        fields, headers = pcats_api._dynamicgp_form(p)
+        return await self._submit('/api/dynamicgp', fields, headers, p['token'])
+
+    async def staticgp_cate(self, *args, **kwargs):
+        """Submit a staticgp CATE job (see pcats_api_client.staticgp_cate)"""
+        p = _bind(pcats_api.staticgp_cate, args, kwargs)
+        fields, headers = pcats_api._cate_form(p)
+        return await self._submit(
+            '/api/job/{}/staticgp.cate'.format(p['jobid']),
+            fields, headers, p['token'])
+
+    async def dynamicgp_cate(self, *args, **kwargs):
+        """Submit a dynamicgp CATE job (see pcats_api_client.dynamicgp_cate)"""
+        p = _bind(pcats_api.dynamicgp_cate, args, kwargs)
+        fields, headers = pcats_api._cate_form(p)
+        return await self._submit(
+            '/api/job/{}/dynamicgp.cate'.format(p['jobid']),
+            fields, headers, p['token'])
+
+    async def printgp(self, jobid, token=None):
+        """Return formatted job results (see pcats_api_client.printgp)"""
+        status, body = await self.request(
+            'GET', '/api/job/{}/print'.format(jobid), token=token)
+        return body.decode("utf-8")
+
+    async def results(self, jobid, token=None):
+        """Return job results (see pcats_api_client.results)"""
+        status, body = await self.request(
+            'GET', '/api/job/{}/results'.format(jobid), token=token)
+        return body.decode("utf-8")
+
+    async def uploadfile(self, datafile, token=None):
+        """Upload a file and return its reference (see pcats_api_client.uploadfile)"""
+        fields = {'data': (datafile, open(datafile, 'rb'))}
+        try:
+            return await self._json('POST', '/api/uploadfile', 'fileref',
+                                    data=_form_data(fields), token=token)
+        finally:
+            _close_files(fields)
+
+    async def ploturl(self, jobid, plottype=None):
+        """Return plot URL (see pcats_api_client.ploturl)"""
+        url = await self._json('GET', '/api/job/{}/ploturl'.format(jobid),
+                               'url')
+        if url is None:
+            return None
+        if plottype is not None:
+            return "{}/{}".format(url, plottype)
+        return url
@@ -0,0 +1,116 @@
+"""
+Batch job submission with bounded parallelism.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from . import pcats_api
+from .limits import RateLimiter
+
+
+class JobHandle(object):
+    """Handle of a job submitted by submit_many.
+
+    Attributes
+    ----------
+    params : dict
+            Parameters the job was submitted with.
+    future : concurrent.futures.Future
+            Resolves to the job ID once the submission returns.
+    method : string
+            Function the job was submitted with ("staticgp", "dynamicgp",
+            "staticgp_cate" or "dynamicgp_cate").
+    """
+
+    def __init__(self, params, future, client=None, method="staticgp"):
+        self.params = params
+        self.future = future
+        self.client = client
+        self.method = method
+
+    @property
+    def kind(self):
+        """Job category of the poller: "CATE" or the model method"""
+        if self.method.endswith('_cate'):
+            return 'CATE'
+        return self.params.get('method', 'BART')
+
+    def jobid(self, timeout=None):
+        """Return the job ID, waiting for the submission if needed"""
+        return self.future.result(timeout)
+
+    def done(self):
+        """Return True if the submission has returned"""
+        return self.future.done()
+
+    def status(self):
+        """Return the current job status"""
+        return pcats_api.job_status(self.jobid(), client=self.client)
+
+    def wait(self):
+        """Wait for the job to finish and return its final status"""
+        jobid = self.jobid()
+        if jobid is None:
+            return "Error"
+        return pcats_api._client(self.client).poller.wait(jobid,
+                                                          kind=self.kind)
+
+    def result(self, token=None):
+        """Wait for the job to finish and return its results"""
+        if self.wait() != "Done":
+            return None
+        return pcats_api.results(self.jobid(), token=token,
+                                 client=self.client)
+
+
+def submit_many(params,
+                method="staticgp",
+                max_workers=8,
+                rate=None,
+                client=None):
+    """Submit many jobs concurrently
+
+    Submit one staticgp or dynamicgp job per parameter dict on a thread pool.
+
+    Parameters
+    ----------
+    params : iterable of dict
+            Keyword arguments of each submission.
+    method : string
+            "staticgp", "dynamicgp", "staticgp_cate" or "dynamicgp_cate".
+            The default value is "staticgp".
+    max_workers : int
+            Maximum number of submissions in flight.
+    rate : float
+            Maximum number of submissions started per second (unlimited if None).
+    client : PcatsClient
+            Client to use (the shared default client if not given). Its
+            pool_maxsize should be at least max_workers.
+
+    Returns
+    -------
+    list of JobHandle
+        one handle per parameter dict, in input order
+    """
+
+    submit = {'staticgp': pcats_api.staticgp,
+              'dynamicgp': pcats_api.dynamicgp,
+              'staticgp_cate': pcats_api.staticgp_cate,
+              'dynamicgp_cate': pcats_api.dynamicgp_cate}[method]
+    limiter = RateLimiter(rate) if rate else None
+
+    def run(kwargs):
+        if limiter is not None:
+            limiter.acquire()
+        return submit(client=client, **kwargs)
+
+    handles = []
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for kwargs in params:
+            kwargs = dict(kwargs)
+            handles.append(JobHandle(kwargs, executor.submit(run, kwargs),
+                                     client=client, method=method))
+    finally:
+        executor.shutdown(wait=False)
+    return handles
@@ -0,0 +1,100 @@
+"""
+Conditional average treatment effects for many subgroups at once.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from . import pcats_api
+from .batch import submit_many
+from .result import columns
+
+_SPEC = ('x', 'control_tr', 'treat_tr', 'c_margin')
+
+
+def _specs(specs):
+    """Return the specs as distinct dicts, in input order"""
+    out = []
+    seen = set()
+    for spec in specs:
+        if not isinstance(spec, dict):
+            spec = dict(zip(_SPEC, spec))
+        spec = dict((name, spec.get(name)) for name in _SPEC)
+        key = repr(sorted(spec.items()))
+        if key not in seen:
+            seen.add(key)
+            out.append(spec)
+    return out
+
+
+def cate_many(jobid,
+              specs,
+              method="staticgp",
+              max_workers=8,
+              rate=None,
+              section="CATE",
+              token=None,
+              use_cache=None,
+              reuse_cached_jobid=None,
+              client=None):
+    """Estimate the CATE for many subgroups and contrasts of one fitted job
+
+    All CATE jobs are submitted concurrently against the parent job and
+    waited for by the client's background poller; their results are
+    fetched concurrently and combined into one table. With a result cache
+    on the client, child jobs submitted before with the same spec are
+    reused instead of submitted again.
+
+    Parameters
+    ----------
+    jobid : UUID
+            Job ID of the fitted staticgp or dynamicgp job.
+    specs : iterable
+            (x, control_tr, treat_tr) or (x, control_tr, treat_tr, c_margin)
+            tuples, or dicts with these keys. Duplicates are run once.
+    method : string
+            "staticgp" or "dynamicgp", the method of the parent job.
+    max_workers : int
+            Maximum number of requests in flight.
+    rate : float
+            Maximum number of submissions started per second.
+    section : string
+            Result section to combine. The default value is "CATE".
+    token : string
+            Authentication token.
+    use_cache, reuse_cached_jobid
+            As for staticgp_cate.
+    client : PcatsClient
+            Client to use (the shared default client if not given).
+
+    Returns
+    -------
+    dict
+        {column name: list of values}: x, control_tr, treat_tr, c_margin,
+        jobid and status of the CATE job followed by the columns of its
+        result section. A failed job has a single row without results.
+        Pass it to pandas.DataFrame for a data frame.
+    """
+    cli = pcats_api._client(client)
+    specs = _specs(specs)
+    params = [dict(spec, jobid=jobid, token=token, use_cache=use_cache,
+                   reuse_cached_jobid=reuse_cached_jobid) for spec in specs]
+    handles = submit_many(params, method=method + '_cate',
+                          max_workers=max_workers, rate=rate, client=cli)
+
+    def fetch(handle):
+        child = handle.jobid()
+        status = handle.wait()
+        result = None
+        if status == "Done":
+            result = pcats_api.results(child, token=token, client=cli,
+                                       parse=True)
+        return child, status, result
+
+    labelled = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for spec, (child, status, result) in zip(specs,
+                                                 executor.map(fetch, handles)):
+            labels = dict(spec, jobid=child, status=status)
+            records = result.records(section) if result is not None else []
+            labelled.append((labels, records or [dict()]))
+    return columns(labelled, _SPEC + ('jobid', 'status'))
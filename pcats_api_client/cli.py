@@ -0,0 +1,290 @@
+"""
+The pcats command line tool.
+
+    pcats run manifest.yaml -o results/
+
+A manifest (YAML or JSON) lists the jobs to run:
+
+    defaults:
+      token: ...
+    jobs:
+      - name: bart
+        endpoint: staticgp
+        datafile: data.csv
+        outcome: y
+        treatment: tr
+      - name: bart-x1
+        endpoint: staticgp_cate
+        parent: bart
+        x: x1
+        control_tr: 0
+        treat_tr: 1
+
+`endpoint` is staticgp, dynamicgp, staticgp_cate or dynamicgp_cate
+(default staticgp); the other keys are the arguments of that function.
+A default applies to the jobs whose function takes that argument.
+A CATE job names an earlier job as its `parent` (or gives its `jobid`).
+
+Every job ID and state change is appended to a journal next to the
+manifest, so a restarted run reattaches to jobs that were submitted
+before instead of submitting them again, and only downloads again the
+results of finished jobs it could not save.
+"""
+
+import argparse
+import inspect
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import pcats_api
+from .download import fetch
+
+ENDPOINTS = ('staticgp', 'dynamicgp', 'staticgp_cate', 'dynamicgp_cate')
+
+
+def load_manifest(path):
+    """Return the list of job dicts of a YAML or JSON manifest"""
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError('YAML manifests require PyYAML: '
+                                  'pip install pcats_api_client[yaml]')
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    defaults = manifest.get('defaults') or dict()
+    jobs = []
+    names = set()
+    for i, spec in enumerate(manifest.get('jobs') or []):
+        job = dict(spec)
+        job.setdefault('name', 'job{}'.format(i + 1))
+        job.setdefault('endpoint', 'staticgp')
+        if job['endpoint'] not in ENDPOINTS:
+            raise ValueError('job {}: unknown endpoint {}'.format(
+                job['name'], job['endpoint']))
+        accepted = inspect.signature(getattr(pcats_api,
+                                             job['endpoint'])).parameters
+        for name, value in defaults.items():
+            if name in accepted:
+                job.setdefault(name, value)
+        if job['name'] in names:
+            raise ValueError('duplicate job name {}'.format(job['name']))
+        if job['endpoint'].endswith('_cate'):
+            if job.get('parent') is None and job.get('jobid') is None:
+                raise ValueError('CATE job {} needs a parent or jobid'.format(
+                    job['name']))
+            if job.get('parent') is not None and job['parent'] not in names:
+                raise ValueError('job {}: parent {} must be listed before '
+                                 'it'.format(job['name'], job['parent']))
+        names.add(job['name'])
+        jobs.append(job)
+    return jobs
+
+
+class Journal(object):
+    """Append-only record of job IDs and states.
+
+    Each line is a JSON object {"name", "jobid", "status"}, with a
+    "download_error" when a job finished but its results could not be
+    saved; the last line of a job is its current state. Lines are flushed
+    to disk as they are written so that a crash loses at most the line
+    being written.
+
+    Parameters
+    ----------
+    path : string
+            Journal file, created if missing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.jobs = dict()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # torn last line of an interrupted run
+                        continue
+                    self.jobs[entry['name']] = entry
+        self.file = open(path, 'a')
+
+    def get(self, name):
+        return self.jobs.get(name) or {'name': name, 'jobid': None,
+                                       'status': None}
+
+    def record(self, name, jobid, status=None, download_error=None):
+        entry = {'name': name, 'jobid': jobid, 'status': status}
+        if download_error is not None:
+            entry['download_error'] = download_error
+        with self.lock:
+            self.jobs[name] = entry
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def run_manifest(jobs, outdir, journal, max_workers=8, token=None,
+                 client=None, log=None):
+    """Run jobs concurrently and download their results
+
+    Jobs the journal knows as submitted are waited for rather than
+    submitted again, and jobs that finished are not run again, only their
+    results are downloaded if they are missing; jobs that failed are
+    submitted again.
+
+    Parameters
+    ----------
+    jobs : list of dict
+            Jobs as returned by load_manifest.
+    outdir : string
+            Directory the results are written to, as <name>.json.
+    journal : Journal
+            Journal of job IDs and states.
+    max_workers : int
+            Number of jobs handled at the same time.
+    token : string
+            Authentication token (unless a job gives its own).
+    client : PcatsClient
+            Client to use (the shared default client if not given).
+    log : callable
+            Called with a progress line per state change.
+
+    Returns
+    -------
+    dict
+        {name: final status}, "Error" for a job whose results could not be
+        downloaded
+    """
+    cli = pcats_api._client(client)
+    log = log or (lambda line: None)
+    os.makedirs(outdir, exist_ok=True)
+    done = dict((job['name'], threading.Event()) for job in jobs)
+
+    def run(job):
+        name = job['name']
+        error = None
+        try:
+            status = _run_job(job, cli, journal, done, token, log)
+        except Exception as e:
+            log('{}: {}'.format(name, e))
+            status = "Error"
+        if status == "Done":
+            try:
+                _download(job, cli, outdir, journal, token)
+            except Exception as e:
+                # the job finished on the server; a restarted run only
+                # retries the download
+                error = str(e)
+        state = journal.get(name)
+        if state['status'] != status or \
+                state.get('download_error') != error:
+            journal.record(name, state['jobid'], status, error)
+        if error is not None:
+            log('{}: results not downloaded: {}'.format(name, error))
+            status = "Error"
+        log('{}: {}'.format(name, status))
+        done[name].set()
+        return status
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        statuses = list(executor.map(run, jobs))
+    return dict(zip((job['name'] for job in jobs), statuses))
+
+
+def _run_job(job, cli, journal, done, token, log):
+    name = job['name']
+    state = journal.get(name)
+    if state['status'] == "Done":
+        return "Done"
+    jobid = state['jobid'] if state['status'] is None else None
+    if jobid is None:
+        params = dict((k, v) for k, v in job.items()
+                      if k not in ('name', 'endpoint', 'parent'))
+        params.setdefault('token', token)
+        if job.get('parent') is not None:
+            done[job['parent']].wait()
+            parent = journal.get(job['parent'])
+            if parent['status'] != "Done":
+                return "Error"
+            params['jobid'] = parent['jobid']
+        submit = getattr(pcats_api, job['endpoint'])
+        jobid = submit(client=cli, **params)
+        if jobid is None:
+            return "Error"
+        journal.record(name, jobid)
+        log('{}: submitted {}'.format(name, jobid))
+    else:
+        log('{}: reattached {}'.format(name, jobid))
+    kind = 'CATE' if job['endpoint'].endswith('_cate') else job.get('method',
+                                                                    'BART')
+    return cli.poller.wait(jobid, kind=kind)
+
+
+def _download(job, cli, outdir, journal, token):
+    result = fetch(journal.get(job['name'])['jobid'], 'results', outdir,
+                   token=job.get('token', token), name=job['name'],
+                   client=cli)
+    if result.status == 'failed':
+        raise IOError(result.error)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pcats',
+                                     description='PCATS REST API client')
+    parser.add_argument('--url', default=os.environ.get(
+        'PCATS_URL', pcats_api.DEFAULT_URL), help='PCATS server')
+    parser.add_argument('--token', default=os.environ.get('PCATS_TOKEN'),
+                        help='authentication token')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run = commands.add_parser('run', help='run the jobs of a manifest')
+    run.add_argument('manifest', help='YAML or JSON manifest')
+    run.add_argument('-o', '--output', default='.',
+                     help='directory for the results (default: .)')
+    run.add_argument('--journal',
+                     help='journal file (default: <manifest>.journal)')
+    run.add_argument('-j', '--jobs', type=int, default=8,
+                     help='jobs handled at the same time (default: 8)')
+
+    status = commands.add_parser('status', help='print the status of jobs')
+    status.add_argument('jobid', nargs='+')
+
+    args = parser.parse_args(argv)
+    with pcats_api.PcatsClient(args.url, token=args.token,
+                               pool_maxsize=max(10, getattr(args, 'jobs', 0))
+                               ) as client:
+        if args.command == 'status':
+            for jobid in args.jobid:
+                print('{} {}'.format(jobid, client.job_status(jobid)))
+            return 0
+        jobs = load_manifest(args.manifest)
+        journal = Journal(args.journal or args.manifest + '.journal')
+        try:
+            statuses = run_manifest(jobs, args.output, journal,
+                                    max_workers=args.jobs, client=client,
+                                    log=lambda line: print(line, flush=True))
+        finally:
+            journal.close()
+    failed = [name for name, status in statuses.items() if status != "Done"]
+    if failed:
+        print('failed: {}'.format(', '.join(failed)), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
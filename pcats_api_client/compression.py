@@ -0,0 +1,111 @@
+"""
+On-the-fly compression of uploaded request bodies.
+"""
+
+import os
+import time
+import zlib
+
+# Files smaller than this are not worth compressing in "auto" mode
+AUTO_MIN_SIZE = 64 * 1024
+
+# Text formats that compress well; .xls/.xlsx are sent as they are
+COMPRESSIBLE = ('.csv', '.tsv', '.txt', '.dat')
+
+ENCODINGS = ('gzip', 'zstd')
+
+
+def choose_encoding(compress, datafiles):
+    """Return the Content-Encoding to use for an upload or None
+
+    Parameters
+    ----------
+    compress : string or bool
+            None/False to send the body as is, "gzip" or "zstd" to force an
+            encoding, True or "auto" to gzip text files of at least
+            AUTO_MIN_SIZE bytes.
+    datafiles : list of string or Dataset
+            Files sent in the body.
+    """
+    if not compress:
+        return None
+    if compress in ENCODINGS:
+        return compress
+    if compress not in (True, 'auto'):
+        raise ValueError('unknown compression {!r}'.format(compress))
+    size = 0
+    for datafile in datafiles:
+        name = getattr(datafile, 'filename', datafile)
+        if os.path.splitext(str(name))[1].lower() not in COMPRESSIBLE:
+            return None
+        if not isinstance(datafile, (str, os.PathLike)):
+            # in-memory data of unknown size is assumed large
+            if datafile.size is None:
+                return 'gzip'
+            size += datafile.size
+        else:
+            size += os.path.getsize(datafile)
+    return 'gzip' if size >= AUTO_MIN_SIZE else None
+
+
+def _compressor(encoding):
+    if encoding == 'gzip':
+        return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('zstd compression requires the zstandard package '
+                          '(pip install pcats_api_client[zstd])')
+    return zstandard.ZstdCompressor().compressobj()
+
+
+class CompressedBody(object):
+    """Iterable of the compressed content of a file-like stream.
+
+    Sent by ``requests`` with chunked transfer encoding, so the body is
+    compressed while it is uploaded and never held in memory.
+
+    Parameters
+    ----------
+    stream : file-like
+            Uncompressed body.
+    encoding : string
+            "gzip" or "zstd".
+    chunk_size : int
+            Bytes read from the stream at a time.
+
+    Attributes
+    ----------
+    raw, sent : int
+            Uncompressed and compressed bytes processed so far.
+    seconds : float
+            Time spent compressing.
+    """
+
+    def __init__(self, stream, encoding, chunk_size=1 << 16):
+        self.stream = stream
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.raw = 0
+        self.sent = 0
+        self.seconds = 0.0
+
+    def rewind(self):
+        """Restart the body from the beginning, e.g. to retry a request"""
+        self.stream.rewind()
+        self.raw = 0
+        self.sent = 0
+
+    def __iter__(self):
+        compressor = _compressor(self.encoding)
+        while True:
+            chunk = self.stream.read(self.chunk_size)
+            start = time.perf_counter()
+            out = compressor.compress(chunk) if chunk else compressor.flush()
+            self.seconds += time.perf_counter() - start
+            self.raw += len(chunk)
+            self.sent += len(out)
+            if out:
+                yield out
+            if not chunk:
+                break
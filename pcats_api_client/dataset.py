@@ -0,0 +1,268 @@
+"""
+In-memory data (DataFrames, record arrays, file objects) as job input.
+"""
+
+import csv
+import hashlib
+import io
+import os
+
+# Formats an in-memory table can be sent in, most preferred first
+FORMATS = ('parquet', 'arrow', 'csv')
+
+# Column numbering the imputations when several data frames are given
+IMPUTATION_COLUMN = '.imp'
+
+
+def is_path(value):
+    return isinstance(value, (str, os.PathLike))
+
+
+def _is_frame(value):
+    return hasattr(value, 'columns') and hasattr(value, 'to_csv')
+
+
+def _is_records(value):
+    return getattr(getattr(value, 'dtype', None), 'names', None) is not None
+
+
+def _is_table(value):
+    if isinstance(value, (list, tuple)):
+        return bool(value) and all(_is_frame(v) or _is_records(v)
+                                   for v in value)
+    return _is_frame(value) or _is_records(value)
+
+
+class _Stream(io.RawIOBase):
+    """Readable stream over the byte chunks of a generator function"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.rewind()
+
+    def rewind(self):
+        self._iter = self.chunks()
+        self._buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            self._buffer = next(self._iter, None)
+            if self._buffer is None:
+                self._buffer = b''
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+class Dataset(object):
+    """Data frame, record array or file object sent as a data file.
+
+    Tables are serialized while the request body is sent, a block of rows
+    at a time, so no temporary file is written. CSV works with every
+    server; Parquet or Arrow IPC (built in memory with pyarrow) is used
+    when the server lists it under "formats" at /api/capabilities.
+
+    Parameters
+    ----------
+    data : DataFrame, record array, list of them, bytes or file object
+            The data. A list of data frames holds multiple imputations and
+            is sent as one table with an extra ".imp" column numbering the
+            imputations from 1 (the "long" layout of R's mice package).
+            Bytes and file objects are sent as they are.
+    format : string
+            "csv", "parquet" or "arrow" for tables.
+    name : string
+            File name reported to the server.
+    chunk_rows : int
+            Rows serialized at a time.
+    """
+
+    def __init__(self, data, format='csv', name=None, chunk_rows=10000):
+        if format not in FORMATS:
+            raise ValueError('unknown data format {!r}'.format(format))
+        if isinstance(data, bytes):
+            data = io.BytesIO(data)
+        elif not hasattr(data, 'read') and not _is_table(data):
+            raise TypeError('cannot send {} as data'.format(
+                type(data).__name__))
+        self.data = data
+        self.format = format if _is_table(data) else None
+        self.chunk_rows = chunk_rows
+        if name is None:
+            name = os.path.basename(str(getattr(data, 'name', '') or '')) or \
+                'data.{}'.format(self.format or 'csv')
+        self.filename = name
+        self._start = None
+        if hasattr(data, 'read'):
+            try:
+                self._start = data.tell()
+            except (AttributeError, OSError):
+                pass
+
+    def __repr__(self):
+        return 'Dataset({})'.format(self.filename)
+
+    def frames(self):
+        """Return the data as a list of pandas DataFrames"""
+        import pandas
+        data = self.data if isinstance(self.data, (list, tuple)) \
+            else [self.data]
+        return [d if _is_frame(d) else pandas.DataFrame.from_records(d)
+                for d in data]
+
+    def _table(self):
+        frames = self.frames()
+        if len(frames) > 1 or isinstance(self.data, (list, tuple)):
+            import pandas
+            frames = [f.assign(**{IMPUTATION_COLUMN: i + 1})
+                      for i, f in enumerate(frames)]
+            frame = pandas.concat(frames, ignore_index=True)
+            return frame[[IMPUTATION_COLUMN] +
+                         [c for c in frame.columns if c != IMPUTATION_COLUMN]]
+        return frames[0]
+
+    def _csv_chunks(self):
+        data = self.data if isinstance(self.data, (list, tuple)) \
+            else [self.data]
+        many = isinstance(self.data, (list, tuple))
+        header = True
+        for i, table in enumerate(data):
+            if not _is_frame(table):
+                for chunk in _records_csv(table, header, i + 1 if many
+                                          else None, self.chunk_rows):
+                    yield chunk
+                header = False
+                continue
+            for start in range(0, max(len(table), 1), self.chunk_rows):
+                chunk = table.iloc[start:start + self.chunk_rows]
+                if many:
+                    chunk = chunk.copy()
+                    chunk.insert(0, IMPUTATION_COLUMN, i + 1)
+                yield chunk.to_csv(index=False, header=header).encode('utf-8')
+                header = False
+
+    def _columnar(self):
+        import pyarrow
+        table = pyarrow.Table.from_pandas(self._table(), preserve_index=False)
+        sink = pyarrow.BufferOutputStream()
+        if self.format == 'parquet':
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(table, sink)
+        else:
+            with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    def open(self):
+        """Return a readable stream of the file content"""
+        if self.format is None:
+            if self._start is not None:
+                self.data.seek(self._start)
+            return _Unclosed(self.data)
+        if self.format == 'csv':
+            return _Stream(self._csv_chunks)
+        return io.BytesIO(self._columnar())
+
+    @property
+    def size(self):
+        """Size of the file content in bytes, None if not known up front"""
+        if self.format is None and self._start is not None:
+            pos = self.data.tell()
+            end = self.data.seek(0, io.SEEK_END)
+            self.data.seek(pos)
+            return end - self._start
+        return None
+
+    def digest(self):
+        """Return a SHA-256 digest of the content, None for a file object"""
+        h = hashlib.sha256()
+        if self.format is None:
+            if isinstance(self.data, io.BytesIO):
+                h.update(self.data.getvalue()[self._start:])
+                return h.hexdigest()
+            return None
+        data = self.data if isinstance(self.data, (list, tuple)) \
+            else [self.data]
+        h.update(str(len(data)).encode())
+        for table in data:
+            if _is_frame(table):
+                import pandas
+                h.update(repr(list(table.columns)).encode('utf-8'))
+                h.update(repr(list(table.dtypes)).encode('utf-8'))
+                h.update(pandas.util.hash_pandas_object(table, index=False)
+                         .values.tobytes())
+            else:
+                h.update(str(table.dtype).encode('utf-8'))
+                h.update(table.tobytes())
+        return h.hexdigest()
+
+    def rows(self):
+        """Yield the column names and then the rows of a table"""
+        data = self.data if isinstance(self.data, (list, tuple)) \
+            else [self.data]
+        first = data[0]
+        if _is_frame(first):
+            yield [str(c) for c in first.columns]
+            for row in first.itertuples(index=False):
+                yield list(row)
+        elif _is_records(first):
+            yield list(first.dtype.names)
+            for row in first:
+                yield list(row.tolist())
+
+
+class _Unclosed(object):
+    """File object proxy whose close() leaves the caller's file open"""
+
+    def __init__(self, f):
+        self._f = f
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+    def close(self):
+        pass
+
+
+def _records_csv(records, header, imputation, chunk_rows):
+    names = list(records.dtype.names)
+    for start in range(0, max(len(records), 1), chunk_rows):
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator='\n')
+        if header and start == 0:
+            writer.writerow(([IMPUTATION_COLUMN] if imputation else []) +
+                            names)
+        for row in records[start:start + chunk_rows]:
+            writer.writerow(([imputation] if imputation else []) +
+                            list(row.tolist()))
+        yield out.getvalue().encode('utf-8')
+
+
+def as_dataset(data, client=None):
+    """Return data files unchanged and wrap anything else in a Dataset
+
+    Tables are sent in the most efficient format the server of the client
+    accepts (see Dataset) when pyarrow is installed, and as CSV otherwise.
+    """
+    if data is None or is_path(data) or isinstance(data, Dataset):
+        return data
+    return Dataset(data, format=_format(data, client))
+
+
+def _format(data, client):
+    if client is None or not _is_table(data):
+        return 'csv'
+    accepted = client.capabilities().get('formats') or ()
+    for format in FORMATS[:-1]:
+        if format in accepted:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                break
+            return format
+    return 'csv'
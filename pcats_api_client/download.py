@@ -0,0 +1,248 @@
+"""
+Concurrent download of job artifacts to disk.
+"""
+
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from . import pcats_api
+
+# Artifact name: (API path under /api/job/{jobid}/, file extension)
+ARTIFACTS = {
+    'results': ('results', '.json'),
+    'print': ('print', '.txt'),
+    'printCATE': ('printCATE', '.txt'),
+}
+
+DOWNLOADED = 'downloaded'
+NOT_MODIFIED = 'not-modified'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+class Download(object):
+    """Outcome of downloading one artifact.
+
+    Attributes
+    ----------
+    jobid : UUID
+            Job ID.
+    artifact : string
+            Artifact name ("results", "print", "printCATE", "plot" or
+            "plot:<plottype>").
+    path : string
+            Local file (None if the artifact was not found).
+    status : string
+            "downloaded", "not-modified" (the server answered 304),
+            "skipped" (already present) or "failed".
+    size : int
+            Bytes written.
+    error : string
+            Reason of a failure.
+    """
+
+    __slots__ = ('jobid', 'artifact', 'path', 'status', 'size', 'error')
+
+    def __init__(self, jobid, artifact, path, status, size=0, error=None):
+        self.jobid = jobid
+        self.artifact = artifact
+        self.path = path
+        self.status = status
+        self.size = size
+        self.error = error
+
+    def __repr__(self):
+        return 'Download({}, {}, {})'.format(self.jobid, self.artifact,
+                                             self.status)
+
+
+def _check(artifact):
+    if artifact not in ARTIFACTS and artifact != 'plot' and \
+            not artifact.startswith('plot:'):
+        raise ValueError('unknown artifact {!r}'.format(artifact))
+
+
+def _etag_path(path):
+    return path + '.etag'
+
+
+def _existing(directory, stem, ext=None):
+    """Return the downloaded file named stem plus ext, or None
+
+    Without ext (plots, whose type is only known from the response) the
+    directory is searched for stem plus any extension, the most recent
+    download winning.
+    """
+    if ext is not None:
+        path = os.path.join(directory, stem + ext)
+        return path if os.path.exists(path) else None
+    if not os.path.isdir(directory):
+        return None
+    found = [os.path.join(directory, name) for name in os.listdir(directory)
+             if os.path.splitext(name)[0] == stem and
+             not name.endswith(('.part', '.etag'))]
+    return max(found, key=os.path.getmtime) if found else None
+
+
+def fetch(jobid, artifact, outdir, token=None, revalidate=False,
+          chunk_size=1 << 16, name=None, client=None):
+    """Download one artifact of a job to outdir/<jobid>/<artifact>.<ext>
+
+    The body is streamed to a temporary file a chunk at a time and moved
+    into place when complete. An existing file is kept as it is, or with
+    revalidate=True it is fetched again with If-None-Match set to the ETag
+    stored next to it, so the server answers 304 Not Modified when it is
+    unchanged.
+
+    Parameters
+    ----------
+    jobid : UUID
+            Job ID of a finished job.
+    artifact : string
+            "results", "print", "printCATE", "plot" or "plot:<plottype>".
+    outdir : string
+            Directory of the downloads.
+    token : string
+            Authentication token.
+    revalidate : bool
+            Ask the server whether present files changed.
+    chunk_size : int
+            Bytes written at a time.
+    name : string
+            File name without extension, relative to outdir, instead of
+            <jobid>/<artifact>.
+    client : PcatsClient
+            Client to use (the shared default client if not given).
+
+    Returns
+    -------
+    Download
+    """
+    _check(artifact)
+    cli = pcats_api._client(client)
+    if name is None:
+        name = os.path.join(str(jobid), artifact.replace(':', '-'))
+    directory, stem = os.path.split(os.path.join(outdir, name))
+    ext = ARTIFACTS[artifact][1] if artifact in ARTIFACTS else None
+    path = _existing(directory, stem, ext)
+    if path is not None and not revalidate:
+        return Download(jobid, artifact, path, SKIPPED)
+    headers = dict()
+    if path is not None and os.path.exists(_etag_path(path)):
+        with open(_etag_path(path)) as f:
+            headers['If-None-Match'] = f.read().strip()
+
+    if artifact in ARTIFACTS:
+        kind = ARTIFACTS[artifact][0]
+        url = '/api/job/{}/{}'.format(jobid, kind)
+        cached = (cli.result_cache.get(jobid, kind)
+                  if cli.result_cache is not None else None)
+        if cached is not None and path is None:
+            path = os.path.join(directory, stem + ext)
+            os.makedirs(directory, exist_ok=True)
+            _write(path, [cached])
+            return Download(jobid, artifact, path, DOWNLOADED, len(cached))
+    else:
+        url = pcats_api.ploturl(jobid, artifact[5:] or None, client=cli)
+        if url is None:
+            return Download(jobid, artifact, None, FAILED,
+                            error='no plot URL')
+
+    res = cli.get(url, token=token, headers=headers, stream=True)
+    with res:
+        if res.status_code == 304 and path is not None:
+            return Download(jobid, artifact, path, NOT_MODIFIED)
+        if res.status_code != 200:
+            return Download(jobid, artifact, None, FAILED,
+                            error='HTTP {}'.format(res.status_code))
+        if ext is None:
+            content_type = res.headers.get('Content-Type', '')
+            ext = mimetypes.guess_extension(
+                content_type.split(';')[0].strip()) or '.html'
+        target = os.path.join(directory, stem + ext)
+        os.makedirs(directory, exist_ok=True)
+        size = _write(target, res.iter_content(chunk_size))
+        if path is not None and path != target:
+            os.remove(path)
+        etag = res.headers.get('ETag')
+        if etag:
+            with open(_etag_path(target), 'w') as f:
+                f.write(etag)
+        elif os.path.exists(_etag_path(target)):
+            os.remove(_etag_path(target))
+    if artifact == 'results' and cli.registry is not None:
+        cli.registry.update(jobid, "Done", result=os.path.abspath(target))
+    return Download(jobid, artifact, target, DOWNLOADED, size)
+
+
+def _write(path, chunks):
+    tmp = '{}.{}.part'.format(path, os.getpid())
+    size = 0
+    with open(tmp, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+            size += len(chunk)
+    os.replace(tmp, path)
+    return size
+
+
+def download_artifacts(jobids,
+                       artifacts=('results',),
+                       outdir='.',
+                       max_workers=8,
+                       token=None,
+                       revalidate=False,
+                       client=None,
+                       callback=None):
+    """Download artifacts of many jobs concurrently
+
+    Every (job, artifact) pair is fetched with fetch() on a thread pool
+    sharing the client's pooled connections.
+
+    Parameters
+    ----------
+    jobids : iterable of UUID
+            Job IDs of finished jobs.
+    artifacts : iterable of string
+            Artifacts of every job: "results", "print", "printCATE", "plot"
+            or "plot:<plottype>".
+    outdir : string
+            Directory of the downloads, one sub directory per job.
+    max_workers : int
+            Maximum number of downloads in flight. The client's
+            pool_maxsize should be at least as large.
+    token : string
+            Authentication token.
+    revalidate : bool
+            Ask the server whether present files changed (see fetch).
+    client : PcatsClient
+            Client to use (the shared default client if not given).
+    callback : callable
+            Called with each Download as it completes.
+
+    Returns
+    -------
+    list of Download
+        in the order of jobids and artifacts
+    """
+    for artifact in artifacts:
+        _check(artifact)
+    cli = pcats_api._client(client)
+    tasks = [(jobid, artifact) for jobid in jobids for artifact in artifacts]
+
+    def run(task):
+        jobid, artifact = task
+        try:
+            result = fetch(jobid, artifact, outdir, token=token,
+                           revalidate=revalidate, client=cli)
+        except (OSError, requests.RequestException) as e:
+            result = Download(jobid, artifact, None, FAILED, error=str(e))
+        if callback is not None:
+            callback(result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run, tasks))
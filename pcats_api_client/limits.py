@@ -0,0 +1,403 @@
+"""
+Client side request rate limits, concurrent job budgets and fair sharing
+of them between submissions, status polls and downloads.
+
+Limits are kept in memory for one process, or in a small JSON file
+updated under an exclusive file lock so that every process on a node
+using the same file stays within one budget together.
+"""
+
+import contextlib
+import itertools
+import json
+import os
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import defaultdict, deque
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Classes of traffic scheduled by a Scheduler
+TRAFFIC = ('submit', 'poll', 'download')
+
+
+def traffic_class(method, path):
+    """Return "submit", "poll" or "download" for a request"""
+    if method.upper() != 'GET':
+        return 'submit'
+    path = urllib.parse.urlsplit(path).path.rstrip('/')
+    if path.endswith(('/status', '/events')):
+        return 'poll'
+    return 'download'
+
+
+class _LocalState(object):
+    """State dict of one process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = dict()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self.lock:
+            yield self.state
+
+
+class _FileState(object):
+    """State dict shared by processes through a JSON file.
+
+    Every transaction holds an exclusive lock on the file while it reads,
+    changes and writes back the state; a transaction that raises leaves the
+    file as it was.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        with self.lock, open(self.path, 'a+') as f:
+            _lock(f)
+            try:
+                f.seek(0)
+                text = f.read()
+                try:
+                    state = json.loads(text) if text.strip() else dict()
+                except ValueError:
+                    # torn write of a killed process
+                    state = dict()
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                _unlock(f)
+
+
+def _lock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _state(path):
+    return _FileState(path) if path is not None else _LocalState()
+
+
+class RateLimiter(object):
+    """Token bucket allowing `rate` calls per second with bursts of `burst`.
+
+    Parameters
+    ----------
+    rate : float
+            Sustained number of calls per second.
+    burst : int
+            Number of calls allowed back to back (default 1).
+    path : string
+            File shared by the processes drawing from the same bucket
+            (a bucket of this process only if not given).
+    """
+
+    def __init__(self, rate, burst=1, path=None):
+        self.rate = float(rate)
+        self.burst = burst
+        self.path = path
+        # wall clock time is comparable between processes
+        self.clock = time.time if path is not None else time.monotonic
+        self._state = _state(path)
+
+    def delay(self):
+        """Take a token and return 0, or return the seconds until one is due"""
+        with self._state.transaction() as state:
+            now = self.clock()
+            tokens = min(self.burst, state.get('tokens', self.burst) +
+                         (now - state.get('updated', now)) * self.rate)
+            state['updated'] = now
+            if tokens >= 1:
+                state['tokens'] = tokens - 1
+                return 0
+            state['tokens'] = tokens
+            return (1 - tokens) / self.rate
+
+    def acquire(self):
+        """Block until a call is allowed"""
+        while True:
+            delay = self.delay()
+            if not delay:
+                return
+            time.sleep(delay)
+
+
+def _alive(pid):
+    if pid == os.getpid() or os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class JobBudget(object):
+    """Maximum number of jobs running at once.
+
+    A slot is taken before a job is submitted and given back when the
+    client sees the job finish (or the submission fail). Slots of processes
+    that exited are reclaimed, so are slots older than `ttl`. While
+    acquire() waits, it can check the jobs this budget bound to slots
+    every `check_interval` seconds, so a program that submits jobs without
+    ever asking for their status still gets its slots back.
+
+    Parameters
+    ----------
+    limit : int
+            Number of jobs allowed to run at the same time.
+    path : string
+            File shared by the processes using the same budget (a budget
+            of this process only if not given).
+    ttl : float
+            Seconds after which a slot is reclaimed even if its job was
+            never seen to finish (never if None).
+    interval : float
+            Seconds between checks for a free slot.
+    check_interval : float
+            Seconds between checks of the jobs holding slots while
+            acquire() waits.
+    """
+
+    def __init__(self, limit, path=None, ttl=None, interval=0.1,
+                 check_interval=2.0):
+        self.limit = limit
+        self.path = path
+        self.ttl = ttl
+        self.interval = interval
+        self.check_interval = check_interval
+        self._state = _state(path)
+        self._bound = set()
+
+    def _prune(self, jobs):
+        now = time.time()
+        for key, (pid, started) in list(jobs.items()):
+            if not _alive(pid) or (self.ttl is not None and
+                                   now - started > self.ttl):
+                del jobs[key]
+
+    def try_acquire(self):
+        """Return a slot, or None if the budget is used up"""
+        with self._state.transaction() as state:
+            jobs = state.setdefault('jobs', dict())
+            self._prune(jobs)
+            if len(jobs) >= self.limit:
+                return None
+            slot = uuid.uuid4().hex
+            jobs[slot] = [os.getpid(), time.time()]
+            return slot
+
+    def acquire(self, timeout=None, check=None):
+        """Block until a slot is free and return it
+
+        Parameters
+        ----------
+        timeout : float
+                Seconds to wait at most (no limit if None).
+        check : callable
+                Called with each job ID in held() every check_interval
+                seconds while waiting; expected to release() the jobs it
+                finds finished.
+
+        Raises
+        ------
+        TimeoutError
+            if no slot got free within timeout seconds
+        """
+        now = time.monotonic()
+        deadline = now + timeout if timeout is not None else None
+        checked = now
+        while True:
+            slot = self.try_acquire()
+            if slot is not None:
+                return slot
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                raise TimeoutError('no free job slot within {}s'.format(
+                    timeout))
+            if check is not None and now - checked >= self.check_interval:
+                for jobid in self.held():
+                    check(jobid)
+                checked = time.monotonic()
+                continue
+            time.sleep(self.interval)
+
+    def bind(self, slot, jobid):
+        """Hold the slot for jobid until release(jobid); release it if None"""
+        with self._state.transaction() as state:
+            jobs = state.setdefault('jobs', dict())
+            entry = jobs.pop(slot, None)
+            if jobid is not None and entry is not None:
+                jobs[jobid] = entry
+                self._bound.add(jobid)
+
+    def release(self, key):
+        """Give back the slot of a job ID (or of an unbound slot)"""
+        with self._state.transaction() as state:
+            state.setdefault('jobs', dict()).pop(key, None)
+            self._bound.discard(key)
+
+    def held(self):
+        """Return the job IDs bound to slots by this budget"""
+        with self._state.transaction() as state:
+            jobs = state.setdefault('jobs', dict())
+            self._prune(jobs)
+            self._bound.intersection_update(jobs)
+            return sorted(self._bound)
+
+    def __len__(self):
+        with self._state.transaction() as state:
+            jobs = state.setdefault('jobs', dict())
+            self._prune(jobs)
+            return len(jobs)
+
+
+class Scheduler(object):
+    """Request rate and job budget shared fairly between kinds of traffic.
+
+    Pass it as PcatsClient(scheduler=...). Every request waits for a token
+    of the rate limiter; while requests wait, the token goes to the
+    waiting request of the highest priority, and among equal priorities
+    each traffic class (see TRAFFIC) gets tokens in proportion to its
+    share (start-time fair queuing), first come first served within a
+    class. Submissions also take a slot of the job budget; a slot is
+    given back when the client sees its job finish, and a submission
+    waiting for a slot polls the status of the jobs of this process that
+    hold one every `job_check` seconds (see JobBudget).
+
+    With `path`, the rate and the job budget are shared by every process
+    on the node using the same path, through the files <path>.rate and
+    <path>.jobs; the fair ordering applies within each process.
+
+    Parameters
+    ----------
+    rate : float
+            Requests per second (unlimited if None).
+    burst : int
+            Requests allowed back to back.
+    max_jobs : int
+            Jobs running at the same time (unlimited if None).
+    shares : dict
+            {traffic class: relative share}, 1 for unlisted classes.
+    priorities : dict
+            {traffic class: priority}; higher goes first, default 0.
+    path : string
+            Prefix of the files shared between processes.
+    job_ttl : float
+            Seconds after which a job slot is reclaimed (see JobBudget).
+    job_check : float
+            Seconds between status polls of the jobs holding slots while a
+            submission waits for one.
+    """
+
+    def __init__(self, rate=None, burst=1, max_jobs=None, shares=None,
+                 priorities=None, path=None, job_ttl=None, job_check=2.0):
+        self.limiter = RateLimiter(
+            rate, burst, path + '.rate' if path is not None else None) \
+            if rate else None
+        self.jobs = JobBudget(
+            max_jobs, path + '.jobs' if path is not None else None,
+            job_ttl, check_interval=job_check) if max_jobs else None
+        self.shares = dict((kind, 1.0) for kind in TRAFFIC)
+        self.shares.update(shares or dict())
+        self.priorities = priorities or dict()
+        self.granted = defaultdict(int)
+        self._cond = threading.Condition()
+        self._waiting = defaultdict(deque)
+        self._finish = defaultdict(float)
+        self._virtual = 0.0
+        self._tickets = itertools.count()
+
+    def _start(self, kind):
+        return max(self._virtual, self._finish[kind])
+
+    def _head(self):
+        best = None
+        for kind, queue in self._waiting.items():
+            if queue:
+                key = (-self.priorities.get(kind, 0), self._start(kind),
+                       queue[0])
+                if best is None or key < best[0]:
+                    best = (key, kind)
+        return best[1] if best is not None else None
+
+    def acquire(self, kind):
+        """Block until a request of a traffic class may be sent
+
+        Returns
+        -------
+        float
+            seconds waited
+        """
+        if self.limiter is None:
+            with self._cond:
+                self.granted[kind] += 1
+            return 0.0
+        started = time.monotonic()
+        with self._cond:
+            ticket = next(self._tickets)
+            self._waiting[kind].append(ticket)
+            try:
+                while True:
+                    if self._head() == kind and \
+                            self._waiting[kind][0] == ticket:
+                        delay = self.limiter.delay()
+                        if not delay:
+                            start = self._start(kind)
+                            self._finish[kind] = start + \
+                                1.0 / self.shares.get(kind, 1.0)
+                            self._virtual = start
+                            self.granted[kind] += 1
+                            return time.monotonic() - started
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+            finally:
+                self._waiting[kind].remove(ticket)
+                self._cond.notify_all()
+
+    def start_job(self, check=None):
+        """Wait for a slot of the job budget; return it (None if unlimited)
+
+        check is called with the job IDs holding slots while waiting, see
+        JobBudget.acquire.
+        """
+        return self.jobs.acquire(check=check) if self.jobs is not None \
+            else None
+
+    def job_submitted(self, slot, jobid):
+        """Tie a slot to the submitted job (jobid None if it failed)"""
+        if slot is not None:
+            self.jobs.bind(slot, jobid)
+
+    def job_finished(self, jobid):
+        """Give back the slot of a finished job"""
+        if self.jobs is not None:
+            self.jobs.release(jobid)
@@ -0,0 +1,246 @@
+"""
+Client instrumentation: event hooks, an in-process metrics registry and
+exporters.
+
+Every PcatsClient emits events to the callables in ``client.hooks``. A
+hook is called as ``hook(event, data)`` where data is a dict:
+
+request
+    method, endpoint, status, seconds, bytes_sent, bytes_received, retries
+poll
+    jobid, status
+throttle
+    traffic, seconds (time a request waited for the client's Scheduler)
+job
+    jobid, kind, status, total_seconds, queue_seconds, run_seconds
+    (queue/run are None when the server never reported a running state)
+
+The client's own MetricsRegistry (``client.metrics``) is installed as the
+first hook.
+"""
+
+import bisect
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds (upper bounds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60, 300, 900, 1800, 3600, 7200, 14400)
+
+_JOB_PATH = re.compile(r'^/api/job/[^/]+/')
+
+
+def endpoint_name(path):
+    """Return the path with the job ID replaced by a placeholder"""
+    return _JOB_PATH.sub('/api/job/{jobid}/', path.split('?')[0])
+
+
+class Histogram(object):
+    """Bucketed distribution of observed values"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Return the upper bound of the bucket holding the q-th quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def snapshot(self):
+        return {'count': self.count, 'sum': self.sum,
+                'p50': self.quantile(0.5), 'p99': self.quantile(0.99)}
+
+
+class MetricsRegistry(object):
+    """Thread safe registry of counters and histograms keyed by name and labels.
+
+    Also a client hook turning events into metrics:
+
+    - pcats_request_seconds{method, endpoint, status} (histogram)
+    - pcats_request_sent_bytes / pcats_request_received_bytes (counters)
+    - pcats_request_retries, pcats_polls (counters)
+    - pcats_throttled_seconds{traffic} (counter)
+    - pcats_job_seconds{kind, phase=total|queue|run} (histogram)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = dict()
+        self.histograms = dict()
+
+    @staticmethod
+    def _key(name, labels):
+        return (name, tuple(sorted(labels.items())))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def counter(self, name, **labels):
+        with self.lock:
+            return self.counters.get(self._key(name, labels), 0)
+
+    def histogram(self, name, **labels):
+        with self.lock:
+            return self.histograms.get(self._key(name, labels))
+
+    def total(self, name):
+        """Return a counter summed over all its labels"""
+        with self.lock:
+            return sum(v for (n, _), v in self.counters.items() if n == name)
+
+    def __call__(self, event, data):
+        if event == 'request':
+            labels = {'method': data['method'], 'endpoint': data['endpoint']}
+            self.observe('pcats_request_seconds', data['seconds'],
+                         status=str(data['status']), **labels)
+            self.inc('pcats_request_sent_bytes', data['bytes_sent'], **labels)
+            self.inc('pcats_request_received_bytes', data['bytes_received'],
+                     **labels)
+            if data['retries']:
+                self.inc('pcats_request_retries', data['retries'], **labels)
+        elif event == 'poll':
+            self.inc('pcats_polls')
+        elif event == 'throttle':
+            self.inc('pcats_throttled_seconds', data['seconds'],
+                     traffic=data['traffic'])
+        elif event == 'job':
+            kind = str(data['kind'])
+            for phase in ('total', 'queue', 'run'):
+                value = data[phase + '_seconds']
+                if value is not None:
+                    self.observe('pcats_job_seconds', value, kind=kind,
+                                 phase=phase)
+
+    def snapshot(self):
+        """Return {name{labels}: value or histogram summary}"""
+        out = dict()
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                out[_series(name, labels)] = value
+            for (name, labels), histogram in self.histograms.items():
+                out[_series(name, labels)] = histogram.snapshot()
+        return out
+
+    def to_prometheus(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append('{} {}'.format(_series(name + '_total', labels),
+                                            value))
+            for (name, labels), h in sorted(self.histograms.items()):
+                seen = 0
+                for bound, count in zip(h.buckets + ('+Inf',), h.counts):
+                    seen += count
+                    lines.append('{} {}'.format(_series(
+                        name + '_bucket', labels + (('le', str(bound)),)),
+                        seen))
+                lines.append('{} {}'.format(_series(name + '_sum', labels),
+                                            h.sum))
+                lines.append('{} {}'.format(_series(name + '_count', labels),
+                                            h.count))
+        return '\n'.join(lines) + '\n'
+
+
+def _series(name, labels):
+    if not labels:
+        return name
+    return '{}{{{}}}'.format(name, ','.join(
+        '{}="{}"'.format(k, str(v).replace('"', '\\"')) for k, v in labels))
+
+
+def serve_prometheus(registry, port=9464, host='127.0.0.1'):
+    """Serve registry.to_prometheus() at http://host:port/metrics
+
+    Returns the server; call shutdown() on it to stop.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            body = registry.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return httpd
+
+
+class OpenTelemetryHook(object):
+    """Client hook recording events as OpenTelemetry metrics.
+
+    Requires the opentelemetry-api package.
+
+    Parameters
+    ----------
+    meter : opentelemetry.metrics.Meter
+            Meter to create the instruments on (the global
+            "pcats_api_client" meter if not given).
+    """
+
+    def __init__(self, meter=None):
+        if meter is None:
+            from opentelemetry import metrics
+            meter = metrics.get_meter('pcats_api_client')
+        self.request_seconds = meter.create_histogram(
+            'pcats.request.duration', unit='s')
+        self.request_bytes = meter.create_counter('pcats.request.bytes',
+                                                  unit='By')
+        self.retries = meter.create_counter('pcats.request.retries')
+        self.polls = meter.create_counter('pcats.polls')
+        self.job_seconds = meter.create_histogram('pcats.job.duration',
+                                                  unit='s')
+
+    def __call__(self, event, data):
+        if event == 'request':
+            attrs = {'method': data['method'], 'endpoint': data['endpoint'],
+                     'status': str(data['status'])}
+            self.request_seconds.record(data['seconds'], attrs)
+            self.request_bytes.add(data['bytes_sent'],
+                                   dict(attrs, direction='sent'))
+            self.request_bytes.add(data['bytes_received'],
+                                   dict(attrs, direction='received'))
+            if data['retries']:
+                self.retries.add(data['retries'], attrs)
+        elif event == 'poll':
+            self.polls.add(1)
+        elif event == 'job':
+            for phase in ('total', 'queue', 'run'):
+                value = data[phase + '_seconds']
+                if value is not None:
+                    self.job_seconds.record(value, {'kind': str(data['kind']),
+                                                    'phase': phase})
@@ -1,11 +1,467 @@
+import collections
+import contextlib
 import requests
+from requests.adapters import HTTPAdapter
 import sys
+import threading
 import time
+import uuid
+import warnings
+
+from .metrics import endpoint_name
+from .limits import traffic_class
+from .pool import job_of
+from .schema import CATE, DYNAMICGP, STATICGP, _data_part
+
+DEFAULT_URL = 'https://pcats.research.cchmc.org'
+
+
+class ClientStats(object):
+    """Thread safe counters of the traffic sent through a client"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = collections.Counter()
+
+    def add(self, **values):
+        with self.lock:
+            self.counters.update(values)
+
+    def __getitem__(self, name):
+        with self.lock:
+            return self.counters[name]
+
+    def snapshot(self):
+        """Return a copy of all counters"""
+        with self.lock:
+            return dict(self.counters)
+
+    @property
+    def compression_ratio(self):
+        """Uncompressed over compressed size of compressed uploads"""
+        sent = self['compressed_sent_bytes']
+        return self['compressed_raw_bytes'] / sent if sent else None
+
+    @property
+    def compression_time_saved(self):
+        """Estimated upload seconds saved by compression
+
+        The bytes saved divided by the observed upload throughput, minus
+        the time spent compressing.
+        """
+        seconds = self['upload_seconds']
+        if not seconds or not self['upload_bytes']:
+            return None
+        throughput = self['upload_bytes'] / seconds
+        saved = self['compressed_raw_bytes'] - self['compressed_sent_bytes']
+        return saved / throughput - self['compress_seconds']
+
+
+class PcatsClient(object):
+    """PCATS REST API client with a pooled HTTP session.
+
+    Owns a ``requests.Session`` so that consecutive calls reuse kept-alive
+    connections instead of paying a TCP+TLS handshake per request. The base
+    URL and authentication token are set once and used by every call made
+    through the client.
+
+    Parameters
+    ----------
+    base_url : string, list of string or EndpointPool
+            PCATS server URL. The default value is https://pcats.research.cchmc.org.
+            Several servers (a list, {URL: weight} or an EndpointPool)
+            share the load: new submissions go to a healthy server chosen
+            by the pool and fail over to another one when it cannot be
+            reached, requests about a job go to the server that owns it.
+    token : string
+            Authentication token sent with every request unless a call
+            passes its own token.
+    pool_connections : int
+            Number of per-host connection pools to cache.
+    pool_maxsize : int
+            Maximum number of kept-alive connections per host. Set it to at
+            least the number of threads sharing the client.
+    timeout : float or tuple
+            Default timeout passed to ``requests`` (None waits forever).
+    upload_cache : UploadCache
+            Cache of uploaded files. When set, data files are uploaded once
+            and later submissions send the cached dataref/mi_dataref.
+    compress : string
+            Default compression of uploads for calls that do not pass
+            compress (see uploadfile).
+    result_cache : ResultCache
+            Local store of submitted jobs and finished results. When set,
+            repeated submissions return the earlier job ID and results of
+            finished jobs are served without contacting the server.
+    retry : RetryPolicy
+            Retries of requests failing with connection errors or transient
+            statuses. The default value is RetryPolicy(); False disables
+            retries.
+    breaker : CircuitBreaker
+            Circuit breaker shedding requests while the server keeps failing
+            (None disables it).
+    preflight : bool
+            Check the variables of staticgp and dynamicgp submissions
+            against the header and first rows of their data files before
+            uploading, raising PreflightError instead of sending a job
+            the server would reject.
+    registry : JobRegistry
+            Durable record of submitted jobs and their status transitions,
+            from which another process can reattach to unfinished jobs.
+    push : string or WebhookReceiver
+            How wait_for_result learns that a job finished: "auto" uses
+            server-sent events or long-polling when the server advertises
+            them, a WebhookReceiver waits for the server's callback, False
+            only polls. Polling is the fallback in every case.
+    scheduler : Scheduler
+            Request rate and concurrent jobs budget, shared fairly between
+            submissions, status polls and downloads, and optionally between
+            the processes of a node (see pcats_api_client.limits). A
+            submission waiting for a job slot polls the jobs holding one.
+
+    Attributes
+    ----------
+    stats : ClientStats
+            Upload sizes and timings, including the compression ratio.
+    hooks : list
+            Callables receiving (event, data) for every request, status
+            poll and finished job (see pcats_api_client.metrics).
+    metrics : MetricsRegistry
+            Latency, size, retry and poll metrics of this client.
+    """
+
+    def __init__(self, base_url=DEFAULT_URL, token=None,
+                 pool_connections=10, pool_maxsize=10, timeout=None,
+                 upload_cache=None, compress=None, result_cache=None,
+                 retry=None, breaker=None, preflight=True, registry=None,
+                 push='auto', scheduler=None):
+        from .pool import EndpointPool
+        if isinstance(base_url, (list, tuple, dict)):
+            base_url = EndpointPool(base_url)
+        if isinstance(base_url, EndpointPool):
+            self.pool = base_url
+            base_url = self.pool.urls[0]
+        else:
+            self.pool = None
+        self._base_url = base_url.rstrip('/')
+        self._local = threading.local()
+        self.token = token
+        self.timeout = timeout
+        self.upload_cache = upload_cache
+        self.compress = compress
+        self.result_cache = result_cache
+        self.preflight = preflight
+        self.registry = registry
+        self.stats = ClientStats()
+        from .metrics import MetricsRegistry
+        from .retry import RetryPolicy
+        self.metrics = MetricsRegistry()
+        self.hooks = [self.metrics]
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.breaker = breaker
+        self.push = push
+        self.scheduler = scheduler
+        self._capabilities = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._poller = None
+        self._poller_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Close the session and its pooled connections"""
+        if self._poller is not None:
+            self._poller.stop()
+        self.session.close()
+
+    @property
+    def poller(self):
+        """JobPoller shared by all waiters using this client"""
+        if self._poller is None:
+            with self._poller_lock:
+                if self._poller is None:
+                    from .poller import JobPoller
+                    self._poller = JobPoller(client=self)
+        return self._poller
+
+    @property
+    def base_url(self):
+        """URL of the server this thread talks to
+
+        With an endpoint pool, the server chosen for the submission in
+        progress in this thread, or the first server of the pool.
+        """
+        return getattr(self._local, 'base_url', None) or self._base_url
+
+    def url(self, path):
+        if path.startswith(('http://', 'https://')):
+            return path
+        if self.pool is not None and job_of(path) is not None:
+            owner = self.pool.owner(job_of(path))
+            if owner is not None:
+                return owner + path
+        return self.base_url + path
+
+    @contextlib.contextmanager
+    def _pin(self, url):
+        """Send the requests of this thread to one server of the pool"""
+        previous = getattr(self._local, 'base_url', None)
+        self._local.base_url = url
+        try:
+            yield url
+        finally:
+            self._local.base_url = previous
+
+    def _route(self, path):
+        """Return (server for a relative path, whether any server will do)"""
+        if self.pool is None or path.startswith(('http://', 'https://')):
+            return None, False
+        pinned = getattr(self._local, 'base_url', None)
+        if pinned is not None:
+            return pinned, False
+        jobid = job_of(path)
+        if jobid is not None:
+            return self._locate(jobid), False
+        return self.pool.choose(), True
+
+    def _locate(self, jobid):
+        """Return the server owning a job, asking the servers if unknown"""
+        owner = self.pool.owner(jobid)
+        if owner is None and self.registry is not None:
+            job = self.registry.get(jobid)
+            if job is not None and job['base_url'] in self.pool.urls:
+                owner = job['base_url']
+        if owner is None:
+            for url in self.pool.healthy() or self.pool.urls:
+                try:
+                    res = self.session.get(
+                        '{}/api/job/{}/status'.format(url, jobid),
+                        headers=self.headers(), timeout=self.timeout)
+                except requests.ConnectionError:
+                    self.pool.mark_down(url)
+                    continue
+                if res.status_code == 200:
+                    owner = url
+                    break
+        if owner is None:
+            return self._base_url
+        self.pool.assign(jobid, owner)
+        return owner
+
+    def capabilities(self):
+        """Return the optional features advertised at /api/capabilities
+
+        e.g. {"push": ["sse"], "formats": ["parquet", "csv"]}; empty when
+        the server does not advertise any. Fetched once per client.
+        """
+        if self._capabilities is None:
+            try:
+                res = self.get('/api/capabilities')
+                capabilities = res.json() if res.status_code == 200 else {}
+            except (requests.RequestException, ValueError):
+                capabilities = {}
+            self._capabilities = capabilities
+        return self._capabilities
+
+    def emit(self, event, data):
+        """Pass an instrumentation event to the hooks"""
+        for hook in self.hooks:
+            try:
+                hook(event, data)
+            except Exception as e:
+                warnings.warn('pcats hook {!r} failed: {}'.format(hook, e))
+
+    def headers(self, token=None, headers=None):
+        """Return request headers with the Authorization header filled in"""
+        headers = dict(headers) if headers else dict()
+        token = token if token is not None else self.token
+        if token is not None:
+            headers["Authorization"] = "Bearer {}".format(token)
+        return headers
+
+    def request(self, method, path, token=None, headers=None, **kwargs):
+        """Send a request to the PCATS server over the pooled session
+
+        path is relative to the base URL or an absolute URL. Failed
+        requests are retried according to the client's retry policy; POST
+        requests carry an Idempotency-Key header that stays the same
+        across retries.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        headers = self.headers(token, headers)
+        if method == 'POST' and self.retry:
+            headers.setdefault('Idempotency-Key', uuid.uuid4().hex)
+        start = time.perf_counter()
+        retries = 0
+        server, free = self._route(path)
+        tried = []
+        while True:
+            if self.breaker is not None:
+                self.breaker.before()
+            if self.scheduler is not None:
+                self._throttle(method, path)
+            sent_to = server
+            if sent_to is not None:
+                self.pool.acquire(sent_to)
+            try:
+                res = self.session.request(
+                    method, server + path if server else self.url(path),
+                    headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if self.breaker is not None:
+                    self.breaker.record(None)
+                if server is not None and \
+                        isinstance(e, requests.ConnectionError):
+                    self.pool.mark_down(server)
+                    tried.append(server)
+                    if free:
+                        # any server will do: fail over at once
+                        other = self.pool.choose(exclude=tried)
+                        if other is not None and self._rewind(kwargs):
+                            server = other
+                            continue
+                    elif job_of(path) is None and \
+                            self.pool.healthy(exclude=tried):
+                        # let the submission move to another server
+                        raise
+                delay = self._retry_delay(method, retries, None, kwargs)
+                if delay is None:
+                    raise
+            else:
+                if server is not None:
+                    self.pool.mark_up(server)
+                if self.breaker is not None:
+                    self.breaker.record(res.status_code)
+                delay = self._retry_delay(method, retries, res, kwargs)
+                if delay is None:
+                    break
+            finally:
+                if sent_to is not None:
+                    self.pool.release(sent_to)
+            retries += 1
+            time.sleep(delay)
+        self.emit('request', {
+            'method': method,
+            'endpoint': endpoint_name(path),
+            'status': res.status_code,
+            'seconds': time.perf_counter() - start,
+            'bytes_sent': _body_size(res.request.body),
+            'bytes_received': (int(res.headers.get('Content-Length') or 0)
+                               if kwargs.get('stream') else len(res.content)),
+            'retries': retries})
+        return res
+
+    def _throttle(self, method, path):
+        traffic = traffic_class(method, path)
+        waited = self.scheduler.acquire(traffic)
+        if waited:
+            self.emit('throttle', {'traffic': traffic, 'seconds': waited})
+
+    def _retry_delay(self, method, retries, res, kwargs):
+        if not self.retry:
+            return None
+        delay = self.retry.delay(method, retries, res)
+        if delay is None or not self._rewind(kwargs):
+            return None
+        return delay
+
+    def _rewind(self, kwargs):
+        """Prepare a streamed request body to be sent again, False if it cannot"""
+        body = kwargs.get('data')
+        if body is not None and not isinstance(body, (bytes, str, dict)):
+            if not hasattr(body, 'rewind'):
+                return False
+            body.rewind()
+        return True
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def job_status(self, jobid):
+        return job_status(jobid, client=self)
+
+    def wait_for_result(self, jobid):
+        return wait_for_result(jobid, client=self)
+
+    def staticgp(self, *args, **kwargs):
+        return staticgp(*args, client=self, **kwargs)
+
+    def dynamicgp(self, *args, **kwargs):
+        return dynamicgp(*args, client=self, **kwargs)
+
+    def staticgp_cate(self, *args, **kwargs):
+        return staticgp_cate(*args, client=self, **kwargs)
+
+    def dynamicgp_cate(self, *args, **kwargs):
+        return dynamicgp_cate(*args, client=self, **kwargs)
+
+    def printgp(self, jobid, token=None):
+        return printgp(jobid, token=token, client=self)
+
+    def results(self, jobid, token=None, parse=False):
+        return results(jobid, token=token, client=self, parse=parse)
+
+    def uploadfile(self, datafile, token=None, progress=None, compress=None):
+        return uploadfile(datafile, token=token, client=self,
+                          progress=progress, compress=compress)
+
+    def ploturl(self, jobid, plottype=None):
+        return ploturl(jobid, plottype=plottype, client=self)
+
+    def stream_results(self, jobid, token=None, batch_rows=1000):
+        from .stream import stream_results
+        return stream_results(jobid, token=token, batch_rows=batch_rows,
+                              client=self)
+
+
+def _body_size(body):
+    if body is None:
+        return 0
+    if hasattr(body, '__len__'):
+        return len(body)
+    return getattr(body, 'sent', 0)
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def default_client():
+    """Return the shared client used by the module level functions"""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = PcatsClient()
+    return _default_client
+
+
+def set_default_client(client):
+    """Replace the shared client used by the module level functions"""
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
+
+
+def _client(client):
+    return client if client is not None else default_client()
+
 
 def _url(path):
-    return 'https://pcats.research.cchmc.org' + path
+    return default_client().url(path)
 
-def job_status(jobid):
+def job_status(jobid, client=None):
     """Return job status.
 
     Return status of the previously submitted job
@@ -14,6 +470,8 @@ def job_status(jobid):
     ----------
     jobid : UUID
             Job ID of the previously submitted job
+    client : PcatsClient
+            Client to use (the shared default client if not given)
 
     Returns
     -------
@@ -24,23 +482,57 @@ def job_status(jobid):
 
     if jobid is None:
         return "Error"
-    res=requests.get(_url('/api/job/{}/status'.format(jobid)))
+    cli = _client(client)
+    cache = cli.result_cache
+    if cache is not None and cache.is_done(jobid):
+        return "Done"
+    res=cli.get('/api/job/{}/status'.format(jobid))
     if res.status_code==200:
         res_json = res.json()
         if 'status' in res_json:
-            return res_json['status']
+            status = res_json['status']
+            _record_status(cli, jobid, status)
+            return status
     return None
 
 
-def wait_for_result(jobid):
+def _record_status(cli, jobid, status):
+    """Update the client's local state with a status seen for a job
+
+    Called with every status polled by job_status and with the final
+    status delivered by a push channel or a result stream, so the result
+    cache, the registry and the job budget agree whichever way the status
+    arrived.
+    """
+    final = status=="Done" or status.startswith("Error")
+    cache = cli.result_cache
+    if cache is not None:
+        if status=="Done":
+            cache.mark_done(jobid)
+        elif status.startswith("Error"):
+            cache.forget_job(jobid)
+    if cli.registry is not None:
+        cli.registry.update(jobid, status, result=cli.url(
+            '/api/job/{}/results'.format(jobid))
+            if status=="Done" else None)
+    if cli.scheduler is not None and final:
+        cli.scheduler.job_finished(jobid)
+
+
+def wait_for_result(jobid, client=None):
     """Wait while the job status is pending
 
-    Return when the job status is finished (either successfully or otherwise)
+    Return when the job status is finished (either successfully or otherwise).
+    The client's push channel is used when the server supports one (see
+    PcatsClient push), otherwise the job is polled by the client's shared
+    background poller, quickly at first and then with exponential backoff.
 
     Parameters
     ----------
     jobid : UUID
             Job ID of the previously submitted job
+    client : PcatsClient
+            Client to use (the shared default client if not given)
 
     Returns
     -------
@@ -49,13 +541,21 @@ def wait_for_result(jobid):
     """
     if jobid is None:
         return "Error"
-    while True:
-        status = job_status(jobid)
-        if status is None or status.startswith("Error"):
-            return "Error"
-        if status=="Done":
+    cli = _client(client)
+    if cli.result_cache is not None and cli.result_cache.is_done(jobid):
+        return "Done"
+    if cli.push:
+        from .push import wait_push
+        started = time.monotonic()
+        status = wait_push(jobid, cli)
+        if status is not None:
+            _record_status(cli, jobid, status)
+            # the poller reports the jobs it follows; report this one here
+            cli.emit('job', {'jobid': jobid, 'kind': None, 'status': status,
+                             'total_seconds': time.monotonic() - started,
+                             'queue_seconds': None, 'run_seconds': None})
             return status
-        time.sleep(5)
+    return cli.poller.wait(jobid)
 
 def ret_jobid(res):
     if res.status_code==200:
@@ -64,6 +564,208 @@ def ret_jobid(res):
             return res_json['jobid']
     return None
 
+# Status codes returned when a submission refers to an unknown file reference
+_STALE_REF_CODES = (404, 410)
+
+def _stale_ref(res):
+    """Return True if a submission was rejected for an unknown file reference
+
+    A 400 is also the answer to an invalid argument, so it only counts when
+    the error names the file reference.
+    """
+    if res.status_code in _STALE_REF_CODES:
+        return True
+    return res.status_code==400 and ('dataref' in res.text or
+                                     'fileref' in res.text)
+
+_DATA_FILES = (('datafile', 'dataref', 'sheet'),
+               ('mi_datafile', 'mi_dataref', 'mi_sheet'))
+
+def _upload(cli, datafile, token, progress=None, compress=None):
+    from .upload import post_multipart
+    data={
+        'data': _data_part(datafile),
+        }
+
+    res=post_multipart(cli, '/api/uploadfile', data, token=token,
+                       progress=progress, compress=compress,
+                       datafiles=[datafile])
+    if res.status_code==200:
+        res_json = res.json()
+        if 'fileref' in res_json:
+            return res_json['fileref']
+    return None
+
+def _cached_upload(cli, datafile, sheet, token, progress=None, compress=None):
+    """Return (fileref, True if it came from the client's upload cache)"""
+    cache = cli.upload_cache
+    key = cache.key(cli.base_url, datafile, sheet)
+    if key is None:
+        return _upload(cli, datafile, token, progress, compress), False
+    fileref = cache.get(key)
+    if fileref is not None:
+        return fileref, True
+    fileref = _upload(cli, datafile, token, progress, compress)
+    if fileref is not None:
+        cache.put(key, fileref)
+    return fileref, False
+
+def _submit_data_job(path, form, p):
+    """Submit a staticgp/dynamicgp job
+
+    With an upload cache, data files are replaced by their cached server
+    references. If the server rejects a submission that reused a cached
+    reference, the reference is dropped and the files are uploaded again.
+    """
+    from .upload import post_multipart
+    cli = _client(p['client'])
+    p = _datasets(cli, p)
+    fingerprint, jobid = _cached_jobid(cli, path, p)
+    if jobid is not None:
+        return jobid
+    if cli.preflight:
+        from .preflight import preflight
+        preflight(p)
+
+    def submit():
+        for attempt in range(2):
+            q = dict(p)
+            reused = []
+            if cli.upload_cache is not None:
+                for filekey, refkey, sheetkey in _DATA_FILES:
+                    if q[filekey] is not None and q[refkey] is None:
+                        fileref, hit = _cached_upload(cli, q[filekey],
+                                                      q[sheetkey], q['token'],
+                                                      compress=q['compress'])
+                        if fileref is not None:
+                            q[filekey], q[refkey] = None, fileref
+                            if hit:
+                                reused.append(fileref)
+            data, headers = form(q)
+            datafiles = [q[filekey] for filekey, refkey, sheetkey
+                         in _DATA_FILES if q[filekey] is not None]
+            res=post_multipart(cli, path, data, headers=headers,
+                               token=q['token'], compress=q['compress'],
+                               datafiles=datafiles)
+            if not reused or not _stale_ref(res):
+                break
+            for fileref in reused:
+                cli.upload_cache.invalidate(fileref)
+        return _store_jobid(cli, fingerprint, ret_jobid(res), path, p)
+
+    owner = None
+    if cli.pool is not None:
+        owner = cli.pool.owner(p['dataref']) or cli.pool.owner(p['mi_dataref'])
+    return _budgeted(cli, lambda: _on_server(cli, submit, owner))
+
+def _submit_cate(path, p):
+    cli = _client(p['client'])
+    fingerprint, jobid = _cached_jobid(cli, path, p)
+    if jobid is not None:
+        return jobid
+    from .upload import post_multipart
+
+    def submit():
+        data, headers = _cate_form(p)
+        res=post_multipart(cli, path, data, headers=headers, token=p['token'])
+        return _store_jobid(cli, fingerprint, ret_jobid(res), path, p)
+
+    owner = cli._locate(p['jobid']) if cli.pool is not None else None
+    return _budgeted(cli, lambda: _on_server(cli, submit, owner))
+
+def _budgeted(cli, submit):
+    """Return submit() once the client's job budget has a free slot"""
+    if cli.scheduler is None:
+        return submit()
+    def check(jobid):
+        # polling a job that holds a slot gives the slot back once finished
+        try:
+            job_status(jobid, client=cli)
+        except requests.RequestException:
+            pass
+
+    slot = cli.scheduler.start_job(check=check)
+    jobid = None
+    try:
+        jobid = submit()
+    finally:
+        cli.scheduler.job_submitted(slot, jobid)
+    return jobid
+
+def _on_server(cli, submit, owner=None):
+    """Return submit() with the requests of this thread sent to one server
+
+    Without an endpoint pool this is just submit(). Otherwise the server is
+    owner if given, or the one the pool chooses; when the chosen server
+    cannot be reached, submit() is repeated on another server.
+    """
+    if cli.pool is None or getattr(cli._local, 'base_url', None) is not None:
+        return submit()
+    tried = []
+    while True:
+        server = owner or cli.pool.choose(exclude=tried)
+        with cli._pin(server):
+            try:
+                return submit()
+            except requests.ConnectionError:
+                tried.append(server)
+                if owner is not None or not cli.pool.healthy(exclude=tried):
+                    raise
+
+def _cached_jobid(cli, path, p):
+    """Return (submission fingerprint, job ID of an identical earlier submission)
+
+    Both are None without a result cache or when use_cache is "0".
+    """
+    cache = cli.result_cache
+    if cache is None or str(p['use_cache'])=="0":
+        return None, None
+    fingerprint = cache.fingerprint(cli.url(path), p)
+    if fingerprint is None:
+        return None, None
+    return fingerprint, cache.get_jobid(fingerprint)
+
+def _store_jobid(cli, fingerprint, jobid, path, p):
+    """Remember a new submission in the result cache and job registry"""
+    if jobid is None:
+        return jobid
+    if fingerprint is not None:
+        cli.result_cache.put_jobid(fingerprint, jobid)
+    if cli.pool is not None:
+        cli.pool.assign(jobid, cli.base_url)
+    registry = cli.registry
+    if registry is not None:
+        if fingerprint is None:
+            fingerprint = registry.fingerprint(cli.url(path), p)
+        registry.add(jobid, path.rsplit('/', 1)[-1], p, fingerprint,
+                     cli.base_url)
+    return jobid
+
+def _artifact(cli, jobid, kind, token=None):
+    """Return a job output as bytes, from the result cache when possible"""
+    cache = cli.result_cache
+    if cache is not None:
+        content = cache.get(jobid, kind)
+        if content is not None:
+            return content
+    res = cli.get('/api/job/{}/{}'.format(jobid, kind), token=token)
+    if cache is not None and res.status_code==200 and cache.is_done(jobid):
+        cache.put(jobid, kind, res.content)
+    return res.content
+
+def _datasets(cli, p):
+    """Return p with in-memory data wrapped in Datasets for the server"""
+    from .dataset import as_dataset
+    p = dict(p)
+    for filekey, refkey, sheetkey in _DATA_FILES:
+        p[filekey] = as_dataset(p[filekey], cli)
+    return p
+
+# Multipart forms of the submit endpoints, see schema.py
+_staticgp_form = STATICGP.form
+_dynamicgp_form = DYNAMICGP.form
+_cate_form = CATE.form
+
 def staticgp(datafile=None,
              dataref=None,
              method="BART",
@@ -95,14 +797,16 @@ def staticgp(datafile=None,
              seed=5000,
              token=None,
              use_cache=None,
-             reuse_cached_jobid=None):
+             reuse_cached_jobid=None,
+             client=None,
+             compress=None):
     """Performs a data analysis for data with non-adaptive treatment(s).
 
       Bayesian's Gaussian process regression or Bayesian additive regression tree for data with non-adaptive treatment(s).
 
     Parameters
     ----------
-    datafile File to upload (.csv or .xls)
+    datafile File to upload (.csv or .xls), or in-memory data: a pandas DataFrame, a NumPy record array or a file object (see Dataset).
     dataref Reference to already uploaded file.
     method The method to be used. "GP" for GP method and "BART" for BART method. The default value is "BART".
     outcome The name of the outcome variable.
@@ -132,13 +836,15 @@ def staticgp(datafile=None,
     burn.num numeric; the number of MCMC 'burn-in' samples, i.e. number of MCMC to be discarded. The default value is 500.
     mcmc.num numeric; the number of MCMC samples after 'burn-in'. The default value is 500.
     x.categorical A vector of the name of categorical variables in data.
-    mi.datafile File to upload (.csv or .xls) that contains the imputed data in the model.
+    mi.datafile File to upload (.csv or .xls) that contains the imputed data in the model, or in-memory data; a list of DataFrames is sent as one table with an ".imp" column numbering the imputations.
     mi.dataref Reference to already uploaded file that contains the imputed data in the model.
     sheet If \code{datafile} or \code{dataref} points to an Excel file this variable specifies which sheet to load.
     mi.sheet If \code{mi.datafile} or \code{mi.dataurl} points to an Excel file this variable specifies which sheet to load.
     seed Sets the seed. The default value is 5000.
     token Authentication token.
     use_cache Use cached results (default True).
+    client PcatsClient to use (the shared default client if not given).
+    compress Compression of the uploaded data ("gzip", "zstd" or "auto"; see uploadfile).
 
 
     Returns
@@ -147,58 +853,11 @@ def staticgp(datafile=None,
         jobid
     """
 
-    data={
-        'data': (datafile, open(datafile, 'rb') if datafile!=None else None ),
-        'dataref': (None, dataref),
-        'outcome': (None, outcome),
-        'treatment': (None, treatment),
-        'x.explanatory': (None, x_explanatory),
-        'x.confounding': (None, x_confounding),
-        'tr.hte': (None, tr_hte),
-        'time': (None, time),
-        'time.value': (None, time_value),
-        'burn.num': (None, burn_num),
-        'mcmc.num': (None, mcmc_num),
-        'outcome.lb': (None, outcome_lb),
-        'outcome.ub': (None, outcome_ub),
-        'outcome.bound_censor': (None, outcome_bound_censor),
-        'outcome.type': (None, outcome_type),
-        'outcome.censor.lv': (None, outcome_censor_lv),
-        'outcome.censor.uv': (None, outcome_censor_uv),
-        'outcome.censor.yn': (None, outcome_censor_yn),
-        'outcome.link': (None, outcome_link),
-        'tr.type': (None, tr_type),
-        'tr.values': (None, tr_values),
-        'c.margin': (None, c_margin),
-        'x.categorical': (None, x_categorical),
-        'method': (None, method),
-        'mi.data':  (mi_datafile, open(mi_datafile, 'rb')
-                     if mi_datafile!=None else None ),
-        'mi.dataref': (None, mi_dataref),
-        'sheet': (None, sheet),
-        'mi.sheet': (None, mi_sheet),
-        'seed': (None, seed)
-        }
-
-    headers=dict()
-    if (str(use_cache)=="1"):
-        headers["X-API-Cache"]="1"
-    elif (str(use_cache)=="0"):
-        headers["X-API-Cache"]="0"
-
-    if (str(reuse_cached_jobid)=="1"):
-        headers["X-API-Reuse-Cached-Jobid"]="1"
-    elif (str(reuse_cached_jobid)=="0"):
-        headers["X-API-Reuse-Cached-Jobid"]="0"
-
-    if token is not None:
-        headers["Authorization"]="Bearer {}".format(token)
-
-    res=requests.post(_url('/api/staticgp'), files=data, headers=headers);
-    return ret_jobid(res)
+    return _submit_data_job('/api/staticgp', _staticgp_form, locals())
 
 def printgp(jobid,
-            token=None):
+            token=None,
+            client=None):
     """Print job results
 
    Return formatted string with job results
@@ -209,7 +868,9 @@ def printgp(jobid,
             Job ID of the previously submitted job
     token : string
             Authentication token.
-            
+    client : PcatsClient
+            Client to use (the shared default client if not given)
+
     Returns
     -------
     string
@@ -217,19 +878,16 @@ def printgp(jobid,
 
     """
 
-    headers=dict()
-    if token is not None:
-        headers["Authorization"]="Bearer {}".format(token)
-
-    return requests.get(_url(
-        '/api/job/{}/print'.format(jobid)),
-        headers=headers).content.decode("utf-8") 
+    return _artifact(_client(client), jobid, 'print', token).decode("utf-8")
 
 def results(jobid,
-            token=None):
+            token=None,
+            client=None,
+            parse=False):
     """Return job results
 
-    Return job results
+    Return job results, either as the JSON text or as a PcatsResult whose
+    sections (ATE, CATE, PrTE, ...) are decoded on first access.
 
     Parameters
     ----------
@@ -237,21 +895,23 @@ def results(jobid,
             Job ID of the previously submitted job
     token : string
             Authentication token.
-            
+    client : PcatsClient
+            Client to use (the shared default client if not given)
+    parse : bool
+            Return a PcatsResult instead of the JSON text.
+
     Returns
     -------
-    json
+    json or PcatsResult
         results
 
     """
 
-    headers=dict()
-    if token is not None:
-        headers["Authorization"]="Bearer {}".format(token)
-
-    return requests.get(_url(
-        '/api/job/{}/results'.format(jobid)),
-        headers=headers).content.decode("utf-8") 
+    content = _artifact(_client(client), jobid, 'results', token)
+    if parse:
+        from .result import PcatsResult
+        return PcatsResult(content)
+    return content.decode("utf-8")
 
 def staticgp_cate(jobid, 
               x, 
@@ -260,7 +920,8 @@ def staticgp_cate(jobid,
               c_margin=None,
               token=None,
               use_cache=None,
-              reuse_cached_jobid=None):
+              reuse_cached_jobid=None,
+              client=None):
     """Get conditional average treatment effect
 
     Estimate the conditional average treatment effect of user-specified treatment groups.
@@ -278,6 +939,7 @@ def staticgp_cate(jobid,
     c.margin An optional vector of user-defined values of c for PrCTE.
     token Authentication token.
     use_cache Use cached results (default True).
+    client PcatsClient to use (the shared default client if not given).
 
     Returns
     -------
@@ -285,28 +947,10 @@ def staticgp_cate(jobid,
         jobid
 
     """
-    data={
-        'x': (None, x),
-        'control.tr': (None, control_tr),
-        'treat.tr': (None, treat_tr),
-        'c.margin': (None, c_margin)}
+    return _submit_cate('/api/job/{}/staticgp.cate'.format(jobid), locals())
 
-    headers=dict()
-    if (str(use_cache)=="1"):
-        headers["X-API-Cache"]="1"
-    if (str(reuse_cached_jobid)=="1"):
-        headers["X-API-Reuse-Cached-Jobid"]="1"
-
-    if token is not None:
-        headers["Authorization"]="Bearer {}".format(token)
-
-    res=requests.post(_url(
-        '/api/job/{}/staticgp.cate'.format(jobid)), files=data, headers=headers);
-    return ret_jobid(res)
-
-def _printCATE(jobid):
-    return requests.get(_url(
-        '/api/job/{}/printCATE'.format(jobid))).content.decode("utf-8") 
+def _printCATE(jobid, client=None):
+    return _artifact(_client(client), jobid, 'printCATE').decode("utf-8")
 
 
 def dynamicgp(datafile=None,
@@ -362,14 +1006,16 @@ def dynamicgp(datafile=None,
               seed=5000,
               token=None,
               use_cache=None,
-              reuse_cached_jobid=None):
+              reuse_cached_jobid=None,
+              client=None,
+              compress=None):
     """Performs a data analysis for data with adaptive treatments.
 
     Performs Bayesian's Gaussian process regression or Bayesian additive regression tree for data with adaptive treatment(s).
 
     Parameters
     ----------
-    datafile File to upload (.csv or .xls)
+    datafile File to upload (.csv or .xls), or in-memory data: a pandas DataFrame, a NumPy record array or a file object (see Dataset).
     dataref Reference to already uploaded file.
     method The method to be used. "GP" for GP method and "BART" for BART method. The default value is "BART".
     stg1.outcome The name of the intermediate outcome variable for stage 1.
@@ -424,13 +1070,15 @@ def dynamicgp(datafile=None,
     burn.num numeric; the number of MCMC 'burn-in' samples, i.e. number of MCMC to be discarded. The default value is 500.
     mcmc.num numeric; the number of MCMC samples after 'burn-in'. The default value is 500.
     x.categorical A vector of the name of categorical variables in data.
-    mi.datafile File to upload (.csv or .xls) that contains the imputed data in the model.
+    mi.datafile File to upload (.csv or .xls) that contains the imputed data in the model, or in-memory data; a list of DataFrames is sent as one table with an ".imp" column numbering the imputations.
     mi.dataref Reference to already uploaded file that contains the imputed data in the model.
     sheet If \code{datafile} or \code{dataref} points to an Excel file this variable specifies which sheet to load.
     mi.sheet If \code{mi.datafile} or \code{mi.dataurl} points to an Excel file this variable specifies which sheet to load.
     seed Sets the seed. The default value is 5000.
     token Authentication token.
     use_cache Use cached results (default True).
+    client PcatsClient to use (the shared default client if not given).
+    compress Compression of the uploaded data ("gzip", "zstd" or "auto"; see uploadfile).
 
     Returns
     -------
@@ -439,72 +1087,7 @@ def dynamicgp(datafile=None,
 
     """
 
-    data={
-        'data': (datafile, open(datafile, 'rb') if datafile!=None else None ),
-        'dataref': (None, dataref),
-        'stg1.outcome': (None, stg1_outcome),
-        'stg1.treatment': (None, stg1_treatment),
-        'stg1.x.explanatory': (None, stg1_x_explanatory),
-        'stg1.x.confounding': (None, stg1_x_confounding),
-        'stg1.tr.hte': (None, stg1_tr_hte),
-        'stg1.tr.values': (None, stg1_tr_values),
-        'stg1.tr.type': (None, stg1_tr_type),
-        'stg1.time': (None, stg1_time),
-        'stg1.time.value': (None, stg1_time_value),
-        'stg1.outcome.type': (None, stg1_outcome_type),
-        'stg1.outcome.bound_censor': (None, stg1_outcome_bound_censor),
-        'stg1.outcome.lb': (None, stg1_outcome_lb),
-        'stg1.outcome.ub': (None, stg1_outcome_ub),
-        'stg1.outcome.censor.lv': (None, stg1_outcome_censor_lv),
-        'stg1.outcome.censor.uv': (None, stg1_outcome_censor_uv),
-        'stg1.outcome.censor.yn': (None, stg1_outcome_censor_yn),
-        'stg1.outcome.link': (None, stg1_outcome_link),
-        'stg1.c.margin': (None, stg1_c_margin),
-        'stg2.outcome': (None, stg2_outcome),
-        'stg2.treatment': (None, stg2_treatment),
-        'stg2.x.explanatory': (None, stg2_x_explanatory),
-        'stg2.x.confounding': (None, stg2_x_confounding),
-        'stg2.tr1.hte': (None, stg2_tr1_hte),
-        'stg2.tr2.hte': (None, stg2_tr2_hte),
-        'stg2.tr.values': (None, stg2_tr_values),
-        'stg2.tr.type': (None, stg2_tr_type),
-        'stg2.time': (None, stg2_time),
-        'stg2.time.value': (None, stg2_time_value),
-        'stg2.outcome.type': (None, stg2_outcome_type),
-        'stg2.outcome.bound_censor': (None, stg2_outcome_bound_censor),
-        'stg2.outcome.lb': (None, stg2_outcome_lb),
-        'stg2.outcome.ub': (None, stg2_outcome_ub),
-        'stg2.outcome.censor.lv': (None, stg2_outcome_censor_lv),
-        'stg2.outcome.censor.uv': (None, stg2_outcome_censor_uv),
-        'stg2.outcome.censor.yn': (None, stg2_outcome_censor_yn),
-        'stg2.outcome.link': (None, stg2_outcome_link),
-        'stg2.c.margin': (None, stg2_c_margin),
-        'burn.num': (None, burn_num),
-        'mcmc.num': (None, mcmc_num),
-        'x.categorical': (None, x_categorical),
-        'method': (None, method),
-        'mi.data':  (mi_datafile, open(mi_datafile, 'rb') if mi_datafile!=None else None ),
-        'mi.dataref': (None, mi_dataref),
-        'sheet': (None, sheet),
-        'mi.sheet': (None, mi_sheet),
-        'seed': (None, seed)
-        }
-
-    headers=dict()
-    if (str(use_cache)=="1"):
-        headers["X-API-Cache"]="1"
-    elif (str(use_cache)=="0"):
-        headers["X-API-Cache"]="0"
-
-    if (str(reuse_cached_jobid)=="1"):
-        headers["X-API-Reuse-Cached-Jobid"]="1"
-    elif (str(reuse_cached_jobid)=="0"):
-        headers["X-API-Reuse-Cached-Jobid"]="0"
-    if token is not None:
-        headers["Authorization"]="Bearer {}".format(token)
-
-    res=requests.post(_url('/api/dynamicgp'), files=data, headers=headers);
-    return ret_jobid(res)
+    return _submit_data_job('/api/dynamicgp', _dynamicgp_form, locals())
 
 def dynamicgp_cate(jobid, 
               x, 
@@ -513,7 +1096,8 @@ def dynamicgp_cate(jobid,
               c_margin=None,
               token=None,
               use_cache=None,
-              reuse_cached_jobid=None):
+              reuse_cached_jobid=None,
+              client=None):
     """Get conditional average treatment effect for data with two time points.
 
     Estimate the conditional average treatment effect of user-specified treatment groups.
@@ -531,6 +1115,7 @@ def dynamicgp_cate(jobid,
     c.margin An optional vector of user-defined values of c for PrCTE.
     token Authentication token.
     use_cache Use cached results (default True).
+    client PcatsClient to use (the shared default client if not given).
 
     Returns
     -------
@@ -538,54 +1123,49 @@ def dynamicgp_cate(jobid,
         jobid
 
     """
-    data={
-        'x': (None, x),
-        'control.tr': (None, control_tr),
-        'treat.tr': (None, treat_tr),
-        'c.margin': (None, c_margin)}
-
-    headers=dict()
-    if (str(use_cache)=="1"):
-        headers["X-API-Cache"]="1"
-    if (str(reuse_cached_jobid)=="1"):
-        headers["X-API-Reuse-Cached-Jobid"]="1"
-    if token is not None:
-        headers["Authorization"]="Bearer {}".format(token)
-
-    res=requests.post(_url(
-        '/api/job/{}/dynamicgp.cate'.format(jobid)), files=data, headers=headers);
-    return ret_jobid(res)
+    return _submit_cate('/api/job/{}/dynamicgp.cate'.format(jobid), locals())
 
 def uploadfile(datafile,
-               token=None):
+               token=None,
+               client=None,
+               progress=None,
+               compress=None):
     """Upload a file
 
-    Upload a file
+    Upload a file. If the client has an upload cache, a file whose content
+    was uploaded before is not sent again and its cached reference is
+    returned. The file is streamed from disk a block at a time.
 
     Parameters
     ----------
-    filename Filename of a file to upload
+    filename Filename of a file to upload, or in-memory data (a pandas DataFrame, NumPy record array, list of DataFrames, bytes or file object, see Dataset)
+    token Authentication token.
+    client PcatsClient to use (the shared default client if not given).
+    progress Callable receiving (bytes sent, total bytes) while uploading.
+    compress Request body compression: "gzip", "zstd", "auto" (gzip text
+        files of 64 KiB or more, send .xls as is) or None for the client's
+        default. The ratio and estimated time saved are in client.stats.
 
     Returns
     -------
     backend filename reference
     """
-    data={
-        'data': (datafile, open(datafile, 'rb') if datafile!=None else None ),
-        }
-
-    headers=dict()
-    if token is not None:
-        headers["Authorization"]="Bearer {}".format(token)
-
-    res=requests.post(_url('/api/uploadfile'), files=data, headers=headers);
-    if res.status_code==200:
-        res_json = res.json()
-        if 'fileref' in res_json:
-            return res_json['fileref']
-    return None
-
-def ploturl(jobid,plottype=None):
+    cli = _client(client)
+    from .dataset import as_dataset
+    datafile = as_dataset(datafile, cli)
+
+    def upload():
+        if cli.upload_cache is not None and datafile is not None:
+            fileref = _cached_upload(cli, datafile, None, token, progress,
+                                     compress)[0]
+        else:
+            fileref = _upload(cli, datafile, token, progress, compress)
+        if cli.pool is not None and fileref is not None:
+            cli.pool.assign(fileref, cli.base_url)
+        return fileref
+    return _on_server(cli, upload)
+
+def ploturl(jobid,plottype=None,client=None):
     """Return plot URL
 
     Return plot URL
@@ -597,6 +1177,8 @@ def ploturl(jobid,plottype=None):
 
     plottype : string
             Plot Type
+    client : PcatsClient
+            Client to use (the shared default client if not given)
 
     Returns
     -------
@@ -609,8 +1191,7 @@ def ploturl(jobid,plottype=None):
         plottype="/{}".format(plottype)
     else:
         plottype=""
-    res=requests.get(_url(
-        '/api/job/{}/ploturl'.format(jobid))).content.decode("utf-8") 
+    res=_client(client).get('/api/job/{}/ploturl'.format(jobid))
     if res.status_code==200:
         res_json = res.json()
         if 'url' in res_json:
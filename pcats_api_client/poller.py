@@ -0,0 +1,241 @@
+"""
+Background poller tracking the status of many jobs at once.
+"""
+
+import heapq
+import itertools
+import random
+import statistics
+import threading
+import time
+import warnings
+from collections import defaultdict, deque
+from concurrent.futures import Future
+
+import requests
+
+from . import pcats_api
+
+# Statuses of jobs waiting for the server to start them
+QUEUED_STATUSES = ('Pending', 'Queued', 'Waiting', 'Submitted')
+
+
+class Backoff(object):
+    """Exponential backoff schedule with jitter.
+
+    Parameters
+    ----------
+    initial : float
+            Delay before the first retry in seconds.
+    factor : float
+            Multiplier applied to the delay after each attempt.
+    maximum : float
+            Upper bound of the delay in seconds.
+    jitter : float
+            Fraction of the delay randomized in both directions.
+    """
+
+    def __init__(self, initial=0.5, factor=1.5, maximum=30.0, jitter=0.1):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        """Return the delay before the given (0 based) attempt"""
+        delay = min(self.maximum, self.initial * self.factor ** attempt)
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class _Job(object):
+    __slots__ = ('jobid', 'kind', 'future', 'callbacks', 'polls', 'started',
+                 'running', 'errors')
+
+    def __init__(self, jobid, kind):
+        self.jobid = jobid
+        self.kind = kind
+        self.future = Future()
+        self.callbacks = []
+        self.polls = 0
+        self.started = time.monotonic()
+        self.running = None
+        self.errors = 0
+
+
+class JobPoller(object):
+    """Poll many jobs from a single background thread.
+
+    Each job is polled quickly right after it is tracked and then with
+    exponential backoff, so short jobs finish with little added latency
+    while long jobs cost few status requests. When `learn` is set the
+    first poll of a job is delayed until close to the median duration
+    observed for earlier jobs of the same kind (e.g. "GP" or "BART").
+
+    Parameters
+    ----------
+    client : PcatsClient
+            Client to use (the shared default client if not given).
+    backoff : Backoff
+            Poll schedule of a job.
+    learn : bool
+            Tune the first poll of a job from observed durations per kind.
+    history : int
+            Number of recent durations kept per kind.
+    max_errors : int
+            Consecutive failed status requests (connection errors, open
+            circuit breaker) tolerated before a waiter gets the exception.
+    """
+
+    def __init__(self, client=None, backoff=None, learn=True, history=20,
+                 max_errors=10):
+        self.client = client
+        self.max_errors = max_errors
+        self.backoff = backoff if backoff is not None else Backoff()
+        self.learn = learn
+        self.durations = defaultdict(lambda: deque(maxlen=history))
+        self.jobs = dict()
+        self.polls = 0
+        self._queue = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def track(self, jobid, kind=None, callback=None):
+        """Start tracking a job
+
+        Parameters
+        ----------
+        jobid : UUID
+                Job ID of the previously submitted job
+        kind : string
+                Job category used to learn typical durations (e.g. method).
+        callback : callable
+                Called with (jobid, status) when the job finishes.
+
+        Returns
+        -------
+        concurrent.futures.Future
+            resolves to the final status ("Done" or "Error")
+        """
+        if jobid is None:
+            future = Future()
+            future.set_result("Error")
+            return future
+        with self._cond:
+            job = self.jobs.get(jobid)
+            if job is None:
+                job = self.jobs[jobid] = _Job(jobid, kind)
+                self._schedule(job, self._first_delay(kind))
+                self._ensure_thread()
+            if callback is not None:
+                job.callbacks.append(callback)
+            return job.future
+
+    def wait(self, jobid, kind=None, timeout=None):
+        """Block until the job finishes and return its final status"""
+        return self.track(jobid, kind).result(timeout)
+
+    def stop(self):
+        """Stop the background thread"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _first_delay(self, kind):
+        observed = self.durations.get(kind) if self.learn else None
+        if observed:
+            return max(self.backoff.initial,
+                       min(self.backoff.maximum,
+                           0.9 * statistics.median(observed)))
+        return self.backoff.delay(0)
+
+    def _schedule(self, job, delay):
+        heapq.heappush(self._queue, (time.monotonic() + delay,
+                                     next(self._counter), job))
+        self._cond.notify()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run,
+                                            name='pcats-poller')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if self._queue:
+                        delay = self._queue[0][0] - time.monotonic()
+                        if delay <= 0:
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+                if self._stopped:
+                    return
+                due, _, job = heapq.heappop(self._queue)
+            self._poll(job)
+
+    def _poll(self, job):
+        cli = pcats_api._client(self.client)
+        try:
+            status = pcats_api.job_status(job.jobid, client=cli)
+        except requests.RequestException as e:
+            # the job keeps running on the server; try again later
+            job.errors += 1
+            if job.errors > self.max_errors:
+                self._finish(job, exception=e)
+            else:
+                with self._cond:
+                    self._schedule(job, self.backoff.delay(job.errors))
+            return
+        except Exception as e:
+            self._finish(job, exception=e)
+            return
+        job.errors = 0
+        job.polls += 1
+        self.polls += 1
+        cli.emit('poll', {'jobid': job.jobid, 'status': status})
+        now = time.monotonic()
+        if status is None or status.startswith("Error"):
+            self._report(cli, job, "Error", now)
+            self._finish(job, "Error")
+        elif status == "Done":
+            if job.kind is not None:
+                self.durations[job.kind].append(now - job.started)
+            self._report(cli, job, status, now)
+            self._finish(job, status)
+        else:
+            if job.running is None and status not in QUEUED_STATUSES:
+                job.running = now
+            with self._cond:
+                self._schedule(job, self.backoff.delay(job.polls))
+
+    def _report(self, cli, job, status, now):
+        cli.emit('job', {
+            'jobid': job.jobid,
+            'kind': job.kind,
+            'status': status,
+            'total_seconds': now - job.started,
+            'queue_seconds': (job.running - job.started
+                              if job.running is not None else None),
+            'run_seconds': (now - job.running
+                            if job.running is not None else None)})
+
+    def _finish(self, job, status=None, exception=None):
+        with self._cond:
+            self.jobs.pop(job.jobid, None)
+        if exception is not None:
+            job.future.set_exception(exception)
+            return
+        job.future.set_result(status)
+        for callback in job.callbacks:
+            # a failing callback must not stop the thread polling other jobs
+            try:
+                callback(job.jobid, status)
+            except Exception as e:
+                warnings.warn('pcats job callback {!r} failed: {}'.format(
+                    callback, e))
@@ -0,0 +1,195 @@
+"""
+Several PCATS servers used as one, with routing, health checks and failover.
+"""
+
+import itertools
+import random
+import re
+import threading
+import time
+
+STRATEGIES = ('least-outstanding', 'weighted')
+
+# Relative paths of requests about an existing job
+_JOB_PATH = re.compile(r'^/api/job/([^/?]+)')
+
+
+def job_of(path):
+    """Return the job ID a request path refers to, or None"""
+    match = _JOB_PATH.match(path)
+    return match.group(1) if match else None
+
+
+class Endpoint(object):
+    """State of one server of an EndpointPool"""
+
+    __slots__ = ('url', 'weight', 'outstanding', 'down_since', 'failures',
+                 'picked')
+
+    def __init__(self, url, weight=1):
+        if weight < 0:
+            raise ValueError('negative weight for {}'.format(url))
+        self.url = url.rstrip('/')
+        self.weight = weight
+        self.outstanding = 0
+        self.down_since = None
+        self.failures = 0
+        self.picked = 0
+
+    @property
+    def healthy(self):
+        return self.down_since is None
+
+    def __repr__(self):
+        return 'Endpoint({}, weight={}, {})'.format(
+            self.url, self.weight, 'up' if self.healthy else 'down')
+
+
+class EndpointPool(object):
+    """PCATS servers sharing the load of one client.
+
+    New submissions and uploads go to a healthy server chosen by the
+    strategy; status, results and CATE requests about a job go to the
+    server that owns the job. A server that cannot be reached is marked
+    down and skipped until `recheck` seconds have passed, when it gets
+    requests again (and is marked up by the first one that succeeds);
+    check() probes every server at once.
+
+    Parameters
+    ----------
+    urls : list of string or dict
+            Server URLs, or {URL: weight}.
+    strategy : string
+            "least-outstanding" sends a new submission to the server with
+            the fewest requests in flight relative to its weight, rotating
+            among equals; "weighted" picks servers at random in proportion
+            to their weights.
+    recheck : float
+            Seconds a server stays out of rotation after a failure.
+    health_path : string
+            Path requested by check().
+    seed : int
+            Seed of the weighted choice.
+    """
+
+    def __init__(self, urls, strategy='least-outstanding', recheck=30.0,
+                 health_path='/api/capabilities', seed=None):
+        if strategy not in STRATEGIES:
+            raise ValueError('unknown strategy {!r}'.format(strategy))
+        weights = urls if isinstance(urls, dict) else dict()
+        self.endpoints = [Endpoint(url, weights.get(url, 1)) for url in urls]
+        if not self.endpoints:
+            raise ValueError('no PCATS servers given')
+        self.strategy = strategy
+        self.recheck = recheck
+        self.health_path = health_path
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self._by_url = dict((e.url, e) for e in self.endpoints)
+        self._owners = dict()
+        self._counter = itertools.count(1)
+
+    def __repr__(self):
+        return 'EndpointPool({})'.format(self.urls)
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    @property
+    def urls(self):
+        return [e.url for e in self.endpoints]
+
+    def _available(self, endpoint, now):
+        return endpoint.weight > 0 and (
+            endpoint.down_since is None or
+            now - endpoint.down_since >= self.recheck)
+
+    def healthy(self, exclude=()):
+        """Return the URLs of the servers currently in rotation"""
+        now = time.monotonic()
+        with self.lock:
+            return [e.url for e in self.endpoints
+                    if e.url not in exclude and self._available(e, now)]
+
+    def choose(self, exclude=()):
+        """Return the URL of the server for a new submission
+
+        Servers out of rotation are only chosen when no other server is
+        left, the one that failed longest ago first. None when every
+        server is excluded.
+        """
+        now = time.monotonic()
+        with self.lock:
+            candidates = [e for e in self.endpoints if e.url not in exclude]
+            if not candidates:
+                return None
+            up = [e for e in candidates if self._available(e, now)]
+            if not up:
+                endpoint = min(candidates,
+                               key=lambda e: e.down_since or float('-inf'))
+            elif self.strategy == 'weighted':
+                endpoint = self.random.choices(
+                    up, weights=[e.weight for e in up])[0]
+            else:
+                endpoint = min(up, key=lambda e: (e.outstanding / e.weight,
+                                                  e.picked))
+            endpoint.picked = next(self._counter)
+            return endpoint.url
+
+    def acquire(self, url):
+        """Count a request sent to a server"""
+        with self.lock:
+            self._by_url[url].outstanding += 1
+
+    def release(self, url):
+        """Count a request to a server as finished"""
+        with self.lock:
+            self._by_url[url].outstanding -= 1
+
+    def mark_down(self, url):
+        """Take a server out of rotation after a failure"""
+        with self.lock:
+            endpoint = self._by_url[url]
+            endpoint.down_since = time.monotonic()
+            endpoint.failures += 1
+
+    def mark_up(self, url):
+        """Put a server back into rotation"""
+        with self.lock:
+            self._by_url[url].down_since = None
+
+    def assign(self, key, url):
+        """Record that a job ID or file reference belongs to a server"""
+        with self.lock:
+            self._owners[key] = url
+
+    def owner(self, key):
+        """Return the server of a job ID or file reference, or None"""
+        with self.lock:
+            return self._owners.get(key)
+
+    def check(self, session=None, timeout=5):
+        """Probe every server and update which are in rotation
+
+        A server is up when health_path answers with a status below 500.
+
+        Returns
+        -------
+        dict
+            {URL: True if up}
+        """
+        import requests
+        session = session or requests
+        health = dict()
+        for endpoint in self.endpoints:
+            try:
+                res = session.get(endpoint.url + self.health_path,
+                                  timeout=timeout)
+                health[endpoint.url] = res.status_code < 500
+            except requests.RequestException:
+                health[endpoint.url] = False
+            if health[endpoint.url]:
+                self.mark_up(endpoint.url)
+            else:
+                self.mark_down(endpoint.url)
+        return health
@@ -0,0 +1,280 @@
+"""
+Local checks of a submission against its dataset before anything is sent.
+"""
+
+import csv
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from .dataset import as_dataset
+from .schema import DYNAMICGP, STATICGP, VECTOR
+
+# Arguments naming variables of the dataset
+_VARIABLES = re.compile(r'^(stg[12]_)?(outcome|treatment|x_explanatory|'
+                        r'x_confounding|tr[12]?_hte|'
+                        r'outcome_censor_(yn|lv|uv))$|^x_categorical$')
+
+# Variables that must be mostly observed
+_REQUIRED = re.compile(r'^(stg[12]_)?(outcome|treatment|x_confounding)$')
+
+NA_VALUES = frozenset(['', 'NA', 'N/A', 'NaN', 'nan', 'NULL', 'null', '.',
+                       '<NA>', 'NaT'])
+
+# Arguments sent as comma separated lists (see schema.VECTOR)
+_LISTS = frozenset(f.arg for f in STATICGP.fields + DYNAMICGP.fields
+                   if f.kind == VECTOR)
+
+_scans = OrderedDict()
+_scans_lock = threading.Lock()
+
+
+class PreflightError(ValueError):
+    """Raised when a submission does not match its dataset
+
+    Attributes
+    ----------
+    problems : list of string
+            Everything found wrong with the submission.
+    """
+
+    def __init__(self, problems):
+        ValueError.__init__(self, 'invalid submission: ' + '; '.join(problems))
+        self.problems = problems
+
+
+class ColumnSummary(object):
+    """Counts of the sampled values of one column"""
+
+    __slots__ = ('count', 'missing', 'numeric')
+
+    def __init__(self):
+        self.count = 0
+        self.missing = 0
+        self.numeric = 0
+
+    def add(self, value):
+        self.count += 1
+        if value is None or (isinstance(value, float) and value != value):
+            # None or NaN
+            self.missing += 1
+            return
+        if isinstance(value, (int, float)):
+            self.numeric += 1
+            return
+        value = str(value)
+        value = value.strip()
+        if value in NA_VALUES:
+            self.missing += 1
+            return
+        try:
+            float(value)
+        except ValueError:
+            return
+        self.numeric += 1
+
+    @property
+    def missing_fraction(self):
+        return self.missing / self.count if self.count else 0.0
+
+    @property
+    def is_numeric(self):
+        """True if every observed value is a number"""
+        return self.numeric == self.count - self.missing
+
+
+def _csv_rows(path):
+    with open(path, newline='', encoding='utf-8-sig', errors='replace') as f:
+        head = f.read(1 << 16)
+        try:
+            dialect = csv.Sniffer().sniff(head, delimiters=',;\t|')
+        except csv.Error:
+            dialect = csv.excel
+        f.seek(0)
+        for row in csv.reader(f, dialect):
+            yield row
+
+
+def _xls_rows(path, sheet):
+    import xlrd
+    book = xlrd.open_workbook(path, on_demand=True)
+    try:
+        table = (book.sheet_by_name(sheet) if sheet is not None
+                 else book.sheet_by_index(0))
+        for i in range(table.nrows):
+            yield table.row_values(i)
+    finally:
+        book.release_resources()
+
+
+def _xlsx_rows(path, sheet):
+    import openpyxl
+    book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        table = book[sheet] if sheet is not None else book.worksheets[0]
+        for row in table.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        book.close()
+
+
+def scan(datafile, sheet=None, sample_rows=10000):
+    """Return {column: ColumnSummary} from the header and the first rows
+
+    Only the header and up to `sample_rows` rows are read. Summaries are
+    remembered per file, size and modification time.
+
+    Returns
+    -------
+    OrderedDict or None
+        None for a file type that cannot be read here (.csv, .tsv and .txt
+        are read as delimited text, .xls needs xlrd, .xlsx needs openpyxl).
+    """
+    st = os.stat(datafile)
+    key = (os.path.abspath(datafile), st.st_size, st.st_mtime_ns, sheet,
+           sample_rows)
+    with _scans_lock:
+        if key in _scans:
+            _scans.move_to_end(key)
+            return _scans[key]
+    ext = os.path.splitext(datafile)[1].lower()
+    try:
+        if ext == '.xls':
+            rows = _xls_rows(datafile, sheet)
+        elif ext == '.xlsx':
+            rows = _xlsx_rows(datafile, sheet)
+        elif ext in ('.csv', '.tsv', '.txt'):
+            rows = _csv_rows(datafile)
+        else:
+            return None
+        summary = _summarize(rows, sample_rows)
+    except ImportError:
+        return None
+    with _scans_lock:
+        _scans[key] = summary
+        while len(_scans) > 32:
+            _scans.popitem(last=False)
+    return summary
+
+
+def _summarize(rows, sample_rows):
+    summary = OrderedDict()
+    header = None
+    for i, row in enumerate(rows):
+        if header is None:
+            header = [str(name).strip() if name is not None else ''
+                      for name in row]
+            for name in header:
+                summary[name] = ColumnSummary()
+            continue
+        if i > sample_rows:
+            break
+        for name, value in zip(header, row):
+            summary[name].add(value)
+        for name in header[len(row):]:
+            summary[name].add(None)
+    if hasattr(rows, 'close'):
+        rows.close()
+    return summary
+
+
+def _names(arg, value):
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [str(v) for v in value]
+    if arg in _LISTS:
+        # "x1,x2" reaches the server exactly like ["x1", "x2"]
+        return [v.strip() for v in str(value).split(',')]
+    return [str(value)]
+
+
+def check(params, datafile=None, sheet=None, max_missing=0.5,
+          sample_rows=10000):
+    """Return the problems of a submission's variables in a dataset
+
+    Every argument naming variables (outcome, treatment, x_explanatory,
+    x_confounding, tr_hte, the censoring variables, x_categorical
+    and their stg1_/stg2_ forms) must name columns of the data. Outcomes
+    declared "Continuous", treatments declared "Continuous" and censoring
+    bounds must be numeric, and outcomes, treatments and confounders may
+    not be missing in more than `max_missing` of the sampled rows.
+
+    Parameters
+    ----------
+    params : dict
+            Arguments of staticgp or dynamicgp.
+    datafile : string or Dataset
+            Data file (params["datafile"] if not given).
+    sheet : string
+            Excel sheet of datafile.
+    max_missing : float
+            Largest tolerated fraction of missing values.
+    sample_rows : int
+            Number of rows examined.
+
+    Returns
+    -------
+    list of string
+        empty when nothing is wrong or the file cannot be read here
+    """
+    if datafile is None:
+        datafile, sheet = params.get('datafile'), params.get('sheet')
+    if datafile is None:
+        return []
+    if isinstance(datafile, (str, os.PathLike)):
+        columns = scan(datafile, sheet, sample_rows)
+        name = os.path.basename(datafile)
+    elif hasattr(datafile, 'rows'):
+        columns = _summarize(datafile.rows(), sample_rows)
+        name = datafile.filename
+    else:
+        return []
+    if not columns:
+        return []
+    problems = []
+    for arg, value in sorted(params.items()):
+        if value is None or not _VARIABLES.match(arg):
+            continue
+        for i, variable in enumerate(_names(arg, value)):
+            column = columns.get(variable)
+            if column is None:
+                problems.append('{} {!r} is not a column of {}'.format(
+                    arg, variable, name))
+                continue
+            if _REQUIRED.match(arg) and column.missing_fraction > max_missing:
+                problems.append('{} {!r} is missing in {:.0%} of the rows'
+                                .format(arg, variable,
+                                        column.missing_fraction))
+            if column.is_numeric or not _numeric(params, arg, i):
+                continue
+            problems.append('{} {!r} is not numeric'.format(arg, variable))
+    return problems
+
+
+def _numeric(params, arg, index):
+    """Return True if the variable of arg must hold numbers"""
+    prefix = arg[:5] if arg.startswith('stg') else ''
+    base = arg[len(prefix):]
+    if base == 'outcome':
+        return params.get(prefix + 'outcome_type', 'Continuous') == \
+            'Continuous'
+    if base == 'treatment':
+        return index == 0 and params.get(prefix + 'tr_type', 'Discrete') == \
+            'Continuous'
+    return base in ('outcome_censor_lv', 'outcome_censor_uv')
+
+
+def preflight(params, max_missing=0.5, sample_rows=10000):
+    """Check a submission's data files and raise PreflightError if invalid
+
+    Checks datafile and mi_datafile (see check()).
+    """
+    problems = []
+    for filekey, sheetkey in (('datafile', 'sheet'),
+                              ('mi_datafile', 'mi_sheet')):
+        if params.get(filekey) is not None:
+            problems.extend(check(params, as_dataset(params[filekey]),
+                                  params.get(sheetkey), max_missing,
+                                  sample_rows))
+    if problems:
+        raise PreflightError(problems)
@@ -0,0 +1,188 @@
+"""
+Server push notification of job completion.
+
+A server advertises the channels it supports at /api/capabilities, e.g.
+``{"push": ["sse", "longpoll", "webhook"]}``:
+
+sse
+    GET /api/job/{jobid}/events streams ``data: {"status": ...}`` events.
+longpoll
+    GET /api/job/{jobid}/status?wait=N answers when the status changes or
+    after N seconds.
+webhook
+    POST /api/job/{jobid}/webhook with a ``url`` field makes the server
+    POST ``{"jobid": ..., "status": ...}`` to that URL when the job ends.
+
+wait_for_result uses these when available and falls back to polling.
+"""
+
+import json
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from . import pcats_api
+
+LONGPOLL_WAIT = 30
+
+
+def _final(status):
+    """Return the final status or None while the job is still pending"""
+    if status is None or status.startswith("Error"):
+        return "Error"
+    if status == "Done":
+        return status
+    return None
+
+
+def server_capabilities(client=None):
+    """Return the set of push channels advertised by the server"""
+    cli = pcats_api._client(client)
+    return frozenset(cli.capabilities().get('push') or ())
+
+
+def wait_sse(jobid, client=None):
+    """Wait for a job over server-sent events and return its final status"""
+    cli = pcats_api._client(client)
+    res = cli.get('/api/job/{}/events'.format(jobid), stream=True,
+                  headers={'Accept': 'text/event-stream'})
+    with res:
+        if res.status_code != 200:
+            return None
+        for line in res.iter_lines(decode_unicode=True):
+            if line and line.startswith('data:'):
+                event = json.loads(line[5:])
+                status = _final(event.get('status'))
+                if status is not None:
+                    return status
+    return None
+
+
+def wait_longpoll(jobid, client=None, wait=LONGPOLL_WAIT):
+    """Wait for a job with long-polling status requests"""
+    cli = pcats_api._client(client)
+    while True:
+        res = cli.get('/api/job/{}/status'.format(jobid),
+                      params={'wait': wait}, timeout=wait + 30)
+        if res.status_code != 200:
+            return None
+        status = _final(res.json().get('status'))
+        if status is not None:
+            return status
+
+
+def wait_push(jobid, client=None):
+    """Wait for a job over the best push channel of the client
+
+    Returns None when no push channel is available or it failed, so the
+    caller can fall back to polling.
+    """
+    cli = pcats_api._client(client)
+    try:
+        if isinstance(cli.push, WebhookReceiver):
+            if 'webhook' in server_capabilities(cli):
+                return cli.push.wait(jobid, cli)
+            return None
+        channels = server_capabilities(cli)
+        if 'sse' in channels:
+            return wait_sse(jobid, cli)
+        if 'longpoll' in channels:
+            return wait_longpoll(jobid, cli)
+    except requests.RequestException:
+        pass
+    return None
+
+
+class WebhookReceiver(object):
+    """Local HTTP endpoint receiving job completion callbacks.
+
+    Pass it as PcatsClient(push=receiver) so that wait_for_result registers
+    a callback for the job and sleeps until the server calls it back.
+
+    Parameters
+    ----------
+    host : string
+            Interface to listen on.
+    port : int
+            Port to listen on (0 picks a free port).
+    public_url : string
+            URL under which the server reaches this receiver, if it differs
+            from http://host:port.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, public_url=None):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    event = json.loads(self.rfile.read(length))
+                    receiver.notify(event['jobid'], event['status'])
+                    code = 204
+                except (ValueError, KeyError):
+                    code = 400
+                self.send_response(code)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+        self.lock = threading.Lock()
+        self.futures = dict()
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = public_url or 'http://{}:{}'.format(
+            *self.httpd.server_address[:2])
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _register(self, jobid):
+        """Return the future of a job, counting one more waiter"""
+        with self.lock:
+            entry = self.futures.setdefault(jobid, [Future(), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _unregister(self, jobid):
+        with self.lock:
+            entry = self.futures.get(jobid)
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del self.futures[jobid]
+
+    def notify(self, jobid, status):
+        """Resolve the wait for a job; jobs nobody waits for are ignored"""
+        status = _final(status)
+        if status is None:
+            return
+        with self.lock:
+            entry = self.futures.get(jobid)
+            if entry is not None and not entry[0].done():
+                entry[0].set_result(status)
+
+    def wait(self, jobid, client=None, timeout=None):
+        """Register a callback for a job and wait for its final status"""
+        cli = pcats_api._client(client)
+        future = self._register(jobid)
+        try:
+            res = cli.post('/api/job/{}/webhook'.format(jobid),
+                           files={'url': (None, self.url)})
+            if res.status_code != 200:
+                return None
+            # the job may have ended before the callback was registered
+            status = _final(pcats_api.job_status(jobid, client=cli))
+            if status is not None:
+                return status
+            return future.result(timeout)
+        finally:
+            self._unregister(jobid)
@@ -0,0 +1,220 @@
+"""
+Durable local registry of submitted jobs.
+"""
+
+import json
+import time
+
+from . import pcats_api
+from .upload_cache import _IGNORED, _SqliteStore
+
+_COLUMNS = ('jobid', 'endpoint', 'base_url', 'fingerprint', 'params',
+            'status', 'submitted', 'updated', 'result')
+
+# Matches jobs that have not finished yet
+_PENDING = "(status IS NULL OR (status != 'Done' AND status NOT LIKE 'Error%'))"
+
+
+class JobRegistry(_SqliteStore):
+    """Record of every job submitted through a client, shared by processes.
+
+    Pass it as PcatsClient(registry=...) and each staticgp, dynamicgp and
+    CATE submission is recorded with its endpoint, arguments and
+    submission fingerprint, every status the client sees is recorded as a
+    transition, and finished jobs get the location of their results. A
+    process started after a crash calls reattach() to wait for the jobs
+    that were still running instead of submitting them again.
+
+    The database is opened in write-ahead-log mode so several processes
+    can use it at the same time, and is indexed for listing thousands of
+    jobs by status, endpoint or fingerprint.
+
+    Parameters
+    ----------
+    path : string
+            SQLite database file (":memory:" for a process local registry).
+            The default value is jobs.sqlite in the user cache directory.
+    """
+
+    def __init__(self, path=None):
+        _SqliteStore.__init__(self, path, 'jobs.sqlite')
+        self.db.execute('PRAGMA journal_mode=WAL')
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS jobs ('
+                            'jobid TEXT PRIMARY KEY, endpoint TEXT, '
+                            'base_url TEXT, fingerprint TEXT, params TEXT, '
+                            'status TEXT, submitted REAL, updated REAL, '
+                            'result TEXT)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS jobs_status '
+                            'ON jobs (status, submitted)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS jobs_submitted '
+                            'ON jobs (submitted)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS jobs_fingerprint '
+                            'ON jobs (fingerprint)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS transitions ('
+                            'jobid TEXT, status TEXT, at REAL)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS transitions_jobid '
+                            'ON transitions (jobid, at)')
+
+    def add(self, jobid, endpoint, params=None, fingerprint=None,
+            base_url=None):
+        """Record a submitted job
+
+        Parameters
+        ----------
+        jobid : UUID
+                Job ID returned by the server.
+        endpoint : string
+                Endpoint name, e.g. "staticgp" or "staticgp.cate".
+        params : dict
+                Arguments of the submission; tokens and clients are left out.
+        fingerprint : string
+                Submission fingerprint (see ResultCache.fingerprint).
+        base_url : string
+                Server the job runs on.
+        """
+        params = dict((k, v) for k, v in (params or dict()).items()
+                      if k not in _IGNORED and v is not None)
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute('INSERT OR IGNORE INTO jobs VALUES '
+                            '(?,?,?,?,?,?,?,?,?)',
+                            (jobid, endpoint, base_url, fingerprint,
+                             json.dumps(params, sort_keys=True, default=str),
+                             None, now, now, None))
+
+    def update(self, jobid, status, result=None):
+        """Record the status of a job (and where its results are)
+
+        A transition is recorded only when the status changed.
+        """
+        now = time.time()
+        with self.lock, self.db:
+            changed = self.db.execute(
+                'UPDATE jobs SET status=?, updated=? '
+                'WHERE jobid=? AND status IS NOT ?',
+                (status, now, jobid, status)).rowcount
+            if changed:
+                self.db.execute('INSERT INTO transitions VALUES (?,?,?)',
+                                (jobid, status, now))
+            if result is not None:
+                self.db.execute('UPDATE jobs SET result=? WHERE jobid=?',
+                                (result, jobid))
+
+    def get(self, jobid):
+        """Return the record of a job as a dict, or None"""
+        with self.lock:
+            row = self.db.execute('SELECT * FROM jobs WHERE jobid=?',
+                                  (jobid,)).fetchone()
+        return _record(row) if row is not None else None
+
+    def find(self, status=None, endpoint=None, fingerprint=None, since=None,
+             limit=None):
+        """Return records of matching jobs, most recent submission first
+
+        Parameters
+        ----------
+        status : string
+                Exact status, or "pending" for jobs not finished yet.
+        endpoint : string
+                Endpoint name, e.g. "staticgp" or "staticgp.cate".
+        fingerprint : string
+                Submission fingerprint.
+        since : float
+                Only jobs submitted at or after this time (seconds since
+                the epoch).
+        limit : int
+                Maximum number of records.
+        """
+        where = []
+        args = []
+        if status == 'pending':
+            where.append(_PENDING)
+        elif status is not None:
+            where.append('status=?')
+            args.append(status)
+        for column, value in (('endpoint', endpoint),
+                              ('fingerprint', fingerprint)):
+            if value is not None:
+                where.append('{}=?'.format(column))
+                args.append(value)
+        if since is not None:
+            where.append('submitted>=?')
+            args.append(since)
+        sql = 'SELECT * FROM jobs'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY submitted DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            args.append(limit)
+        with self.lock:
+            rows = self.db.execute(sql, args).fetchall()
+        return [_record(row) for row in rows]
+
+    def pending(self):
+        """Return the records of jobs that have not finished"""
+        return self.find(status='pending')
+
+    def transitions(self, jobid):
+        """Return [(status, time)] of a job, oldest first"""
+        with self.lock:
+            return self.db.execute('SELECT status, at FROM transitions '
+                                   'WHERE jobid=? ORDER BY at',
+                                   (jobid,)).fetchall()
+
+    def reattach(self, client=None, callback=None):
+        """Track the pending jobs of this registry again
+
+        Parameters
+        ----------
+        client : PcatsClient
+                Client to poll with (the shared default client if not
+                given). Only jobs submitted to its server (or the servers
+                of its endpoint pool) are tracked.
+        callback : callable
+                Called with (jobid, status) when a job finishes.
+
+        Returns
+        -------
+        dict
+            {jobid: concurrent.futures.Future resolving to the final status}
+        """
+        cli = pcats_api._client(client)
+        if cli.registry is not self:
+            callback = _chain(self._finished, callback)
+        urls = cli.pool.urls if cli.pool is not None else [cli.base_url]
+        futures = dict()
+        for job in self.pending():
+            if job['base_url'] is not None and job['base_url'] not in urls:
+                continue
+            if cli.pool is not None and job['base_url'] is not None:
+                cli.pool.assign(job['jobid'], job['base_url'])
+            kind = 'CATE' if job['endpoint'].endswith('.cate') else \
+                job['params'].get('method', 'BART')
+            futures[job['jobid']] = cli.poller.track(job['jobid'], kind,
+                                                     callback)
+        return futures
+
+    def _finished(self, jobid, status):
+        self.update(jobid, status)
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+
+def _record(row):
+    record = dict(zip(_COLUMNS, row))
+    record['params'] = json.loads(record['params'] or '{}')
+    return record
+
+
+def _chain(first, second):
+    if second is None:
+        return first
+
+    def callback(jobid, status):
+        first(jobid, status)
+        second(jobid, status)
+    return callback
@@ -0,0 +1,193 @@
+"""
+Lazily decoded job results.
+"""
+
+import json
+import re
+
+# JSON strings and brackets; everything else is skipped by the scanner
+_TOKENS = re.compile(rb'"(?:[^"\\]|\\.)*"|[\[\]{}]', re.S)
+
+# Numbers and literals
+_SCALAR = re.compile(rb'\s*:\s*(-?[0-9][0-9.eE+-]*|true|false|null)')
+
+_COLON = re.compile(rb'\s*:')
+
+
+def _index(raw):
+    """Return {key: (start, end)} of the values of a top level JSON object
+
+    Only string tokens and brackets are visited, so the values themselves
+    are not decoded.
+    """
+    index = dict()
+    depth = 0
+    key = None
+    start = None
+    for m in _TOKENS.finditer(raw):
+        token = m.group()
+        if token in (b'{', b'['):
+            depth += 1
+            if depth == 2 and key is not None:
+                start = m.start()
+        elif token in (b'}', b']'):
+            depth -= 1
+            if depth == 1 and start is not None:
+                index[key] = (start, m.end())
+                key = start = None
+            elif depth == 0:
+                break
+        elif depth == 1:
+            if key is not None:
+                # string value of the current key
+                index[key] = (m.start(), m.end())
+                key = None
+                continue
+            scalar = _SCALAR.match(raw, m.end())
+            if scalar is not None:
+                index[json.loads(token)] = scalar.span(1)
+            elif _COLON.match(raw, m.end()):
+                key = json.loads(token)
+    return index
+
+
+def columns(labelled, names=()):
+    """Return labelled rows as columns
+
+    Parameters
+    ----------
+    labelled : iterable of (dict, list of dict)
+            Labels (e.g. job parameters) and the rows they apply to; the
+            labels are repeated for every row and take precedence over
+            row fields of the same name. Lists become tuples.
+    names : list of string
+            Columns placed first.
+
+    Returns
+    -------
+    dict
+        {column name: list of values}, missing values being None
+    """
+    out = dict((name, []) for name in names)
+    rows = 0
+    for labels, records in labelled:
+        for record in records:
+            row = dict(labels)
+            row.update((k, v) for k, v in record.items() if k not in labels)
+            for name, value in row.items():
+                if isinstance(value, list):
+                    value = tuple(value)
+                out.setdefault(name, [None] * rows).append(value)
+            rows += 1
+            for values in out.values():
+                if len(values) < rows:
+                    values.append(None)
+    return out
+
+
+class PcatsResult(object):
+    """Results of a job, decoded section by section on first access.
+
+    The raw JSON document is kept as bytes and only its top level keys are
+    located up front. A section (e.g. the ATE, CATE or PrTE table) is
+    decoded when it is first accessed and then cached, so aggregating a
+    few tables from thousands of jobs does not pay for decoding and
+    holding every full document.
+
+    Parameters
+    ----------
+    raw : bytes
+            JSON document returned by the results endpoint.
+    """
+
+    __slots__ = ('raw', '_index', '_sections')
+
+    def __init__(self, raw):
+        if isinstance(raw, str):
+            raw = raw.encode('utf-8')
+        self.raw = raw
+        self._index = None
+        self._sections = dict()
+
+    def keys(self):
+        """Return the names of the top level sections"""
+        if self._index is None:
+            self._index = _index(self.raw)
+        return list(self._index)
+
+    def __contains__(self, name):
+        return name in self.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __getitem__(self, name):
+        if name not in self._sections:
+            if name not in self.keys():
+                raise KeyError(name)
+            start, end = self._index[name]
+            self._sections[name] = json.loads(self.raw[start:end])
+        return self._sections[name]
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def find(self, name):
+        """Return the first section whose name matches name ignoring case"""
+        for key in self.keys():
+            if key.lower() == name.lower():
+                return self[key]
+        return None
+
+    @property
+    def ate(self):
+        """Average treatment effect table"""
+        return self.find('ATE')
+
+    @property
+    def cate(self):
+        """Conditional average treatment effect table"""
+        return self.find('CATE')
+
+    @property
+    def prte(self):
+        """PrTE table"""
+        return self.find('PrTE')
+
+    def records(self, name):
+        """Return a section as a list of row dicts
+
+        Accepts the same layouts as dataframe(); a single object is one row.
+        """
+        section = self[name] if name in self else self.find(name)
+        if section is None:
+            return []
+        if isinstance(section, dict):
+            if section and all(isinstance(v, list) for v in section.values()):
+                return [dict(zip(section, row))
+                        for row in zip(*section.values())]
+            return [section]
+        return [r if isinstance(r, dict) else {'value': r} for r in section]
+
+    def dataframe(self, name):
+        """Return a section as a pandas DataFrame
+
+        Accepts row records (a list of objects) and column oriented
+        sections (an object of equal length lists).
+        """
+        import pandas
+        section = self[name] if name in self else self.find(name)
+        if isinstance(section, dict):
+            return pandas.DataFrame(section)
+        return pandas.DataFrame.from_records(section)
+
+    def array(self, name, dtype=float):
+        """Return the numeric columns of a section as a 2D NumPy array"""
+        frame = self.dataframe(name)
+        return frame.select_dtypes('number').to_numpy(dtype=dtype)
+
+    def __repr__(self):
+        return 'PcatsResult({})'.format(', '.join(self.keys()))
@@ -0,0 +1,114 @@
+"""
+Persistent client side cache of submitted jobs and their results.
+"""
+
+import time
+
+from .upload_cache import _SqliteStore
+
+
+class ResultCache(_SqliteStore):
+    """Map submissions to job IDs and finished jobs to their output.
+
+    A submission is identified by a fingerprint of its endpoint, its
+    arguments and the content digest of its data files, so re-running the
+    same analysis returns the earlier job ID without contacting the
+    server. The results and printed output of jobs seen as "Done" are
+    kept until the stored output exceeds `max_bytes`, at which point the
+    least recently used artifacts are evicted.
+
+    Parameters
+    ----------
+    path : string
+            SQLite database file (":memory:" for a process local cache).
+            The default value is results.sqlite in the user cache directory.
+    max_bytes : int
+            Maximum total size of the stored artifacts.
+    """
+
+    def __init__(self, path=None, max_bytes=256 << 20):
+        _SqliteStore.__init__(self, path, 'results.sqlite')
+        self.max_bytes = max_bytes
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS jobs ('
+                            'fingerprint TEXT PRIMARY KEY, jobid TEXT, '
+                            'created REAL)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS jobs_jobid '
+                            'ON jobs (jobid)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS done ('
+                            'jobid TEXT PRIMARY KEY, finished REAL)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS artifacts ('
+                            'jobid TEXT, kind TEXT, content BLOB, '
+                            'size INTEGER, used REAL, '
+                            'PRIMARY KEY (jobid, kind))')
+            self.db.execute('CREATE INDEX IF NOT EXISTS artifacts_used '
+                            'ON artifacts (used)')
+
+    def get_jobid(self, fingerprint):
+        with self.lock:
+            row = self.db.execute('SELECT jobid FROM jobs WHERE fingerprint=?',
+                                  (fingerprint,)).fetchone()
+        return row[0] if row is not None else None
+
+    def put_jobid(self, fingerprint, jobid):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO jobs VALUES (?,?,?)',
+                            (fingerprint, jobid, time.time()))
+
+    def forget_job(self, jobid):
+        """Drop a job, e.g. because it failed and should be resubmitted"""
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM jobs WHERE jobid=?', (jobid,))
+            self.db.execute('DELETE FROM done WHERE jobid=?', (jobid,))
+            self.db.execute('DELETE FROM artifacts WHERE jobid=?', (jobid,))
+
+    def mark_done(self, jobid):
+        with self.lock, self.db:
+            self.db.execute('INSERT OR IGNORE INTO done VALUES (?,?)',
+                            (jobid, time.time()))
+
+    def is_done(self, jobid):
+        with self.lock:
+            return self.db.execute('SELECT 1 FROM done WHERE jobid=?',
+                                   (jobid,)).fetchone() is not None
+
+    def get(self, jobid, kind):
+        """Return a stored artifact (bytes) of a job or None"""
+        with self.lock, self.db:
+            row = self.db.execute('SELECT content FROM artifacts '
+                                  'WHERE jobid=? AND kind=?',
+                                  (jobid, kind)).fetchone()
+            if row is None:
+                return None
+            self.db.execute('UPDATE artifacts SET used=? '
+                            'WHERE jobid=? AND kind=?',
+                            (time.time(), jobid, kind))
+            return bytes(row[0])
+
+    def put(self, jobid, kind, content):
+        """Store an artifact and evict the least recently used ones"""
+        if len(content) > self.max_bytes:
+            return
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO artifacts '
+                            'VALUES (?,?,?,?,?)',
+                            (jobid, kind, content, len(content), time.time()))
+            total = self.db.execute('SELECT COALESCE(SUM(size), 0) '
+                                    'FROM artifacts').fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self.db.execute('SELECT jobid, kind, size FROM artifacts '
+                                   'ORDER BY used').fetchall()
+            for old_jobid, old_kind, size in rows:
+                if total <= self.max_bytes:
+                    break
+                self.db.execute('DELETE FROM artifacts '
+                                'WHERE jobid=? AND kind=?',
+                                (old_jobid, old_kind))
+                total -= size
+
+    def size(self):
+        """Return the total size of the stored artifacts"""
+        with self.lock:
+            return self.db.execute('SELECT COALESCE(SUM(size), 0) '
+                                   'FROM artifacts').fetchone()[0]
@@ -0,0 +1,145 @@
+"""
+Retries with backoff and a circuit breaker for transient server failures.
+"""
+
+import email.utils
+import threading
+import time
+
+import requests
+
+from .poller import Backoff
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of sending a request while the circuit breaker is open"""
+
+
+class RetryPolicy(object):
+    """When and how long to wait before re-sending a failed request.
+
+    Idempotent requests (GET, HEAD, OPTIONS) are retried after connection
+    errors and the listed status codes. POST submissions are retried too:
+    the client sends each one with an Idempotency-Key header that stays
+    the same across attempts, so the server can recognize a repeated
+    submission instead of starting a second job.
+
+    Parameters
+    ----------
+    total : int
+            Maximum number of retries of a request.
+    backoff : Backoff
+            Delay schedule between attempts.
+    statuses : tuple of int
+            Status codes treated as transient.
+    methods : tuple of string
+            Methods that may be retried.
+    respect_retry_after : bool
+            Wait at least as long as the server's Retry-After header asks.
+    max_retry_after : float
+            Upper bound in seconds on a Retry-After wait.
+    """
+
+    def __init__(self, total=5, backoff=None,
+                 statuses=(429, 502, 503, 504),
+                 methods=('GET', 'HEAD', 'OPTIONS', 'POST'),
+                 respect_retry_after=True, max_retry_after=300):
+        self.total = total
+        self.backoff = backoff if backoff is not None else Backoff(0.5, 2, 30)
+        self.statuses = statuses
+        self.methods = methods
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def delay(self, method, attempt, response=None):
+        """Return seconds to wait before retry number attempt, or None
+
+        Parameters
+        ----------
+        method : string
+                HTTP method of the request.
+        attempt : int
+                Number of retries made so far.
+        response : requests.Response
+                Response of the failed attempt (None after a connection error).
+        """
+        if attempt >= self.total or method.upper() not in self.methods:
+            return None
+        if response is not None and response.status_code not in self.statuses:
+            return None
+        delay = self.backoff.delay(attempt)
+        if response is not None and self.respect_retry_after:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_retry_after))
+        return delay
+
+
+def parse_retry_after(value):
+    """Return the seconds asked for by a Retry-After header, or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class CircuitBreaker(object):
+    """Stop sending requests to a server that keeps failing.
+
+    After `threshold` consecutive failures (connection errors or 5xx/429
+    responses) the circuit opens and requests fail immediately with
+    CircuitOpenError for `reset_timeout` seconds. Then a single trial
+    request is let through: success closes the circuit, failure opens it
+    again.
+
+    Parameters
+    ----------
+    threshold : int
+            Consecutive failures that open the circuit.
+    reset_timeout : float
+            Seconds the circuit stays open before a trial request.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = None
+        self.lock = threading.Lock()
+
+    def before(self):
+        """Raise CircuitOpenError unless a request may be sent now"""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return
+            if (self.state == self.OPEN and
+                    time.monotonic() - self.opened >= self.reset_timeout):
+                self.state = self.HALF_OPEN
+                return
+            raise CircuitOpenError('PCATS server circuit breaker is {}'
+                                   .format(self.state))
+
+    def record(self, status_code=None):
+        """Record the outcome of a request (None for a connection error)"""
+        failed = status_code is None or status_code == 429 or status_code >= 500
+        with self.lock:
+            if not failed:
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                self.state = self.OPEN
+                self.opened = time.monotonic()
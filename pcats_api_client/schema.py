@@ -0,0 +1,177 @@
+"""
+Declarative description of the multipart forms of the submit endpoints.
+"""
+
+# Kinds of fields
+TEXT = 'text'
+VECTOR = 'vector'
+FILE = 'file'
+
+
+def _text(value):
+    return (None, value)
+
+
+def _vector(value):
+    """Encode a list of names or numbers as one comma separated value"""
+    if isinstance(value, (list, tuple)):
+        value = ','.join(str(v) for v in value)
+    return (None, value)
+
+
+def _data_part(datafile):
+    """Return the (filename, file object) multipart field of a data file"""
+    from .dataset import as_dataset, is_path
+    if is_path(datafile):
+        return (datafile, open(datafile, 'rb'))
+    datafile = as_dataset(datafile)
+    return (datafile.filename, datafile.open())
+
+
+_ENCODERS = {TEXT: _text, VECTOR: _vector, FILE: _data_part}
+
+
+class Field(object):
+    """One form field: the argument it comes from and how it is encoded
+
+    Parameters
+    ----------
+    name : string
+            Field name sent to the server, e.g. "x.explanatory".
+    kind : string
+            TEXT for a single value, VECTOR for a value that may be a list
+            (sent comma separated) or FILE for a data file.
+    arg : string
+            Argument of the API function (name with dots replaced by
+            underscores if not given).
+    """
+
+    __slots__ = ('name', 'kind', 'arg')
+
+    def __init__(self, name, kind=TEXT, arg=None):
+        if kind not in _ENCODERS:
+            raise ValueError('unknown field kind {!r}'.format(kind))
+        self.name = name
+        self.kind = kind
+        self.arg = arg if arg is not None else name.replace('.', '_')
+
+    def __repr__(self):
+        return 'Field({!r}, {!r}, {!r})'.format(self.name, self.kind,
+                                                self.arg)
+
+
+def stage(prefix, fields):
+    """Return fields named prefix.<name> read from prefix_<arg>"""
+    return [Field('{}.{}'.format(prefix, f.name), f.kind,
+                  '{}_{}'.format(prefix, f.arg)) for f in fields]
+
+
+class Schema(object):
+    """Multipart form of a submit endpoint.
+
+    The fields are compiled once into (argument, name, encoder) triples;
+    form() then encodes the arguments of a call, leaving out the fields
+    whose argument is None.
+
+    Parameters
+    ----------
+    fields : list of Field
+            Fields of the form.
+    cache_off : bool
+            Whether use_cache="0" and reuse_cached_jobid="0" are sent as
+            headers.
+    """
+
+    def __init__(self, fields, cache_off=True):
+        self.fields = tuple(fields)
+        self.cache_off = cache_off
+        self._compiled = tuple((f.arg, f.name, _ENCODERS[f.kind])
+                               for f in self.fields)
+
+    @property
+    def args(self):
+        """Names of the arguments read by the form"""
+        return [f.arg for f in self.fields]
+
+    def extend(self, fields, cache_off=None):
+        """Return a schema with more fields, e.g. for a new endpoint"""
+        return Schema(self.fields + tuple(fields),
+                      self.cache_off if cache_off is None else cache_off)
+
+    def form(self, p):
+        """Return multipart fields and headers for the arguments p"""
+        data = dict()
+        for arg, name, encode in self._compiled:
+            value = p.get(arg)
+            if value is not None:
+                data[name] = encode(value)
+        return data, _cache_headers(p.get('use_cache'),
+                                   p.get('reuse_cached_jobid'),
+                                   allow_off=self.cache_off)
+
+
+def _cache_headers(use_cache, reuse_cached_jobid, allow_off=True):
+    headers = dict()
+    if str(use_cache) == "1":
+        headers["X-API-Cache"] = "1"
+    elif str(use_cache) == "0" and allow_off:
+        headers["X-API-Cache"] = "0"
+    if str(reuse_cached_jobid) == "1":
+        headers["X-API-Reuse-Cached-Jobid"] = "1"
+    elif str(reuse_cached_jobid) == "0" and allow_off:
+        headers["X-API-Reuse-Cached-Jobid"] = "0"
+    return headers
+
+
+# Fields describing the outcome, shared by staticgp and both dynamicgp stages
+_OUTCOME = [
+    Field('outcome'),
+    Field('treatment', VECTOR),
+    Field('x.explanatory', VECTOR),
+    Field('x.confounding', VECTOR),
+    Field('tr.values', VECTOR),
+    Field('tr.type'),
+    Field('time'),
+    Field('time.value'),
+    Field('outcome.type'),
+    Field('outcome.bound_censor'),
+    Field('outcome.lb'),
+    Field('outcome.ub'),
+    Field('outcome.censor.lv'),
+    Field('outcome.censor.uv'),
+    Field('outcome.censor.yn'),
+    Field('outcome.link'),
+    Field('c.margin', VECTOR),
+]
+
+_DATA = [
+    Field('data', FILE, 'datafile'),
+    Field('dataref'),
+    Field('mi.data', FILE, 'mi_datafile'),
+    Field('mi.dataref'),
+    Field('sheet'),
+    Field('mi.sheet'),
+]
+
+_MODEL = [
+    Field('method'),
+    Field('burn.num'),
+    Field('mcmc.num'),
+    Field('x.categorical', VECTOR),
+    Field('seed'),
+]
+
+STATICGP = Schema(_DATA + _OUTCOME + [Field('tr.hte', VECTOR)] + _MODEL)
+
+DYNAMICGP = Schema(_DATA +
+                   stage('stg1', _OUTCOME + [Field('tr.hte', VECTOR)]) +
+                   stage('stg2', _OUTCOME + [Field('tr1.hte', VECTOR),
+                                             Field('tr2.hte', VECTOR)]) +
+                   _MODEL)
+
+CATE = Schema([
+    Field('x'),
+    Field('control.tr', VECTOR),
+    Field('treat.tr', VECTOR),
+    Field('c.margin', VECTOR),
+], cache_off=False)
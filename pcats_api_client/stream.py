@@ -0,0 +1,280 @@
+"""
+Streaming of job progress and results while a job runs and finishes.
+"""
+
+import codecs
+import json
+import time
+
+import requests
+
+from . import pcats_api
+from .poller import Backoff
+
+_WHITESPACE = ' \t\n\r'
+
+# Keys of a status payload that are not progress information
+_STATUS_KEYS = frozenset(['jobid', 'status'])
+
+
+class Update(object):
+    """One item yielded by stream_results.
+
+    Attributes
+    ----------
+    kind : string
+            "status" when the job status changed (value is the status),
+            "progress" for intermediate output the server sent with a
+            status (value is a dict, e.g. {"progress": 0.4}),
+            "section" for a section of the results (name and value), or
+            "rows" for a block of the rows of a section holding a list
+            (name and a list of at most batch_rows rows).
+    name : string
+            Section name of "section" and "rows" updates.
+    value : object
+            Content of the update.
+    """
+
+    __slots__ = ('kind', 'name', 'value')
+
+    def __init__(self, kind, value, name=None):
+        self.kind = kind
+        self.name = name
+        self.value = value
+
+    def __repr__(self):
+        if self.name is None:
+            return 'Update({}, {!r})'.format(self.kind, self.value)
+        return 'Update({}, {})'.format(self.kind, self.name)
+
+
+class SectionParser(object):
+    """Incremental parser of a JSON object of sections.
+
+    feed() takes the text as it arrives and returns the Updates completed
+    by it: a "section" per top level key, except that a list value is
+    returned as "rows" updates of batch_rows elements each, so only one
+    element and one batch are held in memory at a time.
+
+    Parameters
+    ----------
+    batch_rows : int
+            Elements of a list section per "rows" update.
+    """
+
+    def __init__(self, batch_rows=1000):
+        self.batch_rows = batch_rows
+        self.buffer = ''
+        self.state = 'start'
+        self.key = None
+        self.rows = []
+        self.flushed = False
+        self._decoder = json.JSONDecoder()
+
+    def _skip(self, pos):
+        while pos < len(self.buffer) and self.buffer[pos] in _WHITESPACE:
+            pos += 1
+        return pos
+
+    def _decode(self, pos, final):
+        """Return (value, end), or None if the value is not complete yet"""
+        try:
+            value, end = self._decoder.raw_decode(self.buffer, pos)
+        except ValueError:
+            if final:
+                raise
+            return None
+        if end == len(self.buffer) and not final:
+            # a number or literal may go on in the next chunk
+            return None
+        return value, end
+
+    def _flush_rows(self, updates, last=False):
+        if self.rows or (last and not self.flushed):
+            updates.append(Update('rows', self.rows, self.key))
+            self.rows = []
+            self.flushed = True
+
+    def feed(self, text, final=False):
+        """Parse more text; final=True at the end of the document
+
+        Returns
+        -------
+        list of Update
+        """
+        self.buffer += text
+        updates = []
+        pos = 0
+        while True:
+            pos = self._skip(pos)
+            if pos >= len(self.buffer):
+                break
+            char = self.buffer[pos]
+            if self.state == 'start':
+                if char != '{':
+                    raise ValueError('results are not a JSON object')
+                self.state = 'key'
+                pos += 1
+            elif self.state == 'key':
+                if char == '}':
+                    self.state = 'end'
+                    pos += 1
+                    continue
+                if char == ',':
+                    pos += 1
+                    continue
+                decoded = self._decode(pos, final)
+                if decoded is None:
+                    break
+                self.key, pos = decoded
+                self.state = 'colon'
+            elif self.state == 'colon':
+                if char != ':':
+                    raise ValueError('expected ":" after {!r}'.format(
+                        self.key))
+                self.state = 'value'
+                pos += 1
+            elif self.state == 'value':
+                if char == '[':
+                    self.state = 'rows'
+                    self.flushed = False
+                    pos += 1
+                    continue
+                decoded = self._decode(pos, final)
+                if decoded is None:
+                    break
+                value, pos = decoded
+                updates.append(Update('section', value, self.key))
+                self.state = 'key'
+            elif self.state == 'rows':
+                if char == ']':
+                    # an empty list still gets one (empty) update
+                    self._flush_rows(updates, last=True)
+                    self.state = 'key'
+                    pos += 1
+                    continue
+                if char == ',':
+                    pos += 1
+                    continue
+                decoded = self._decode(pos, final)
+                if decoded is None:
+                    break
+                row, pos = decoded
+                self.rows.append(row)
+                if len(self.rows) >= self.batch_rows:
+                    self._flush_rows(updates)
+            else:
+                raise ValueError('data after the end of the results')
+        self.buffer = self.buffer[pos:]
+        if final and self.state != 'end':
+            raise ValueError('results end in the middle of a section')
+        return updates
+
+
+def _statuses(cli, jobid, backoff):
+    """Yield the status payloads of a job until it finishes"""
+    from .push import _final, server_capabilities
+    if cli.push and 'sse' in server_capabilities(cli):
+        try:
+            res = cli.get('/api/job/{}/events'.format(jobid), stream=True,
+                          headers={'Accept': 'text/event-stream'})
+            with res:
+                if res.status_code == 200:
+                    for line in res.iter_lines(decode_unicode=True):
+                        if line and line.startswith('data:'):
+                            event = json.loads(line[5:])
+                            yield event
+                            if _final(event.get('status')) is not None:
+                                return
+        except requests.RequestException:
+            pass
+    attempt = 0
+    while True:
+        res = cli.get('/api/job/{}/status'.format(jobid))
+        try:
+            payload = res.json() if res.status_code == 200 else dict()
+        except ValueError:
+            payload = dict()
+        yield payload
+        if _final(payload.get('status')) is not None:
+            return
+        time.sleep(backoff.delay(attempt))
+        attempt += 1
+
+
+def stream_results(jobid,
+                   token=None,
+                   batch_rows=1000,
+                   chunk_size=1 << 16,
+                   backoff=None,
+                   client=None):
+    """Follow a job and stream its results
+
+    A generator of Updates: status changes and any progress information
+    the server sends with the status (over server-sent events when the
+    server offers them, otherwise by polling) while the job runs, then
+    the sections of the results, parsed as the response arrives in
+    chunks. Sections holding a list are yielded in blocks of rows, so the
+    whole results never have to be in memory at once.
+
+    Parameters
+    ----------
+    jobid : UUID
+            Job ID of the previously submitted job
+    token : string
+            Authentication token.
+    batch_rows : int
+            Rows per "rows" update.
+    chunk_size : int
+            Bytes read from the response at a time.
+    backoff : Backoff
+            Delays between status polls (0.25 s growing to 5 s by default).
+    client : PcatsClient
+            Client to use (the shared default client if not given)
+
+    Yields
+    ------
+    Update
+        The last status is "Done" before the results follow, or "Error"
+        and nothing follows.
+    """
+    cli = pcats_api._client(client)
+    backoff = backoff or Backoff(0.25, 1.5, 5.0)
+    cache = cli.result_cache
+    cached = cache.get(jobid, 'results') if cache is not None else None
+    if cached is None:
+        last = None
+        for payload in _statuses(cli, jobid, backoff):
+            status = payload.get('status')
+            if status is None:
+                status = "Error"
+            if status != last:
+                pcats_api._record_status(cli, jobid, status)
+                yield Update('status', status)
+                last = status
+            progress = dict((k, v) for k, v in payload.items()
+                            if k not in _STATUS_KEYS)
+            if progress:
+                yield Update('progress', progress)
+        if last != "Done":
+            return
+    else:
+        yield Update('status', "Done")
+
+    parser = SectionParser(batch_rows)
+    if cached is not None:
+        for update in parser.feed(cached.decode('utf-8'), final=True):
+            yield update
+        return
+    res = cli.get('/api/job/{}/results'.format(jobid), token=token,
+                  stream=True)
+    with res:
+        if res.status_code != 200:
+            raise IOError('results of job {}: HTTP {}'.format(
+                jobid, res.status_code))
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        for chunk in res.iter_content(chunk_size):
+            for update in parser.feed(decoder.decode(chunk)):
+                yield update
+        for update in parser.feed(decoder.decode(b'', True), final=True):
+            yield update
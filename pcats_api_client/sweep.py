@@ -0,0 +1,284 @@
+"""
+Parameter sweeps over staticgp and dynamicgp.
+"""
+
+import inspect
+import itertools
+import json
+import os
+import queue
+import threading
+import warnings
+
+from . import pcats_api
+from .batch import submit_many
+from .dataset import as_dataset, is_path
+from .preflight import preflight
+from .result import columns
+from .upload_cache import _IGNORED
+
+_SUBMIT = {'staticgp': pcats_api.staticgp, 'dynamicgp': pcats_api.dynamicgp}
+
+
+def _plain(value):
+    """Return a JSON compatible value; sets become sorted lists"""
+    if isinstance(value, (set, frozenset)):
+        return sorted(_plain(v) for v in value)
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+def config_key(params, method="staticgp"):
+    """Return a string identifying the job a parameter dict describes
+
+    Defaults are filled in and transport arguments (token, client, ...)
+    dropped, so {"seed": 5000} and {} give the same key.
+    """
+    bound = inspect.signature(_SUBMIT[method]).bind(**params)
+    bound.apply_defaults()
+    config = dict((k, _plain(v)) for k, v in bound.arguments.items()
+                  if k not in _IGNORED and v is not None)
+    for name in ('datafile', 'mi_datafile'):
+        if name in config and not is_path(config[name]):
+            # in-memory data is identified by its content
+            config[name] = as_dataset(config[name]).digest() or \
+                id(params[name])
+    return json.dumps(config, sort_keys=True, default=str)
+
+
+def expand_grid(grid, base=None, method="staticgp"):
+    """Expand a grid spec into a list of distinct parameter dicts
+
+    Parameters
+    ----------
+    grid : dict
+            Maps a parameter name to the list of values to sweep it over.
+            A set of variable names (e.g. for tr_hte) is one value; wrap
+            several of them in a list to sweep over sets.
+    base : dict
+            Parameters shared by all jobs.
+    method : string
+            "staticgp" or "dynamicgp".
+
+    Returns
+    -------
+    list of dict
+        one dict per grid point, with equivalent configurations removed
+    """
+    names = list(grid)
+    seen = set()
+    configs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(base or dict())
+        params.update(zip(names, (_plain(v) for v in values)))
+        key = config_key(params, method)
+        if key not in seen:
+            seen.add(key)
+            configs.append(params)
+    return configs
+
+
+class Sweep(object):
+    """Run a grid of staticgp or dynamicgp jobs and collect their results.
+
+    The data files in `base` are uploaded once and every job refers to the
+    upload. Jobs are submitted with bounded concurrency, and run() yields
+    each result as soon as its job finishes. With a manifest, the state of
+    every job is saved to a JSON file, so an interrupted sweep resumes
+    without resubmitting jobs that were already submitted or finished.
+
+    Parameters
+    ----------
+    grid : dict
+            Maps a parameter name to the values to sweep it over.
+    base : dict
+            Parameters shared by all jobs (datafile, outcome, treatment, ...).
+    method : string
+            "staticgp" or "dynamicgp". The default value is "staticgp".
+    manifest : string
+            Path of the JSON manifest (no manifest if None).
+    max_workers : int
+            Maximum number of submissions in flight.
+    rate : float
+            Maximum number of submissions started per second.
+    client : PcatsClient
+            Client to use (the shared default client if not given).
+
+    Examples
+    --------
+    >>> sweep = Sweep({"method": ["GP", "BART"], "seed": [1, 2, 3]},
+    ...               base={"datafile": "data.csv", "outcome": "y",
+    ...                     "treatment": "tr"}, manifest="sweep.json")
+    >>> for params, status, result in sweep.run():
+    ...     print(params, status)
+    >>> table = sweep.table("ATE")
+    """
+
+    def __init__(self, grid, base=None, method="staticgp", manifest=None,
+                 max_workers=8, rate=None, client=None):
+        self.grid = grid
+        self.base = dict(base or dict())
+        self.method = method
+        self.manifest = manifest
+        self.max_workers = max_workers
+        self.rate = rate
+        self.client = client
+        self.configs = expand_grid(grid, self.base, method)
+        self.results = dict()
+        self.lock = threading.Lock()
+        self.jobs = self._load()
+        for params in self.configs:
+            key = config_key(params, method)
+            if key not in self.jobs:
+                self.jobs[key] = {'params': params, 'jobid': None,
+                                  'status': None}
+            elif self.jobs[key]['status'] == "Error":
+                # failed jobs are submitted again
+                self.jobs[key].update(jobid=None, status=None)
+
+    def _load(self):
+        if self.manifest is None or not os.path.exists(self.manifest):
+            return dict()
+        with open(self.manifest) as f:
+            state = json.load(f)
+        if state.get('method') != self.method:
+            raise ValueError('manifest {} belongs to a {} sweep'.format(
+                self.manifest, state.get('method')))
+        return state['jobs']
+
+    def _save(self):
+        if self.manifest is None:
+            return
+        # done callbacks of several submission threads save concurrently;
+        # they share the temporary file, so write and replace it in turn
+        with self.lock:
+            state = json.dumps({'method': self.method, 'jobs': self.jobs},
+                               indent=1, default=str)
+            tmp = '{}.{}.tmp'.format(self.manifest, os.getpid())
+            with open(tmp, 'w') as f:
+                f.write(state)
+            os.replace(tmp, self.manifest)
+
+    def _shared(self, token):
+        """Upload the data files of base once and return the shared params"""
+        shared = dict(self.base)
+        for filekey, refkey, sheetkey in pcats_api._DATA_FILES:
+            if shared.get(filekey) is not None and shared.get(refkey) is None:
+                fileref = pcats_api.uploadfile(shared[filekey], token=token,
+                                               client=self.client,
+                                               compress=shared.get('compress'))
+                if fileref is not None:
+                    shared[filekey], shared[refkey] = None, fileref
+        return shared
+
+    def run(self, token=None):
+        """Submit the pending jobs and yield results as the jobs finish
+
+        Yields
+        ------
+        (params, status, PcatsResult)
+            for every grid point, the result being None unless the job
+            finished with status "Done"
+        """
+        cli = pcats_api._client(self.client)
+        finished = queue.Queue()
+        keys = [config_key(params, self.method) for params in self.configs]
+        todo = [key for key in keys if self.jobs[key]['status'] is None and
+                self.jobs[key]['jobid'] is None]
+
+        def track(key):
+            job = self.jobs[key]
+            future = cli.poller.track(job['jobid'],
+                                      job['params'].get('method', 'BART'))
+            future.add_done_callback(lambda f: finished.put(
+                (key, "Error" if f.exception() else f.result())))
+
+        for key in keys:
+            if self.jobs[key]['status'] is not None:
+                finished.put((key, self.jobs[key]['status']))
+            elif self.jobs[key]['jobid'] is not None:
+                track(key)
+
+        if todo:
+            if cli.preflight:
+                for key in todo:
+                    preflight(self.jobs[key]['params'])
+            shared = self._shared(token)
+            # identity, since data files may be DataFrames or arrays
+            uploaded = dict((k, v) for k, v in shared.items()
+                            if self.base.get(k) is not v)
+
+            def params(key):
+                p = dict(self.jobs[key]['params'])
+                p.update(uploaded)
+                p['token'] = token
+                return p
+
+            handles = submit_many([params(key) for key in todo],
+                                  method=self.method,
+                                  max_workers=self.max_workers,
+                                  rate=self.rate, client=cli)
+            for key, handle in zip(todo, handles):
+                handle.future.add_done_callback(
+                    lambda future, key=key: self._submitted(key, future,
+                                                            track, finished))
+
+        for _ in keys:
+            key, status = finished.get()
+            job = self.jobs[key]
+            result = None
+            if status == "Done":
+                result = pcats_api.results(job['jobid'], token=token,
+                                           client=cli, parse=True)
+                self.results[key] = result
+            if job['status'] != status:
+                with self.lock:
+                    job['status'] = status
+                self._save()
+            yield job['params'], status, result
+
+    def _submitted(self, key, future, track, finished):
+        jobid = None if future.exception() else future.result()
+        with self.lock:
+            self.jobs[key]['jobid'] = jobid
+        if jobid is None:
+            finished.put((key, "Error"))
+            return
+        try:
+            self._save()
+        except OSError as e:
+            # the job still has to be followed, or run() waits for it forever
+            warnings.warn('could not save sweep manifest {}: {}'.format(
+                self.manifest, e))
+        try:
+            track(key)
+        except Exception:
+            finished.put((key, "Error"))
+            raise
+
+    def table(self, section):
+        """Return one section of all results as columns
+
+        The swept parameters come first, followed by the columns of the
+        section; a section with several rows repeats the parameters.
+
+        Returns
+        -------
+        dict
+            {column name: list of values}
+        """
+        labelled = []
+        for params in self.configs:
+            result = self.results.get(config_key(params, self.method))
+            if result is not None:
+                labels = dict((name, params.get(name)) for name in self.grid)
+                labelled.append((labels, result.records(section)))
+        return columns(labelled, list(self.grid))
+
+    def dataframe(self, section):
+        """Return one section of all results as a pandas DataFrame
+        indexed by the swept parameters"""
+        import pandas
+        frame = pandas.DataFrame(self.table(section))
+        return frame.set_index(list(self.grid))
@@ -0,0 +1,17 @@
+import pytest
+
+import pcats_api_client
+
+from stub_server import StubServer
+
+
+@pytest.fixture
+def server():
+    with StubServer(seed=0) as srv:
+        yield srv
+
+
+@pytest.fixture
+def client(server):
+    with pcats_api_client.PcatsClient(server.url) as cli:
+        yield cli
@@ -0,0 +1,416 @@
+"""
+Local stand-in for the PCATS REST API used by the tests.
+
+Implements the endpoints used by the client (staticgp, dynamicgp, CATE,
+status, results, print, ploturl and plot pages, uploadfile, tus uploads
+and the push channels, with ETags on GET responses) so that jobs can be
+submitted, polled and fetched without touching the network, with
+configurable latency, job duration and failures. Run it on its own for manual testing:
+
+    python stub_server.py [port]
+"""
+
+import email.parser
+import gzip
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def parse_multipart(content_type, body):
+    """Return {name: bytes} for a multipart/form-data body"""
+    msg = email.parser.BytesParser().parsebytes(
+        b'Content-Type: ' + content_type.encode('latin-1') + b'\r\n\r\n' + body)
+    fields = dict()
+    if not msg.is_multipart():
+        return fields
+    for part in msg.get_payload():
+        name = part.get_param('name', header='content-disposition')
+        fields[name] = part.get_payload(decode=True)
+    return fields
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+                if not size:
+                    break
+            body = b''.join(chunks)
+        else:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+        encoding = self.headers.get('Content-Encoding')
+        if encoding == 'gzip':
+            body = gzip.decompress(body)
+        elif encoding == 'zstd':
+            import zstandard
+            body = zstandard.ZstdDecompressor().decompressobj().decompress(body)
+        return body
+
+    def _send(self, code, payload, content_type='application/json',
+              headers=None):
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload).encode('utf-8')
+        headers = dict(headers or dict())
+        content_type = headers.pop('Content-Type', content_type)
+        if self.command == 'GET' and code == 200:
+            # conditional requests against a digest of the body
+            etag = '"{}"'.format(hashlib.sha1(payload).hexdigest())
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                code, payload = 304, b''
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    def _dispatch(self, method):
+        server = self.server.stub
+        server.record(self)
+        path, _, query = self.path.partition('?')
+        parts = path.strip('/').split('/')
+        body = self._body() if method in ('POST', 'PATCH') else b''
+        fields = dict(urllib.parse.parse_qsl(query))
+        if body and self.headers.get('Content-Type', '').startswith('multipart/'):
+            fields = parse_multipart(self.headers['Content-Type'], body)
+        elif method == 'PATCH':
+            fields = body
+        response = server.handle(method, parts, fields, self.headers)
+        if response is None:
+            # simulate a dropped connection
+            self.close_connection = True
+            return
+        code, payload, headers = (response + (None,))[:3]
+        if hasattr(payload, '__next__'):
+            self._stream(code, payload)
+        elif isinstance(payload, str):
+            self._send(code, payload.encode('utf-8'), 'text/plain', headers)
+        else:
+            self._send(code, payload, headers=headers)
+
+    def _stream(self, code, events):
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for event in events:
+            self.wfile.write('data: {}\n\n'.format(json.dumps(event))
+                             .encode('utf-8'))
+            self.wfile.flush()
+        self.close_connection = True
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_HEAD(self):
+        self._dispatch('HEAD')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+
+class StubServer(object):
+    """In-process PCATS stand-in listening on a random localhost port.
+
+    Parameters
+    ----------
+    job_duration : float
+            Seconds from submission until a job is "Done".
+    queue_duration : float
+            Seconds a submitted job is "Pending" before it is "Running".
+    resumable : bool
+            Offer tus resumable uploads at /api/upload.
+    push : tuple
+            Push channels advertised at /api/capabilities.
+    formats : tuple
+            Data formats advertised at /api/capabilities.
+    latency : float
+            Seconds added to the response time of every request.
+    failure_rate : float
+            Fraction of requests answered with 503 Service Unavailable.
+    result_rows : int
+            Number of rows of the "samples" section of job results.
+    port : int
+            Port to listen on (0 picks a free port).
+    seed : int
+            Seed of the random failures.
+    """
+
+    def __init__(self, job_duration=0.0, queue_duration=0.0, resumable=True,
+                 push=(), formats=(), latency=0.0, failure_rate=0.0, result_rows=0,
+                 port=0, seed=None):
+        self.push = push
+        self.formats = formats
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.result_rows = result_rows
+        self.random = random.Random(seed)
+        self.job_duration = job_duration
+        self.queue_duration = queue_duration
+        self.resumable = resumable
+        self.drop_patches = set()
+        self.faults = []
+        self.idempotent = dict()
+        self.jobs = dict()
+        self.files = dict()
+        self.uploads = dict()
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self.httpd.server_address[1])
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def record(self, handler):
+        with self.lock:
+            self.requests.append((handler.command, handler.path,
+                                  dict(handler.headers)))
+            self.connections.add(handler.client_address)
+
+    def count(self, method, suffix):
+        return len([r for r in self.requests
+                    if r[0] == method and r[1].split('?')[0].endswith(suffix)])
+
+    def new_job(self, kind, fields, parent=None):
+        jobid = str(uuid.uuid4())
+        with self.lock:
+            self.jobs[jobid] = {'kind': kind, 'fields': fields,
+                                'parent': parent, 'submitted': time.time()}
+        return jobid
+
+    def status(self, jobid):
+        elapsed = time.time() - self.jobs[jobid]['submitted']
+        if elapsed >= self.job_duration:
+            return "Done"
+        if elapsed < self.queue_duration:
+            return "Pending"
+        return "Running"
+
+    def progress(self, jobid):
+        """Return the status payload of a job, with progress while running"""
+        status = self.status(jobid)
+        payload = {'jobid': jobid, 'status': status}
+        if status == "Running":
+            elapsed = time.time() - self.jobs[jobid]['submitted']
+            payload['progress'] = round(elapsed / self.job_duration, 2)
+        return payload
+
+    def results(self, jobid):
+        job = self.jobs[jobid]
+        if job['kind'].endswith('.cate'):
+            fields = job['fields']
+            return {'jobid': jobid, 'kind': job['kind'],
+                    'CATE': [{'x': fields['x'].decode(), 'level': level,
+                              'est': 0.5 * level, 'sd': 0.25}
+                             for level in (0, 1)]}
+        results = {'jobid': jobid, 'kind': self.jobs[jobid]['kind'],
+                   'ATE': [{'contrast': '1 - 0', 'est': 1.25, 'sd': 0.5},
+                           {'contrast': '2 - 0', 'est': 2.5, 'sd': 0.75}],
+                   'PrTE': {'c': [0, 1], 'prob': [0.9, 0.4]}}
+        if self.result_rows:
+            results['samples'] = [{'draw': i, 'ate': 1.25 + i * 1e-6}
+                                  for i in range(self.result_rows)]
+        return results
+
+    def handle_tus(self, method, parts, body, headers):
+        if method == 'POST' and not parts:
+            uploadid = str(uuid.uuid4())
+            self.uploads[uploadid] = {'length': int(headers['Upload-Length']),
+                                      'data': b''}
+            return 201, b'', {'Location': '/api/upload/' + uploadid}
+        upload = self.uploads.get(parts[0]) if parts else None
+        if upload is None:
+            return 404, {'error': 'not found'}
+        offset = {'Upload-Offset': str(len(upload['data']))}
+        if method == 'HEAD':
+            return 200, b'', offset
+        if method != 'PATCH':
+            return 405, {'error': 'method not allowed'}
+        self.patches = getattr(self, 'patches', 0) + 1
+        if self.patches in self.drop_patches:
+            return None
+        if int(headers['Upload-Offset']) != len(upload['data']):
+            return 409, {'error': 'offset mismatch'}, offset
+        upload['data'] += body
+        offset = {'Upload-Offset': str(len(upload['data']))}
+        if len(upload['data']) < upload['length']:
+            return 204, b'', offset
+        fileref = str(uuid.uuid4())
+        self.files[fileref] = upload['data']
+        return 200, {'fileref': fileref}, offset
+
+    def wait_change(self, jobid, wait):
+        """Long-poll: return the status once it changes or after wait"""
+        status = self.status(jobid)
+        deadline = time.time() + wait
+        while self.status(jobid) == status and time.time() < deadline:
+            time.sleep(0.01)
+        return self.status(jobid)
+
+    def events(self, jobid):
+        """Yield server-sent status events until the job is done"""
+        status = None
+        while status != "Done":
+            if self.status(jobid) != status:
+                status = self.status(jobid)
+                yield self.progress(jobid)
+            time.sleep(0.01)
+
+    def callback(self, jobid, url):
+        """Call a registered webhook once the job is done"""
+        while self.status(jobid) != "Done":
+            time.sleep(0.01)
+        body = json.dumps({'jobid': jobid, 'status': "Done"}).encode()
+        urllib.request.urlopen(urllib.request.Request(
+            url, data=body, headers={'Content-Type': 'application/json'}))
+
+    def inject(self, method, suffix, *responses, after=False):
+        """Answer the next matching requests with the given responses
+
+        Each response is a status code, a (status code, headers) pair or
+        "drop" to close the connection without answering. With after=True
+        the request is processed normally before the fault is returned.
+        """
+        with self.lock:
+            for response in responses:
+                self.faults.append((method, suffix, response, after))
+
+    def _fault(self, method, parts):
+        path = '/' + '/'.join(parts)
+        with self.lock:
+            for fault in self.faults:
+                if fault[0] == method and path.endswith(fault[1]):
+                    self.faults.remove(fault)
+                    return fault
+        return None
+
+    def handle(self, method, parts, fields, headers):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and self.random.random() < self.failure_rate:
+            return 503, {'error': 'injected'}
+        fault = self._fault(method, parts)
+        if fault is not None and not fault[3]:
+            return self._fault_response(fault[2])
+        key = headers.get('Idempotency-Key')
+        if key is not None and key in self.idempotent:
+            response = self.idempotent[key]
+        else:
+            response = self._handle(method, parts, fields, headers)
+            if key is not None and response is not None and response[0] == 200:
+                self.idempotent[key] = response
+        if fault is not None:
+            return self._fault_response(fault[2])
+        return response
+
+    def _fault_response(self, response):
+        if response == 'drop':
+            return None
+        if isinstance(response, tuple):
+            return response[0], {'error': 'injected'}, response[1]
+        return response, {'error': 'injected'}
+
+    def _handle(self, method, parts, fields, headers):
+        if parts[:1] == ['plot'] and len(parts) > 1 and parts[1] in self.jobs:
+            page = '<html><body>{}</body></html>'.format('/'.join(parts[1:]))
+            return 200, page.encode('utf-8'), {'Content-Type': 'text/html'}
+        if parts[:1] != ['api']:
+            return 404, {'error': 'not found'}
+        if parts[1:] == ['capabilities'] and (self.push or self.formats):
+            capabilities = {'push': list(self.push),
+                            'formats': list(self.formats)}
+            return 200, dict((k, v) for k, v in capabilities.items() if v)
+        if method == 'POST' and parts[1:] in (['staticgp'], ['dynamicgp']):
+            for ref in ('dataref', 'mi.dataref'):
+                if ref in fields and fields[ref].decode() not in self.files:
+                    return 400, {'error': 'unknown {}'.format(ref)}
+            if fields.get('method', b'BART') not in (b'BART', b'GP'):
+                return 400, {'error': 'invalid method'}
+            return 200, {'jobid': self.new_job(parts[1], fields)}
+        if parts[1:2] == ['upload'] and self.resumable:
+            return self.handle_tus(method, parts[2:], fields, headers)
+        if method == 'POST' and parts[1:] == ['uploadfile']:
+            fileref = str(uuid.uuid4())
+            self.files[fileref] = fields.get('data')
+            return 200, {'fileref': fileref}
+        if len(parts) < 4 or parts[1] != 'job' or parts[2] not in self.jobs:
+            return 404, {'error': 'not found'}
+        jobid, action = parts[2], parts[3]
+        if method == 'POST' and action.endswith('.cate'):
+            return 200, {'jobid': self.new_job(action, fields, parent=jobid)}
+        if action == 'status' and 'wait' in fields and 'longpoll' in self.push:
+            return 200, {'status': self.wait_change(jobid,
+                                                    float(fields['wait']))}
+        if action == 'status':
+            return 200, self.progress(jobid)
+        if action == 'events' and 'sse' in self.push:
+            return 200, self.events(jobid)
+        if (method == 'POST' and action == 'webhook' and
+                'webhook' in self.push):
+            thread = threading.Thread(target=self.callback,
+                                      args=(jobid, fields['url'].decode()))
+            thread.daemon = True
+            thread.start()
+            return 200, {}
+        if action == 'results':
+            return 200, self.results(jobid)
+        if action in ('print', 'printCATE'):
+            return 200, 'Results for {}\n'.format(jobid)
+        if action == 'ploturl':
+            return 200, {'url': '{}/plot/{}'.format(self.url, jobid)}
+        return 404, {'error': 'not found'}
+
+
+if __name__ == '__main__':
+    server = StubServer(port=int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    print('PCATS stand-in listening on {}'.format(server.url))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
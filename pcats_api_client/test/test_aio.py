@@ -0,0 +1,40 @@
+"""
+test code for the asyncio client
+
+can be run with py.test
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from pcats_api_client.aio import AsyncPcatsClient
+from pcats_api_client.poller import Backoff
+
+
+def test_async_client(server):
+    server.job_duration = 0.2
+
+    async def run():
+        async with AsyncPcatsClient(server.url, max_concurrency=10,
+                                    backoff=Backoff(0.05)) as client:
+            jobids = await asyncio.gather(*[
+                client.staticgp(datafile=__file__, outcome="y",
+                                treatment="tr", seed=seed)
+                for seed in range(50)])
+            statuses = await asyncio.gather(*[
+                client.wait_for_result(jobid) for jobid in jobids])
+            cate = await client.staticgp_cate(jobids[0], "x", "0", "1")
+            return (jobids, statuses, await client.wait_for_result(cate),
+                    await client.results(jobids[0]),
+                    await client.ploturl(jobids[0], "ate"))
+
+    jobids, statuses, cate_status, res, url = asyncio.run(run())
+    assert len(set(jobids)) == 50
+    assert statuses == ["Done"] * 50
+    assert cate_status == "Done"
+    assert jobids[0] in res
+    assert url.endswith("/plot/{}/ate".format(jobids[0]))
+    assert server.jobs[jobids[3]]["fields"]["seed"] == b"3"
@@ -0,0 +1,41 @@
+"""
+test code for batch submission
+
+can be run with py.test
+"""
+
+import time
+
+from pcats_api_client import submit_many
+from pcats_api_client.batch import RateLimiter
+
+
+def test_submit_many(server, client):
+    params = [{"outcome": "y", "treatment": "tr", "seed": seed}
+              for seed in range(20)]
+    handles = submit_many(params, max_workers=4, client=client)
+    jobids = [h.jobid(timeout=10) for h in handles]
+    assert len(set(jobids)) == 20
+    assert [server.jobs[j]["fields"]["seed"] for j in jobids] == \
+        [str(seed).encode() for seed in range(20)]
+    assert handles[0].result() is not None
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(50)
+    start = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.19
+
+
+def test_cate_kind(server, client):
+    parent = client.staticgp(outcome="y", treatment="tr")
+    assert client.wait_for_result(parent) == "Done"
+    handles = submit_many([{"jobid": parent, "x": "x1", "control_tr": 0,
+                            "treat_tr": 1}] * 2,
+                          method="staticgp_cate", client=client)
+    assert [h.kind for h in handles] == ["CATE", "CATE"]
+    assert [h.wait() for h in handles] == ["Done", "Done"]
+    assert len(client.poller.durations["CATE"]) == 2
+    assert "BART" not in client.poller.durations
@@ -0,0 +1,112 @@
+"""
+benchmarks of the client against the local PCATS stand-in
+
+can be run with py.test (requires pytest-benchmark); compare runs with
+py.test --benchmark-autosave and py.test --benchmark-compare
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import pcats_api_client
+from pcats_api_client import submit_many
+
+pytest.importorskip("pytest_benchmark")
+
+from stub_server import StubServer
+
+ROUNDS = 5
+JOBS = 32
+
+
+@pytest.fixture
+def server():
+    with StubServer(latency=0.002) as srv:
+        yield srv
+
+
+def _client(server, workers):
+    cli = pcats_api_client.PcatsClient(server.url, pool_connections=workers,
+                                       pool_maxsize=workers, push=False)
+    cli.latencies = []
+    cli.hooks.append(lambda event, data: cli.latencies.append(data['seconds'])
+                     if event == 'request' else None)
+    return cli
+
+
+def _report(benchmark, cli, count):
+    """Add throughput and per-request p50/p99 latency to the report"""
+    if benchmark.disabled:
+        return
+    latencies = sorted(cli.latencies)
+    percentiles = statistics.quantiles(latencies, n=100)
+    benchmark.extra_info['requests'] = len(latencies)
+    benchmark.extra_info['p50_ms'] = 1000 * statistics.median(latencies)
+    benchmark.extra_info['p99_ms'] = 1000 * percentiles[98]
+    # jobs, results or megabytes per second
+    benchmark.extra_info['per_second'] = count / benchmark.stats['median']
+
+
+@pytest.mark.parametrize("workers", [1, 8, 32])
+def test_submit(benchmark, server, workers):
+    params = [{"outcome": "y", "treatment": "tr", "seed": seed}
+              for seed in range(JOBS)]
+    with _client(server, workers) as cli:
+        def submit():
+            handles = submit_many(params, max_workers=workers, client=cli)
+            return [h.jobid() for h in handles]
+
+        jobids = benchmark.pedantic(submit, rounds=ROUNDS)
+        assert len(set(jobids)) == JOBS
+        _report(benchmark, cli, JOBS)
+
+
+@pytest.mark.parametrize("workers", [1, 8, 32])
+def test_poll(benchmark, server, workers):
+    with _client(server, workers) as cli:
+        jobids = [cli.staticgp(outcome="y", treatment="tr", seed=seed)
+                  for seed in range(JOBS)]
+        cli.latencies = []
+
+        def poll():
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(cli.job_status, jobids))
+
+        statuses = benchmark.pedantic(poll, rounds=ROUNDS)
+        assert statuses == ["Done"] * JOBS
+        _report(benchmark, cli, JOBS)
+
+
+@pytest.mark.parametrize("rows", [10, 100000])
+def test_results(benchmark, server, rows):
+    server.result_rows = rows
+    with _client(server, 1) as cli:
+        jobid = cli.staticgp(outcome="y", treatment="tr")
+        cli.latencies = []
+        result = benchmark.pedantic(cli.results, args=(jobid,),
+                                    kwargs={"parse": True}, rounds=ROUNDS)
+        assert len(result["samples"]) == rows
+        _report(benchmark, cli, 1)
+
+
+@pytest.mark.parametrize("size", [1 << 10, 1 << 20, 16 << 20])
+def test_upload(benchmark, server, tmp_path, size):
+    datafile = tmp_path / "data.csv"
+    datafile.write_bytes(os.urandom(size // 2).hex().encode())
+    with _client(server, 1) as cli:
+        fileref = benchmark.pedantic(cli.uploadfile, args=(str(datafile),),
+                                     rounds=ROUNDS)
+        assert len(server.files[fileref]) == size
+        _report(benchmark, cli, size / 1e6)
+
+
+def test_import(benchmark):
+    # a fresh interpreter for every round
+    benchmark.pedantic(subprocess.check_call,
+                       args=([sys.executable, '-c', 'import pcats_api_client'],),
+                       rounds=ROUNDS)
@@ -0,0 +1,34 @@
+"""
+test code for bulk CATE estimation
+
+can be run with py.test
+"""
+
+import pcats_api_client
+from pcats_api_client import cate_many
+
+
+def test_cate_many(server, client):
+    parent = client.staticgp(outcome="y", treatment="tr")
+    specs = [("x{}".format(i), 0, 1) for i in range(10)]
+    specs += [("x0", 0, 1), {"x": "x1", "control_tr": 0, "treat_tr": 2,
+                             "c_margin": 0.5}]
+    table = cate_many(parent, specs, max_workers=4, client=client)
+    assert server.count("POST", "/staticgp.cate") == 11
+    assert len(table["jobid"]) == 22
+    assert table["x"][:4] == ["x0", "x0", "x1", "x1"]
+    assert table["level"][:2] == [0, 1]
+    assert table["treat_tr"][-1] == 2
+    assert set(table["status"]) == {"Done"}
+    assert all(server.jobs[j]["parent"] == parent for j in table["jobid"])
+
+
+def test_cate_many_reuses_cached_children(server):
+    cache = pcats_api_client.ResultCache(":memory:")
+    with pcats_api_client.PcatsClient(server.url, result_cache=cache) as cli:
+        parent = cli.staticgp(outcome="y", treatment="tr")
+        specs = [("x{}".format(i), 0, 1) for i in range(3)]
+        first = cate_many(parent, specs, client=cli)
+        second = cate_many(parent, specs + [("x3", 0, 1)], client=cli)
+    assert server.count("POST", "/staticgp.cate") == 4
+    assert second["jobid"][:6] == first["jobid"]
@@ -0,0 +1,87 @@
+"""
+test code for the pcats command line tool
+
+can be run with py.test
+"""
+
+import json
+
+import pytest
+
+from pcats_api_client import cli
+from pcats_api_client.download import FAILED, Download
+
+
+def write_manifest(tmp_path, jobs):
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps({"defaults": {"outcome": "y", "treatment": "tr"},
+                                "jobs": jobs}))
+    return str(path)
+
+
+def test_run(server, tmp_path, capsys):
+    manifest = write_manifest(tmp_path, [
+        {"name": "bart", "seed": 1},
+        {"name": "gp", "method": "GP", "datafile": __file__},
+        {"name": "bart-x1", "endpoint": "staticgp_cate", "parent": "bart",
+         "x": "x1", "control_tr": 0, "treat_tr": 1},
+    ])
+    out = tmp_path / "out"
+    assert cli.main(["--url", server.url, "run", manifest, "-o", str(out),
+                     "-j", "3"]) == 0
+    assert sorted(p.name for p in out.iterdir() if p.suffix != ".etag") == \
+        ["bart-x1.json", "bart.json", "gp.json"]
+    assert "CATE" in json.loads((out / "bart-x1.json").read_text())
+    journal = [json.loads(line) for line in open(manifest + ".journal")]
+    assert [e["status"] for e in journal if e["name"] == "bart"] == \
+        [None, "Done"]
+
+    # a second run finds everything done
+    assert cli.main(["--url", server.url, "run", manifest, "-o",
+                     str(out)]) == 0
+    assert len(server.jobs) == 3
+
+
+def test_reattach(server, tmp_path):
+    manifest = write_manifest(tmp_path, [{"name": "a"}, {"name": "b"}])
+    jobid = server.new_job("staticgp", {})
+    journal = cli.Journal(manifest + ".journal")
+    journal.record("a", jobid)
+    journal.record("b", "lost", "Error")
+    with open(manifest + ".journal", "a") as f:
+        f.write('{"name": "b", "jobi')
+    journal.close()
+    assert cli.main(["--url", server.url, "run", manifest, "-o",
+                     str(tmp_path)]) == 0
+    assert server.count("POST", "/staticgp") == 1
+    assert cli.Journal(manifest + ".journal").get("a") == \
+        {"name": "a", "jobid": jobid, "status": "Done"}
+
+
+def test_download_retried(server, tmp_path, monkeypatch):
+    manifest = write_manifest(tmp_path, [{"name": "a"}])
+    out = tmp_path / "out"
+    failed = Download("a", "results", None, FAILED, error="disk full")
+    monkeypatch.setattr(cli, "fetch", lambda *args, **kwargs: failed)
+    assert cli.main(["--url", server.url, "run", manifest, "-o",
+                     str(out)]) == 1
+    state = cli.Journal(manifest + ".journal").get("a")
+    assert state["status"] == "Done"
+    assert state["download_error"] == "disk full"
+
+    monkeypatch.undo()
+    assert cli.main(["--url", server.url, "run", manifest, "-o",
+                     str(out)]) == 0
+    assert server.count("POST", "/staticgp") == 1
+    assert "ATE" in json.loads((out / "a.json").read_text())
+    assert cli.Journal(manifest + ".journal").get("a") == \
+        {"name": "a", "jobid": state["jobid"], "status": "Done"}
+
+
+def test_manifest_errors(tmp_path):
+    with pytest.raises(ValueError):
+        cli.load_manifest(write_manifest(tmp_path, [
+            {"name": "x", "endpoint": "staticgp_cate", "parent": "y"},
+            {"name": "y"}]))
+    with pytest.raises(ValueError):
+        cli.load_manifest(write_manifest(tmp_path, [{"endpoint": "nope"}]))
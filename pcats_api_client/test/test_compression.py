@@ -0,0 +1,48 @@
+"""
+test code for upload compression
+
+can be run with py.test
+"""
+
+import pytest
+
+from pcats_api_client.compression import choose_encoding
+
+
+def test_compressed_upload(server, client, tmp_path):
+    datafile = tmp_path / "data.csv"
+    content = b"y,tr,x\n" + b"1.5,0,abc\n" * 50000
+    datafile.write_bytes(content)
+    fileref = client.uploadfile(str(datafile), compress="auto")
+    assert server.files[fileref] == content
+    assert server.requests[-1][2]["Content-Encoding"] == "gzip"
+    assert client.stats.compression_ratio > 10
+    assert client.stats.compression_time_saved is not None
+
+    jobid = client.staticgp(datafile=str(datafile), outcome="y",
+                            treatment="tr", compress="gzip")
+    assert server.jobs[jobid]["fields"]["data"] == content
+
+
+def test_zstd_upload(server, client, tmp_path):
+    pytest.importorskip("zstandard")
+    datafile = tmp_path / "data.csv"
+    datafile.write_bytes(b"y,tr\n1,0\n" * 1000)
+    fileref = client.uploadfile(str(datafile), compress="zstd")
+    assert server.files[fileref] == b"y,tr\n1,0\n" * 1000
+
+
+def test_choose_encoding(tmp_path):
+    small = tmp_path / "small.csv"
+    small.write_bytes(b"y\n1\n")
+    large = tmp_path / "large.csv"
+    large.write_bytes(b"y\n1\n" * 100000)
+    excel = tmp_path / "large.xls"
+    excel.write_bytes(b"\0" * 100000)
+    assert choose_encoding("auto", [str(small)]) is None
+    assert choose_encoding("auto", [str(large)]) == "gzip"
+    assert choose_encoding("auto", [str(excel)]) is None
+    assert choose_encoding(None, [str(large)]) is None
+    assert choose_encoding("zstd", [str(small)]) == "zstd"
+    with pytest.raises(ValueError):
+        choose_encoding("lzma", [str(small)])
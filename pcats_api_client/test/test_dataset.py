@@ -0,0 +1,79 @@
+"""
+test code for in-memory job input
+
+can be run with py.test
+"""
+
+import io
+
+import pytest
+
+import pcats_api_client
+from pcats_api_client.dataset import Dataset
+
+pandas = pytest.importorskip("pandas")
+
+
+def frame(n=100, shift=0):
+    return pandas.DataFrame({"y": [i * 0.5 + shift for i in range(n)],
+                             "tr": [i % 2 for i in range(n)]})
+
+
+def test_dataset_csv_stream():
+    data = Dataset(frame(25), chunk_rows=10)
+    assert data.size is None
+    content = data.open().read()
+    assert content.splitlines()[0] == b"y,tr"
+    assert len(content.splitlines()) == 26
+    assert data.digest() == Dataset(frame(25)).digest() != \
+        Dataset(frame(25, 1)).digest()
+
+    records = frame(3).to_records(index=False)
+    assert Dataset(records).open().read().splitlines() == \
+        [b"y,tr", b"0.0,0", b"0.5,1", b"1.0,0"]
+
+
+def test_dataset_imputations():
+    content = Dataset([frame(2), frame(2, 1)]).open().read()
+    assert content.splitlines() == [b".imp,y,tr", b"1,0.0,0", b"1,0.5,1",
+                                    b"2,1.0,0", b"2,1.5,1"]
+
+
+def test_staticgp_dataframe(server, client):
+    jobid = client.staticgp(datafile=frame(5000), outcome="y", treatment="tr",
+                            mi_datafile=[frame(10), frame(10, 1)])
+    fields = server.jobs[jobid]["fields"]
+    assert fields["data"].count(b"\n") == 5001
+    assert fields["mi.data"].startswith(b".imp,y,tr\n1,")
+    chunked = [r for r in server.requests if r[0] == "POST"][-1][2]
+    assert chunked.get("Transfer-Encoding") == "chunked"
+
+    with pytest.raises(pcats_api_client.PreflightError):
+        client.staticgp(datafile=frame(), outcome="y", treatment="missing")
+
+
+def test_uploadfile_file_object(server, client):
+    fileref = client.uploadfile(io.BytesIO(b"y,tr\n1,0\n"))
+    assert server.files[fileref] == b"y,tr\n1,0\n"
+
+
+def test_dataframe_cached(server, tmp_path):
+    with pcats_api_client.PcatsClient(
+            server.url, upload_cache=pcats_api_client.UploadCache(":memory:"),
+            result_cache=pcats_api_client.ResultCache(":memory:")) as cli:
+        first = cli.staticgp(datafile=frame(), outcome="y", treatment="tr")
+        assert cli.staticgp(datafile=frame(), outcome="y",
+                            treatment="tr") == first
+        cli.uploadfile(frame())
+    assert server.count("POST", "/uploadfile") == 1
+    assert server.count("POST", "/staticgp") == 1
+
+
+def test_columnar_format(server, client):
+    pyarrow = pytest.importorskip("pyarrow")
+    server.formats = ("parquet", "csv")
+    fileref = client.uploadfile(frame())
+    import pyarrow.parquet
+    table = pyarrow.parquet.read_table(pyarrow.BufferReader(
+        server.files[fileref]))
+    assert table.column_names == ["y", "tr"]
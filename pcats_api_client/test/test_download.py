@@ -0,0 +1,86 @@
+"""
+test code for the concurrent artifact downloader
+
+can be run with py.test
+"""
+
+import json
+import os
+
+import pytest
+
+from pcats_api_client import pcats_api
+from pcats_api_client.download import download_artifacts, fetch
+
+
+def _jobs(client, n):
+    return [pcats_api.staticgp(datafile=__file__, outcome="y", treatment="tr",
+                               client=client) for _ in range(n)]
+
+
+def test_ploturl(client, server):
+    jobid = _jobs(client, 1)[0]
+    assert pcats_api.ploturl(jobid, client=client) == \
+        "{}/plot/{}".format(server.url, jobid)
+    assert pcats_api.ploturl(jobid, "ate", client=client).endswith("/ate")
+
+
+def test_download_artifacts(client, server, tmp_path):
+    jobids = _jobs(client, 5)
+    seen = []
+    done = download_artifacts(jobids, ("results", "print", "plot:ate"),
+                              str(tmp_path), max_workers=4, client=client,
+                              callback=seen.append)
+    assert len(done) == len(seen) == 15
+    assert [(d.jobid, d.artifact) for d in done] == \
+        [(j, a) for j in jobids for a in ("results", "print", "plot:ate")]
+    assert set(d.status for d in done) == {"downloaded"}
+    for d in done:
+        assert os.path.getsize(d.path) == d.size
+    path = os.path.join(str(tmp_path), jobids[0])
+    assert sorted(f for f in os.listdir(path) if not f.endswith(".etag")) == \
+        ["plot-ate.html", "print.txt", "results.json"]
+    assert json.load(open(os.path.join(path, "results.json"))) == \
+        server.results(jobids[0])
+    assert not [f for f in os.listdir(path) if f.endswith(".part")]
+
+
+def test_existing_files_skipped(client, server, tmp_path):
+    jobid = _jobs(client, 1)[0]
+    assert fetch(jobid, "print", str(tmp_path), client=client).status == \
+        "downloaded"
+    requests = len(server.requests)
+    again = fetch(jobid, "print", str(tmp_path), client=client)
+    assert again.status == "skipped"
+    assert len(server.requests) == requests
+
+
+def test_same_stem(client, server, tmp_path):
+    jobid = _jobs(client, 1)[0]
+    (tmp_path / "a.txt").write_text("print output")
+    done = fetch(jobid, "results", str(tmp_path), name="a", client=client)
+    assert done.status == "downloaded"
+    assert done.path == str(tmp_path / "a.json")
+    assert (tmp_path / "a.txt").read_text() == "print output"
+
+
+def test_revalidate(client, server, tmp_path):
+    jobid = _jobs(client, 1)[0]
+    first = fetch(jobid, "results", str(tmp_path), client=client)
+    assert os.path.exists(first.path + ".etag")
+    again = fetch(jobid, "results", str(tmp_path), revalidate=True,
+                  client=client)
+    assert again.status == "not-modified"
+    assert server.requests[-1][2]["If-None-Match"]
+    os.remove(first.path + ".etag")
+    assert fetch(jobid, "results", str(tmp_path), revalidate=True,
+                 client=client).status == "downloaded"
+
+
+def test_failures(client, tmp_path):
+    done = download_artifacts(["no-such-job"], ("results",), str(tmp_path),
+                              client=client)
+    assert done[0].status == "failed" and done[0].path is None
+    with pytest.raises(ValueError):
+        download_artifacts(["no-such-job"], ("tables",), str(tmp_path),
+                           client=client)
@@ -0,0 +1,47 @@
+"""
+test code for lazy loading of the package exports
+
+can be run with py.test
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+import pcats_api_client
+
+# Modules the package must not load until they are used
+HEAVY = ('requests', 'urllib3', 'aiohttp', 'pandas', 'pyarrow', 'numpy',
+         'zstandard', 'yaml', 'pcats_api_client.pcats_api')
+
+
+def _import(code):
+    """Return the modules loaded by code in a fresh interpreter"""
+    out = subprocess.check_output(
+        [sys.executable, '-c', 'import sys\n' + code + '\n'
+         'import json\n'
+         'print(json.dumps(sorted(sys.modules)))'])
+    return json.loads(out.decode().splitlines()[-1])
+
+
+def test_import_is_light():
+    modules = _import('import pcats_api_client')
+    assert [m for m in HEAVY if m in modules] == []
+
+
+def test_exports_load_on_use():
+    modules = _import('from pcats_api_client import ResultCache')
+    assert 'requests' not in modules
+    modules = _import('from pcats_api_client import staticgp')
+    assert 'requests' in modules
+    assert 'aiohttp' not in modules and 'pandas' not in modules
+
+
+def test_exports():
+    for name in pcats_api_client.__all__:
+        assert getattr(pcats_api_client, name) is not None
+        assert name in dir(pcats_api_client)
+    with pytest.raises(AttributeError):
+        pcats_api_client.no_such_name
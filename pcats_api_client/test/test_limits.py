@@ -0,0 +1,156 @@
+"""
+test code for rate limits, job budgets and fair scheduling
+
+can be run with py.test
+"""
+
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from pcats_api_client import JobBudget, PcatsClient, RateLimiter, Scheduler
+from pcats_api_client.limits import traffic_class
+
+
+def test_traffic_class():
+    assert traffic_class('POST', '/api/staticgp') == 'submit'
+    assert traffic_class('PATCH', 'http://h/api/upload/1') == 'submit'
+    assert traffic_class('GET', '/api/job/j/status?wait=5') == 'poll'
+    assert traffic_class('GET', '/api/job/j/events') == 'poll'
+    assert traffic_class('GET', '/api/job/j/results') == 'download'
+
+
+def test_shared_rate_limiter(tmp_path):
+    path = str(tmp_path / 'rate')
+    limiters = [RateLimiter(20, path=path) for _ in range(3)]
+    start = time.monotonic()
+    threads = [threading.Thread(target=lambda l=l: [l.acquire()
+                                                    for _ in range(4)])
+               for l in limiters]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 12 calls at 20 per second from one bucket, the first one immediate
+    assert time.monotonic() - start >= 11 / 20 * 0.9
+
+
+def _take(path, n, out):
+    limiter = RateLimiter(50, path=path)
+    for _ in range(n):
+        limiter.acquire()
+        out.put(time.time())
+
+
+def test_rate_limiter_across_processes(tmp_path):
+    path = str(tmp_path / 'rate')
+    out = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_take, args=(path, 5, out))
+             for _ in range(2)]
+    for p in procs:
+        p.start()
+    times = sorted(out.get(timeout=10) for _ in range(10))
+    for p in procs:
+        p.join()
+    assert times[-1] - times[0] >= 9 / 50 * 0.9
+
+
+def test_job_budget(tmp_path):
+    path = str(tmp_path / 'jobs')
+    a, b = JobBudget(2, path=path), JobBudget(2, path=path)
+    slot = a.acquire()
+    b.bind(b.acquire(), 'job-1')
+    assert b.try_acquire() is None and len(a) == 2
+    with pytest.raises(TimeoutError):
+        a.acquire(timeout=0.2)
+    a.bind(slot, None)
+    assert len(b) == 1
+    b.release('job-1')
+    assert len(a) == 0
+
+    budget = JobBudget(1, ttl=0)
+    budget.acquire()
+    time.sleep(0.01)
+    assert budget.try_acquire() is not None
+
+
+def test_fair_share():
+    scheduler = Scheduler(rate=100, shares={'poll': 3})
+    order = []
+    lock = threading.Lock()
+
+    def run(kind):
+        scheduler.acquire(kind)
+        with lock:
+            order.append(kind)
+
+    # use up the burst so that the requests below queue up
+    scheduler.acquire('submit')
+    threads = [threading.Thread(target=run, args=(kind,))
+               for kind in ['submit'] * 20 + ['poll'] * 20]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    first = order[:16]
+    assert 9 <= first.count('poll') <= 14
+    assert scheduler.granted['poll'] == 20
+
+
+def test_priority():
+    scheduler = Scheduler(rate=100, priorities={'poll': 1})
+    order = []
+    scheduler.acquire('submit')
+    threads = [threading.Thread(target=lambda k=k: order.append(
+        (scheduler.acquire(k), k)[1])) for k in ['submit'] * 5 + ['poll'] * 5]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert order[-3:] == ['submit'] * 3
+
+
+def test_client_scheduler(server, tmp_path):
+    scheduler = Scheduler(rate=50, burst=5, max_jobs=2,
+                          path=str(tmp_path / 'node'))
+    with PcatsClient(server.url, scheduler=scheduler, push=False) as cli:
+        jobs = [cli.staticgp(datafile=__file__, outcome="y", treatment="tr")
+                for _ in range(2)]
+        assert len(scheduler.jobs) == 2
+        assert scheduler.jobs.try_acquire() is None
+        for jobid in jobs:
+            assert cli.wait_for_result(jobid) == "Done"
+        assert len(scheduler.jobs) == 0
+        assert scheduler.granted['submit'] == 2
+        assert scheduler.granted['poll'] >= 2
+        start = time.monotonic()
+        for _ in range(15):
+            cli.job_status(jobs[0])
+        assert time.monotonic() - start >= 10 / 50 * 0.9
+        assert cli.metrics.total('pcats_throttled_seconds') > 0
+
+
+def test_budget_polls_held_jobs(server):
+    server.job_duration = 0.2
+    scheduler = Scheduler(max_jobs=2, job_check=0.1)
+    with PcatsClient(server.url, scheduler=scheduler, push=False) as cli:
+        # nobody asks for the status of these jobs
+        jobs = [cli.staticgp(outcome="y", treatment="tr", seed=seed)
+                for seed in range(3)]
+        assert all(jobs) and len(set(jobs)) == 3
+        assert server.count("GET", "/status") >= 2
+        assert scheduler.jobs.held() == [jobs[2]]
+
+
+def test_granted_without_rate():
+    scheduler = Scheduler()
+    threads = [threading.Thread(target=lambda: [scheduler.acquire('submit')
+                                                for _ in range(1000)])
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert scheduler.granted['submit'] == 8000
@@ -0,0 +1,50 @@
+"""
+test code for client instrumentation
+
+can be run with py.test
+"""
+
+from pcats_api_client.metrics import MetricsRegistry, endpoint_name
+from pcats_api_client.poller import Backoff, JobPoller
+
+
+def test_request_metrics(server, client):
+    events = []
+    client.hooks.append(lambda event, data: events.append((event, data)))
+    jobid = client.staticgp(datafile=__file__, outcome="y", treatment="tr")
+    client.results(jobid)
+    submit = events[0][1]
+    assert submit["endpoint"] == "/api/staticgp"
+    assert submit["bytes_sent"] > len(open(__file__, "rb").read())
+    assert events[1][1]["endpoint"] == "/api/job/{jobid}/results"
+    assert events[1][1]["bytes_received"] > 0
+    h = client.metrics.histogram("pcats_request_seconds", method="POST",
+                                 endpoint="/api/staticgp", status="200")
+    assert h.count == 1
+    text = client.metrics.to_prometheus()
+    assert 'pcats_request_seconds_count{endpoint="/api/staticgp",method="POST",status="200"} 1' in text
+
+
+def test_job_metrics(server, client):
+    server.queue_duration = 0.1
+    server.job_duration = 0.3
+    poller = JobPoller(client, backoff=Backoff(0.02, maximum=0.05))
+    jobid = client.staticgp(outcome="y", treatment="tr", method="GP")
+    assert poller.wait(jobid, kind="GP", timeout=10) == "Done"
+    poller.stop()
+    assert client.metrics.total("pcats_polls") == poller.polls
+    total = client.metrics.histogram("pcats_job_seconds", kind="GP",
+                                     phase="total")
+    queue = client.metrics.histogram("pcats_job_seconds", kind="GP",
+                                     phase="queue")
+    assert total.count == 1 and queue.count == 1
+    assert 0.05 <= queue.sum < total.sum
+
+
+def test_histogram_quantiles():
+    registry = MetricsRegistry()
+    for i in range(100):
+        registry.observe("x", 0.001 if i < 90 else 3)
+    assert registry.histogram("x").quantile(0.5) == 0.005
+    assert registry.histogram("x").quantile(0.99) == 5
+    assert endpoint_name("/api/job/abc-1/status?wait=1") == "/api/job/{jobid}/status"
@@ -14,8 +14,35 @@ import pytest
 import pcats_api_client
 # from pcats_api_client import pcats_api
 
-def test_pcats_api():
-    pcats_api_client.job_status("098")
-    # pcats_api.job_status("098")
-
-
+def test_pcats_api(server, client):
+    previous = pcats_api_client.default_client()
+    pcats_api_client.set_default_client(client)
+    try:
+        assert pcats_api_client.job_status("098") is None
+        # pcats_api.job_status("098")
+    finally:
+        pcats_api_client.set_default_client(previous)
+
+def test_client_reuses_connection(server, client):
+    jobid = client.staticgp(datafile=__file__, outcome="y", treatment="tr")
+    assert jobid in server.jobs
+    for _ in range(5):
+        assert client.job_status(jobid) == "Done"
+    assert client.wait_for_result(jobid) == "Done"
+    assert len(server.connections) == 1
+
+def test_client_token(server):
+    with pcats_api_client.PcatsClient(server.url, token="abc") as client:
+        client.uploadfile(__file__)
+        client.uploadfile(__file__, token="xyz")
+    auth = [r[2].get("Authorization") for r in server.requests]
+    assert auth == ["Bearer abc", "Bearer xyz"]
+
+def test_default_client(server, client):
+    previous = pcats_api_client.default_client()
+    pcats_api_client.set_default_client(client)
+    try:
+        jobid = pcats_api_client.staticgp(outcome="y", treatment="tr")
+        assert pcats_api_client.job_status(jobid) == "Done"
+    finally:
+        pcats_api_client.set_default_client(previous)
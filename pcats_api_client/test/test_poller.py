@@ -0,0 +1,47 @@
+"""
+test code for the job poller
+
+can be run with py.test
+"""
+
+import pytest
+
+from pcats_api_client.poller import Backoff, JobPoller
+
+
+def test_poller_multiplexes_jobs(server, client):
+    server.job_duration = 0.3
+    jobids = [client.staticgp(outcome="y", treatment="tr", seed=seed)
+              for seed in range(30)]
+    finished = []
+    poller = JobPoller(client, backoff=Backoff(0.05, maximum=0.2))
+    futures = [poller.track(jobid, kind="BART",
+                            callback=lambda j, s: finished.append(j))
+               for jobid in jobids]
+    assert [f.result(timeout=10) for f in futures] == ["Done"] * 30
+    assert sorted(finished) == sorted(jobids)
+    assert server.count("GET", "/status") == poller.polls
+    assert poller.polls < 30 * 10
+    assert len(poller.durations["BART"]) == 20
+    poller.stop()
+
+
+def test_poller_error(server, client):
+    poller = JobPoller(client)
+    assert poller.wait("missing", timeout=10) == "Error"
+    assert poller.wait(None) == "Error"
+    poller.stop()
+
+
+def test_poller_survives_failing_callback(server, client):
+    def fail(jobid, status):
+        raise RuntimeError("callback failed")
+
+    poller = JobPoller(client, backoff=Backoff(0.05, maximum=0.2))
+    first = client.staticgp(outcome="y", treatment="tr", seed=1)
+    with pytest.warns(UserWarning, match="callback failed"):
+        assert poller.track(first, callback=fail).result(timeout=10) == "Done"
+        second = client.staticgp(outcome="y", treatment="tr", seed=2)
+        assert poller.wait(second, timeout=10) == "Done"
+    assert poller._thread.is_alive()
+    poller.stop()
@@ -0,0 +1,158 @@
+"""
+test code for load balancing and failover across several servers
+
+can be run with py.test
+"""
+
+import socket
+from collections import Counter
+
+import pytest
+
+from pcats_api_client import EndpointPool, JobRegistry, PcatsClient
+from pcats_api_client import pcats_api
+
+from stub_server import StubServer
+
+
+@pytest.fixture
+def servers():
+    with StubServer() as a, StubServer() as b:
+        yield a, b
+
+
+@pytest.fixture
+def dead_url():
+    # a port nobody listens on
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return 'http://127.0.0.1:{}'.format(port)
+
+
+def _submit(cli, **kwargs):
+    return cli.staticgp(datafile=__file__, outcome="y", treatment="tr",
+                        **kwargs)
+
+
+def _owner(servers, jobid):
+    return [s for s in servers if jobid in s.jobs][0]
+
+
+def test_spread_and_affinity(servers):
+    with PcatsClient([s.url for s in servers]) as cli:
+        jobids = [_submit(cli) for _ in range(6)]
+        assert [len(s.jobs) for s in servers] == [3, 3]
+        for jobid in jobids:
+            assert cli.job_status(jobid) == "Done"
+            assert cli.pool.owner(jobid) == _owner(servers, jobid).url
+            assert jobid in cli.printgp(jobid)
+        for s in servers:
+            assert s.count('GET', '/status') == 3
+
+        cate = cli.staticgp_cate(jobids[0], x="x1", control_tr=0, treat_tr=1)
+        assert _owner(servers, cate) is _owner(servers, jobids[0])
+
+
+def test_jobs_located_by_new_client(servers):
+    with PcatsClient(servers[1].url) as cli:
+        jobid = _submit(cli)
+    with PcatsClient([s.url for s in servers]) as cli:
+        assert cli.job_status(jobid) == "Done"
+        assert cli.pool.owner(jobid) == servers[1].url
+        assert cli.job_status(jobid) == "Done"
+    assert servers[1].count('GET', '/status') == 3
+
+
+def test_reattach_uses_registry_affinity(servers):
+    registry = JobRegistry(':memory:')
+    with PcatsClient(servers[1].url, registry=registry) as cli:
+        jobid = _submit(cli)
+    with PcatsClient([s.url for s in servers], registry=registry) as cli:
+        futures = registry.reattach(cli)
+        assert futures[jobid].result(timeout=10) == "Done"
+    assert servers[0].count('GET', '/status') == 0
+
+
+def test_uploaded_file_used_on_its_server(servers):
+    with PcatsClient([s.url for s in servers]) as cli:
+        fileref = cli.uploadfile(__file__)
+        owner = [s for s in servers if fileref in s.files][0]
+        jobids = [cli.staticgp(dataref=fileref, outcome="y", treatment="tr")
+                  for _ in range(3)]
+        assert all(jobid in owner.jobs for jobid in jobids)
+
+
+def test_resumable_upload_used_on_its_server(servers, tmp_path):
+    from pcats_api_client.upload import upload_resumable
+    datafile = tmp_path / "data.csv"
+    datafile.write_text("y,tr\n" + "1,0\n" * 20000)
+    with PcatsClient([s.url for s in servers]) as cli:
+        for _ in range(2):
+            fileref = upload_resumable(str(datafile), chunk_size=16384,
+                                       client=cli)
+            owner = [s for s in servers if fileref in s.files][0]
+            assert cli.pool.owner(fileref) == owner.url
+            jobids = [cli.staticgp(dataref=fileref, outcome="y",
+                                   treatment="tr") for _ in range(3)]
+            assert all(jobid in owner.jobs for jobid in jobids)
+        with pytest.raises(ValueError):
+            upload_resumable(str(datafile), client=cli,
+                             upload_url="http://proxy.invalid/api/upload/1")
+
+
+def test_failover(servers, dead_url):
+    live = servers[0]
+    with PcatsClient([dead_url, live.url]) as cli:
+        jobids = [_submit(cli) for _ in range(4)]
+        assert None not in jobids
+        assert len(live.jobs) == 4
+        assert cli.pool.healthy() == [live.url]
+        assert cli.uploadfile(__file__) in live.files
+
+
+def test_recheck(servers, dead_url):
+    pool = EndpointPool([dead_url, servers[0].url], recheck=0)
+    with PcatsClient(pool) as cli:
+        _submit(cli)
+        # the failed server is tried again at once and fails again
+        _submit(cli)
+    assert pool.endpoints[0].failures == 2
+    assert len(servers[0].jobs) == 2
+
+
+def test_check(servers, dead_url):
+    pool = EndpointPool([dead_url, servers[0].url, servers[1].url])
+    assert pool.check() == {dead_url: False, servers[0].url: True,
+                            servers[1].url: True}
+    assert pool.healthy() == [servers[0].url, servers[1].url]
+    servers[1].stop()
+    pool.check()
+    assert pool.healthy(exclude=[servers[0].url]) == []
+
+
+def test_least_outstanding():
+    pool = EndpointPool({'http://a': 1, 'http://b': 2})
+    pool.acquire('http://a')
+    assert pool.choose() == 'http://b'
+    pool.acquire('http://b')
+    assert pool.choose() == 'http://b'
+    pool.release('http://a')
+    assert pool.choose() == 'http://a'
+    assert pool.choose(exclude=['http://a', 'http://b']) is None
+
+
+def test_weighted():
+    pool = EndpointPool({'http://a': 3, 'http://b': 1, 'http://c': 0},
+                        strategy='weighted', seed=1)
+    counts = Counter(pool.choose() for _ in range(2000))
+    assert 1300 < counts['http://a'] < 1700
+    assert 'http://c' not in counts
+    pool.mark_down('http://a')
+    pool.mark_down('http://b')
+    assert pool.choose() == 'http://c'
+    with pytest.raises(ValueError):
+        EndpointPool([], strategy='weighted')
+    with pytest.raises(ValueError):
+        EndpointPool(['http://a'], strategy='random')
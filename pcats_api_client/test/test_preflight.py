@@ -0,0 +1,60 @@
+"""
+test code for submission preflight checks
+
+can be run with py.test
+"""
+
+import pytest
+
+import pcats_api_client
+from pcats_api_client import PreflightError
+from pcats_api_client.preflight import check, scan
+
+
+@pytest.fixture
+def datafile(tmp_path):
+    path = tmp_path / "data.csv"
+    rows = ["y,tr,x1,x2,grp"]
+    rows += ["{},{},{},NA,{}".format(i * 0.5, i % 2, i, "ab"[i % 2])
+             for i in range(100)]
+    path.write_text("\n".join(rows) + "\n")
+    return str(path)
+
+
+def test_scan(datafile):
+    columns = scan(datafile, sample_rows=10)
+    assert list(columns) == ["y", "tr", "x1", "x2", "grp"]
+    assert columns["y"].count == 10
+    assert columns["x2"].missing_fraction == 1.0
+    assert columns["y"].is_numeric and not columns["grp"].is_numeric
+
+
+def test_check(datafile):
+    assert check({"datafile": datafile, "outcome": "y", "treatment": "tr",
+                  "x_explanatory": ["x1", "grp"],
+                  "x_categorical": ["grp"]}) == []
+    problems = check({"datafile": datafile, "outcome": "grp",
+                      "outcome_type": "Continuous", "treatment": "trt",
+                      "x_confounding": ["x1", "x2"], "stg1_tr_hte": "z"})
+    assert problems == [
+        "outcome 'grp' is not numeric",
+        "stg1_tr_hte 'z' is not a column of data.csv",
+        "treatment 'trt' is not a column of data.csv",
+        "x_confounding 'x2' is missing in 100% of the rows"]
+    assert check({"datafile": datafile, "outcome": "grp",
+                  "outcome_type": "Discrete"}) == []
+    assert check({"datafile": datafile, "outcome": "y", "treatment": "tr",
+                  "x_explanatory": "x1, grp", "stg1_tr_hte": "x1,z"}) == \
+        ["stg1_tr_hte 'z' is not a column of data.csv"]
+
+
+def test_preflight_before_upload(server, client, datafile):
+    with pytest.raises(PreflightError) as e:
+        client.staticgp(datafile=datafile, outcome="y", treatment="missing")
+    assert e.value.problems == ["treatment 'missing' is not a column of "
+                                "data.csv"]
+    assert server.requests == []
+    assert client.staticgp(datafile=datafile, outcome="y", treatment="tr")
+
+    with pcats_api_client.PcatsClient(server.url, preflight=False) as cli:
+        assert cli.staticgp(datafile=datafile, outcome="y", treatment="no")
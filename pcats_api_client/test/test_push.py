@@ -0,0 +1,71 @@
+"""
+test code for push notification of job completion
+
+can be run with py.test
+"""
+
+import pytest
+import requests
+
+import pcats_api_client
+from pcats_api_client import JobRegistry, ResultCache
+from pcats_api_client.push import WebhookReceiver
+
+
+@pytest.mark.parametrize("channel", ["sse", "longpoll"])
+def test_push_channels(server, client, channel):
+    server.push = (channel,)
+    server.job_duration = 0.3
+    jobid = client.staticgp(outcome="y", treatment="tr")
+    assert client.wait_for_result(jobid) == "Done"
+    assert server.count("GET", "/status") <= 3
+    suffix = "/events" if channel == "sse" else "/status"
+    assert server.count("GET", suffix) >= 1
+
+
+def test_webhook(server):
+    server.push = ("webhook",)
+    server.job_duration = 0.3
+    receiver = WebhookReceiver()
+    try:
+        with pcats_api_client.PcatsClient(server.url, push=receiver) as client:
+            jobid = client.staticgp(outcome="y", treatment="tr")
+            assert client.wait_for_result(jobid) == "Done"
+            # callbacks for jobs nobody waits for are dropped
+            requests.post(receiver.url, json={"jobid": "stray",
+                                              "status": "Done"})
+            assert receiver.futures == {}
+    finally:
+        receiver.close()
+    assert server.count("POST", "/webhook") == 1
+    assert server.count("GET", "/status") == 1
+
+
+def test_push_fallback(server, client):
+    server.job_duration = 0.2
+    jobid = client.staticgp(outcome="y", treatment="tr")
+    assert client.wait_for_result(jobid) == "Done"
+    assert server.count("GET", "/api/capabilities") == 1
+    assert client.poller.polls >= 1
+
+
+def test_push_records_final_status(server, tmp_path):
+    server.push = ("sse",)
+    server.job_duration = 0.2
+    cache = ResultCache(":memory:")
+    registry = JobRegistry(str(tmp_path / "jobs.sqlite"))
+    with pcats_api_client.PcatsClient(server.url, result_cache=cache,
+                                      registry=registry) as client:
+        jobid = client.staticgp(outcome="y", treatment="tr")
+        assert client.wait_for_result(jobid) == "Done"
+        assert server.count("GET", "/status") == 0
+        assert cache.is_done(jobid)
+        assert registry.get(jobid)["status"] == "Done"
+        assert registry.pending() == []
+        total = client.metrics.histogram("pcats_job_seconds", kind="None",
+                                         phase="total")
+        assert total.count == 1
+        first = client.results(jobid)
+        sent = len(server.requests)
+        assert client.results(jobid) == first
+        assert len(server.requests) == sent
@@ -0,0 +1,60 @@
+"""
+test code for the job registry
+
+can be run with py.test
+"""
+
+import time
+
+import pcats_api_client
+from pcats_api_client import JobRegistry
+
+
+def test_registry_records_jobs(server, tmp_path):
+    registry = JobRegistry(str(tmp_path / "jobs.sqlite"))
+    server.job_duration = 0.2
+    with pcats_api_client.PcatsClient(server.url, registry=registry) as cli:
+        jobid = cli.staticgp(datafile=__file__, outcome="y", treatment="tr",
+                             token="secret")
+        child = cli.staticgp_cate(jobid, "x1", 0, 1)
+        assert [j["jobid"] for j in registry.pending()] == [child, jobid]
+        assert cli.wait_for_result(jobid) == "Done"
+    record = registry.get(jobid)
+    assert record["endpoint"] == "staticgp"
+    assert record["params"]["outcome"] == "y"
+    assert "token" not in record["params"]
+    assert record["status"] == "Done"
+    assert record["result"] == server.url + "/api/job/{}/results".format(jobid)
+    assert [s for s, _ in registry.transitions(jobid)][-1] == "Done"
+    assert registry.find(endpoint="staticgp.cate")[0]["params"]["jobid"] == jobid
+    assert len(registry.find(fingerprint=record["fingerprint"])) == 1
+
+
+def test_registry_reattach(server, tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    server.job_duration = 0.2
+    with pcats_api_client.PcatsClient(server.url,
+                                      registry=JobRegistry(path)) as cli:
+        jobids = [cli.staticgp(outcome="y", treatment="tr", seed=seed)
+                  for seed in range(3)]
+    # another process
+    registry = JobRegistry(path)
+    with pcats_api_client.PcatsClient(server.url) as cli:
+        futures = registry.reattach(cli)
+        assert sorted(futures) == sorted(jobids)
+        assert [f.result(10) for f in futures.values()] == ["Done"] * 3
+    assert registry.pending() == []
+    assert server.count("POST", "/staticgp") == 3
+
+
+def test_registry_find_many():
+    registry = JobRegistry(":memory:")
+    for i in range(5000):
+        registry.add("job{}".format(i), "staticgp", {"seed": i})
+        if i % 2:
+            registry.update("job{}".format(i), "Done")
+    start = time.monotonic()
+    assert len(registry.pending()) == 2500
+    assert len(registry.find(status="Done", limit=10)) == 10
+    assert time.monotonic() - start < 1
+    assert len(registry) == 5000
@@ -0,0 +1,41 @@
+"""
+test code for parsed results
+
+can be run with py.test
+"""
+
+import json
+
+import pytest
+
+from pcats_api_client import PcatsResult
+
+
+DOC = {"ATE": [{"contrast": "1 - 0", "est": 1.25, "sd": 0.5}],
+       "n": [100], "note": "braces } ] in \"text\"", "seed": -5.0e3,
+       "ok": True, "missing": None, "CATE": {"x": ["a", "b"], "est": [1, 2]}}
+
+
+def test_result_sections():
+    for raw in (json.dumps(DOC), json.dumps(DOC, indent=2).encode()):
+        result = PcatsResult(raw)
+        assert result.keys() == list(DOC)
+        assert not result._sections
+        assert result.ate == DOC["ATE"]
+        assert list(result._sections) == ["ATE"]
+        assert all(result[key] == DOC[key] for key in DOC)
+        assert result.prte is None
+
+
+def test_results_parse(server, client):
+    jobid = client.staticgp(outcome="y", treatment="tr")
+    result = client.results(jobid, parse=True)
+    assert result["jobid"] == jobid
+    assert result.ate[1]["est"] == 2.5
+
+
+def test_result_tables():
+    pytest.importorskip("pandas")
+    result = PcatsResult(json.dumps(DOC))
+    assert list(result.dataframe("CATE")["est"]) == [1, 2]
+    assert result.array("ATE").tolist() == [[1.25, 0.5]]
@@ -0,0 +1,54 @@
+"""
+test code for the result cache
+
+can be run with py.test
+"""
+
+import pcats_api_client
+from pcats_api_client import ResultCache
+
+
+def test_result_cache(server, tmp_path):
+    datafile = tmp_path / "data.csv"
+    datafile.write_text("y,tr\n1,0\n2,1\n")
+    path = str(tmp_path / "results.sqlite")
+    for run in range(2):
+        cache = ResultCache(path)
+        with pcats_api_client.PcatsClient(server.url,
+                                          result_cache=cache) as client:
+            jobid = client.staticgp(datafile=str(datafile), outcome="y",
+                                    treatment="tr")
+            assert client.wait_for_result(jobid) == "Done"
+            res = client.results(jobid)
+            out = client.printgp(jobid)
+            cate = client.staticgp_cate(jobid, "x", "0", "1")
+        cache.close()
+        if run == 0:
+            requests = len(server.requests)
+    assert jobid in res and jobid in out
+    assert len(server.jobs) == 2
+    # the second run was served entirely from the cache
+    assert len(server.requests) == requests
+
+
+def test_result_cache_fingerprint(tmp_path):
+    datafile = tmp_path / "data.csv"
+    datafile.write_text("y,tr\n1,0\n")
+    copy = tmp_path / "copy.csv"
+    copy.write_text("y,tr\n1,0\n")
+    cache = ResultCache(":memory:")
+    fp = cache.fingerprint("/api/staticgp", {"datafile": str(datafile),
+                                             "seed": 1, "token": "a"})
+    assert fp == cache.fingerprint("/api/staticgp", {"datafile": str(copy),
+                                                     "seed": 1, "token": "b"})
+    assert fp != cache.fingerprint("/api/staticgp", {"datafile": str(copy),
+                                                     "seed": 2})
+
+
+def test_result_cache_eviction():
+    cache = ResultCache(":memory:", max_bytes=25)
+    for i in range(3):
+        cache.put("job{}".format(i), "results", b"x" * 10)
+    assert cache.size() == 20
+    assert cache.get("job0", "results") is None
+    assert cache.get("job2", "results") == b"x" * 10
@@ -0,0 +1,80 @@
+"""
+test code for retries and the circuit breaker
+
+can be run with py.test
+"""
+
+import pytest
+
+import pcats_api_client
+from pcats_api_client import CircuitBreaker, CircuitOpenError, RetryPolicy
+from pcats_api_client.poller import Backoff
+from pcats_api_client.retry import parse_retry_after
+
+
+def fast_retry(**kwargs):
+    return RetryPolicy(backoff=Backoff(0.01, 2, 0.05), **kwargs)
+
+
+def test_retry_transient_get(server):
+    with pcats_api_client.PcatsClient(server.url, retry=fast_retry()) as client:
+        jobid = client.staticgp(outcome="y", treatment="tr")
+        server.inject("GET", "/status", 503, "drop", (429, {"Retry-After": "0"}))
+        assert client.wait_for_result(jobid) == "Done"
+        assert client.metrics.total("pcats_request_retries") == 3
+
+
+def test_retry_random_failures(server):
+    server.failure_rate = 0.3
+    with pcats_api_client.PcatsClient(server.url,
+                                      retry=fast_retry(total=20)) as client:
+        jobids = [client.staticgp(outcome="y", treatment="tr", seed=seed)
+                  for seed in range(10)]
+        assert [client.wait_for_result(j) for j in jobids] == ["Done"] * 10
+        assert len(server.jobs) == 10
+        assert client.metrics.total("pcats_request_retries") > 0
+
+
+def test_retry_disabled(server):
+    with pcats_api_client.PcatsClient(server.url, retry=False) as client:
+        jobid = client.staticgp(outcome="y", treatment="tr")
+        server.inject("GET", "/status", 502)
+        assert client.job_status(jobid) is None
+
+
+def test_idempotent_submission(server, tmp_path):
+    datafile = tmp_path / "data.csv"
+    datafile.write_text("y,tr\n1,0\n")
+    with pcats_api_client.PcatsClient(server.url, retry=fast_retry()) as client:
+        # the server accepted the job but the answer was lost
+        server.inject("POST", "/api/staticgp", 502, after=True)
+        jobid = client.staticgp(datafile=str(datafile), outcome="y",
+                                treatment="tr", compress="gzip")
+    assert list(server.jobs) == [jobid]
+    assert server.jobs[jobid]["fields"]["data"] == b"y,tr\n1,0\n"
+    keys = [r[2]["Idempotency-Key"] for r in server.requests
+            if r[0] == "POST"]
+    assert len(keys) == 2 and keys[0] == keys[1]
+
+
+def test_circuit_breaker(server):
+    breaker = CircuitBreaker(threshold=2, reset_timeout=0.2)
+    with pcats_api_client.PcatsClient(server.url, retry=False,
+                                      breaker=breaker) as client:
+        jobid = client.staticgp(outcome="y", treatment="tr")
+        server.inject("GET", "/status", 503, 503)
+        client.job_status(jobid)
+        client.job_status(jobid)
+        sent = len(server.requests)
+        with pytest.raises(CircuitOpenError):
+            client.job_status(jobid)
+        assert len(server.requests) == sent
+        # the poller rides out the open circuit
+        assert client.wait_for_result(jobid) == "Done"
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
@@ -0,0 +1,77 @@
+"""
+test code for the multipart forms of the submit endpoints
+
+can be run with py.test
+"""
+
+import inspect
+
+from pcats_api_client import pcats_api
+from pcats_api_client.schema import (CATE, DYNAMICGP, STATICGP, VECTOR,
+                                     Field)
+
+
+def _params(function, **kwargs):
+    p = dict((name, param.default) for name, param in
+             inspect.signature(function).parameters.items())
+    p.update(kwargs)
+    return p
+
+
+def test_schemas_cover_the_arguments():
+    for schema, function in ((STATICGP, pcats_api.staticgp),
+                             (DYNAMICGP, pcats_api.dynamicgp),
+                             (CATE, pcats_api.staticgp_cate)):
+        accepted = inspect.signature(function).parameters
+        assert [arg for arg in schema.args if arg not in accepted] == []
+        assert len(set(f.name for f in schema.fields)) == len(schema.fields)
+    assert len(DYNAMICGP.fields) == 48
+
+
+def test_unset_fields_dropped():
+    data, headers = STATICGP.form(_params(pcats_api.staticgp, outcome="y",
+                                          treatment="tr", dataref="ref"))
+    assert data == {"dataref": (None, "ref"), "method": (None, "BART"),
+                    "outcome": (None, "y"), "treatment": (None, "tr"),
+                    "outcome.type": (None, "Continuous"),
+                    "outcome.bound_censor": (None, "neither"),
+                    "outcome.link": (None, "identity"),
+                    "tr.type": (None, "Discrete"), "burn.num": (None, 500),
+                    "mcmc.num": (None, 500), "seed": (None, 5000)}
+    assert headers == {}
+
+
+def test_vectors():
+    data, _ = DYNAMICGP.form(_params(
+        pcats_api.dynamicgp, stg1_x_explanatory=["x1", "x2"],
+        stg2_tr_values=(0.5, 1), stg2_tr1_hte="x3", x_categorical=["x2"]))
+    assert data["stg1.x.explanatory"] == (None, "x1,x2")
+    assert data["stg2.tr.values"] == (None, "0.5,1")
+    assert data["stg2.tr1.hte"] == (None, "x3")
+    assert data["x.categorical"] == (None, "x2")
+
+
+def test_cache_headers():
+    p = _params(pcats_api.staticgp, use_cache="0", reuse_cached_jobid=1)
+    assert STATICGP.form(p)[1] == {"X-API-Cache": "0",
+                                   "X-API-Reuse-Cached-Jobid": "1"}
+    p = dict(jobid="j", x="x1", control_tr=0, treat_tr=1, use_cache="0")
+    data, headers = CATE.form(p)
+    assert headers == {}
+    assert data["control.tr"] == (None, 0)
+
+
+def test_extend():
+    schema = STATICGP.extend([Field("weights", VECTOR)])
+    data, _ = schema.form(dict(weights=[1, 2]))
+    assert data == {"weights": (None, "1,2")}
+    assert len(schema.fields) == len(STATICGP.fields) + 1
+
+
+def test_submission_sends_set_fields(client, server):
+    jobid = pcats_api.staticgp(datafile=__file__, outcome="y",
+                               treatment="tr", x_explanatory=["x1", "x2"],
+                               client=client)
+    fields = server.jobs[jobid]["fields"]
+    assert fields["x.explanatory"] == b"x1,x2"
+    assert "mi.dataref" not in fields and "tr.values" not in fields
@@ -0,0 +1,106 @@
+"""
+test code for streaming job progress and results
+
+can be run with py.test
+"""
+
+import json
+
+import pytest
+
+from pcats_api_client import PcatsClient, ResultCache
+from pcats_api_client.stream import SectionParser, stream_results
+
+from stub_server import StubServer
+
+
+def _collect(updates):
+    """Return (statuses, progress values, {section: value}) of updates"""
+    statuses, progress, sections = [], [], dict()
+    for update in updates:
+        if update.kind == 'status':
+            statuses.append(update.value)
+        elif update.kind == 'progress':
+            progress.append(update.value['progress'])
+        elif update.kind == 'section':
+            sections[update.name] = update.value
+        else:
+            sections.setdefault(update.name, []).extend(update.value)
+    return statuses, progress, sections
+
+
+def _parse(text, size, batch_rows=2):
+    parser = SectionParser(batch_rows)
+    updates = []
+    for i in range(0, len(text), size):
+        updates.extend(parser.feed(text[i:i + size]))
+    updates.extend(parser.feed('', final=True))
+    return parser, updates
+
+
+def test_section_parser():
+    document = {"n": 12345, "ok": True, "name": "a \"}]\" b", "empty": [],
+                "ATE": [{"est": 1.5, "sd": [1, 2]}, {"est": -2e-3}, 7],
+                "PrTE": {"c": [0, 1], "prob": [0.9, 0.4]}}
+    text = json.dumps(document, indent=1)
+    for size in (1, 3, 7, len(text)):
+        parser, updates = _parse(text, size)
+        assert _collect(updates)[2] == document
+        assert [u.kind for u in updates if u.name == 'ATE'] == ['rows'] * 2
+        assert parser.buffer == ''
+    with pytest.raises(ValueError):
+        _parse('{"a": [1, 2', 4)
+    with pytest.raises(ValueError):
+        _parse('[1, 2]', 4)
+
+
+def test_bounded_buffer():
+    rows = [{"draw": i, "ate": 1.25} for i in range(5000)]
+    text = json.dumps({"samples": rows})
+    parser = SectionParser(100)
+    longest = 0
+    seen = 0
+    for i in range(0, len(text), 4096):
+        for update in parser.feed(text[i:i + 4096]):
+            assert len(update.value) == 100
+            seen += len(update.value)
+        longest = max(longest, len(parser.buffer))
+    parser.feed('', final=True)
+    assert seen == 5000
+    assert longest < 100
+
+
+@pytest.mark.parametrize("push", [(), ("sse",)])
+def test_stream_results(push):
+    with StubServer(job_duration=0.6, queue_duration=0.1, push=push,
+                    result_rows=2500) as server:
+        cache = ResultCache(':memory:')
+        with PcatsClient(server.url, result_cache=cache) as cli:
+            jobid = cli.staticgp(datafile=__file__, outcome="y",
+                                 treatment="tr")
+            updates = list(cli.stream_results(jobid, batch_rows=1000))
+            assert cache.is_done(jobid)
+    statuses, progress, sections = _collect(updates)
+    assert statuses == ["Pending", "Running", "Done"]
+    assert progress and all(0 < p <= 1 for p in progress)
+    assert sections == server.results(jobid)
+    assert [len(u.value) for u in updates if u.name == 'samples'] == \
+        [1000, 1000, 500]
+
+
+def test_stream_from_result_cache(server):
+    cache = ResultCache(':memory:')
+    with PcatsClient(server.url, result_cache=cache) as cli:
+        jobid = cli.staticgp(datafile=__file__, outcome="y", treatment="tr")
+        cli.wait_for_result(jobid)
+        expected = cli.results(jobid, parse=False)
+        requests = len(server.requests)
+        statuses, _, sections = _collect(stream_results(jobid, client=cli))
+        assert len(server.requests) == requests
+    assert statuses == ["Done"]
+    assert sections == json.loads(expected)
+
+
+def test_unknown_job(client):
+    updates = list(stream_results("no-such-job", client=client))
+    assert [(u.kind, u.value) for u in updates] == [('status', "Error")]
@@ -0,0 +1,82 @@
+"""
+test code for parameter sweeps
+
+can be run with py.test
+"""
+
+import json
+
+import pytest
+
+from pcats_api_client import Sweep, expand_grid
+
+
+def test_expand_grid_dedupes():
+    configs = expand_grid({"seed": [5000, 1, 5000],
+                           "tr_hte": [{"x1", "x2"}, {"x2", "x1"}]},
+                          base={"outcome": "y", "seed": 5000})
+    assert len(configs) == 2
+    assert configs[0]["tr_hte"] == ["x1", "x2"]
+    assert len(expand_grid({"burn_num": [500, None]})) == 2
+    assert len(expand_grid({"mcmc_num": [500]}, base={})) == 1
+
+
+def test_sweep(server, client, tmp_path):
+    manifest = tmp_path / "sweep.json"
+    base = {"datafile": __file__, "outcome": "y", "treatment": "tr"}
+    grid = {"method": ["GP", "BART"], "seed": [1, 2, 3]}
+    sweep = Sweep(grid, base=base, manifest=str(manifest), max_workers=3,
+                  client=client)
+    out = list(sweep.run())
+    assert len(out) == 6
+    assert all(status == "Done" for _, status, _ in out)
+    assert server.count("POST", "/uploadfile") == 1
+    assert server.count("POST", "/staticgp") == 6
+
+    table = sweep.table("ATE")
+    assert len(table["seed"]) == 12
+    assert table["est"][:2] == [1.25, 2.5]
+    assert set(zip(table["method"], table["seed"])) == \
+        set((m, s) for m in grid["method"] for s in grid["seed"])
+
+    state = json.loads(manifest.read_text())
+    assert all(job["status"] == "Done" for job in state["jobs"].values())
+
+
+def test_sweep_resume(server, client, tmp_path):
+    manifest = tmp_path / "sweep.json"
+    base = {"outcome": "y", "treatment": "tr"}
+    first = Sweep({"seed": [1, 2]}, base=base, manifest=str(manifest),
+                  client=client)
+    list(first.run())
+    second = Sweep({"seed": [1, 2, 3]}, base=base, manifest=str(manifest),
+                   client=client)
+    assert len(list(second.run())) == 3
+    assert server.count("POST", "/staticgp") == 3
+    assert len(second.table("PrTE")["prob"]) == 6
+
+
+def test_sweep_concurrent_saves(server, client, tmp_path):
+    manifest = tmp_path / "sweep.json"
+    sweep = Sweep({"seed": list(range(40))},
+                  base={"outcome": "y", "treatment": "tr"},
+                  manifest=str(manifest), max_workers=16, client=client)
+    out = list(sweep.run())
+    assert len(out) == 40
+    assert all(status == "Done" for _, status, _ in out)
+    state = json.loads(manifest.read_text())
+    assert len(state["jobs"]) == 40
+    assert all(job["jobid"] for job in state["jobs"].values())
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_sweep_dataframe(server, client):
+    pandas = pytest.importorskip("pandas")
+    frame = pandas.DataFrame({"y": [0.5, 1.0, 1.5], "tr": [0, 1, 0]})
+    sweep = Sweep({"seed": [1, 2]},
+                  base={"datafile": frame, "outcome": "y", "treatment": "tr"},
+                  client=client)
+    out = list(sweep.run())
+    assert [status for _, status, _ in out] == ["Done", "Done"]
+    assert server.count("POST", "/uploadfile") == 1
+    assert server.count("POST", "/staticgp") == 2
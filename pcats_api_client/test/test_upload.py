@@ -0,0 +1,53 @@
+"""
+test code for streaming and resumable uploads
+
+can be run with py.test
+"""
+
+import os
+
+from pcats_api_client.upload import MultipartStream, upload_resumable
+
+
+def test_streamed_upload(server, client, tmp_path):
+    datafile = tmp_path / "data.csv"
+    content = b"y,tr\n" + b"1,0\n" * 100000
+    datafile.write_bytes(content)
+    progress = []
+    fileref = client.uploadfile(str(datafile),
+                                progress=lambda sent, total: progress.append(sent))
+    assert server.files[fileref] == content
+    assert len(progress) > 1
+    assert progress[-1] > len(content)
+
+
+def test_multipart_stream_reads_in_blocks(tmp_path):
+    datafile = tmp_path / "data.csv"
+    datafile.write_bytes(b"x" * 100)
+    with open(str(datafile), "rb") as f:
+        body = MultipartStream({"data": ("data.csv", f), "seed": (None, 1),
+                                "dataref": (None, None)})
+        chunks = iter(lambda: body.read(7), b"")
+        assert len(b"".join(chunks)) == len(body)
+    assert b'name="dataref"' not in MultipartStream({"dataref": (None, None)}).read()
+
+
+def test_resumable_upload(server, client, tmp_path):
+    datafile = tmp_path / "data.csv"
+    content = os.urandom(100000)
+    datafile.write_bytes(content)
+    server.drop_patches = {3, 4}
+    progress = []
+    fileref = upload_resumable(str(datafile), chunk_size=16384,
+                               progress=lambda done, total: progress.append(done),
+                               client=client)
+    assert server.files[fileref] == content
+    assert progress[-1] == len(content)
+
+
+def test_resumable_upload_fallback(server, client, tmp_path):
+    server.resumable = False
+    datafile = tmp_path / "data.csv"
+    datafile.write_bytes(b"y,tr\n1,0\n")
+    fileref = upload_resumable(str(datafile), client=client)
+    assert server.files[fileref] == b"y,tr\n1,0\n"
@@ -0,0 +1,51 @@
+"""
+test code for the upload cache
+
+can be run with py.test
+"""
+
+import shutil
+
+import pcats_api_client
+from pcats_api_client import UploadCache
+
+
+def test_upload_cache(server, tmp_path):
+    datafile = tmp_path / "data.csv"
+    datafile.write_text("y,tr\n1,0\n2,1\n")
+    cache = UploadCache(str(tmp_path / "uploads.sqlite"))
+    with pcats_api_client.PcatsClient(server.url, upload_cache=cache) as client:
+        jobs = [client.staticgp(datafile=str(datafile), outcome="y",
+                                treatment="tr", seed=seed) for seed in range(3)]
+        assert all(jobid in server.jobs for jobid in jobs)
+        assert server.count("POST", "/api/uploadfile") == 1
+        fileref = server.jobs[jobs[2]]["fields"]["dataref"].decode()
+        assert "data" not in server.jobs[jobs[2]]["fields"]
+
+        copy = tmp_path / "copy.csv"
+        shutil.copy(str(datafile), str(copy))
+        assert client.uploadfile(str(copy)) == fileref
+        assert server.count("POST", "/api/uploadfile") == 1
+
+        # the server forgot the file: the stale reference is replaced
+        server.files.clear()
+        jobid = client.staticgp(datafile=str(datafile), outcome="y",
+                                treatment="tr")
+        assert jobid in server.jobs
+        assert server.count("POST", "/api/uploadfile") == 2
+
+        # an invalid argument is not blamed on the cached upload
+        assert client.staticgp(datafile=str(datafile), outcome="y",
+                               treatment="tr", method="nope") is None
+        assert server.count("POST", "/api/uploadfile") == 2
+        assert server.count("POST", "/api/staticgp") == 6
+
+
+def test_upload_cache_eviction(tmp_path):
+    cache = UploadCache(":memory:", max_entries=2)
+    for i in range(3):
+        cache.put("key{}".format(i), "ref{}".format(i))
+    assert len(cache) == 2
+    assert cache.get("key0") is None
+    cache.ttl = -1
+    assert cache.get("key2") is None
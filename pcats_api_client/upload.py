@@ -0,0 +1,306 @@
+"""
+Streaming and resumable uploads of data files.
+"""
+
+import base64
+import io
+import os
+import time
+import uuid
+
+import requests
+
+from . import pcats_api
+
+TUS_VERSION = '1.0.0'
+
+
+def _length(f):
+    """Return the bytes left in a file object, None if it cannot seek"""
+    try:
+        pos = f.tell()
+        f.seek(0, io.SEEK_END)
+        end = f.tell()
+        f.seek(pos)
+    except (AttributeError, OSError, ValueError):
+        return None
+    return end - pos
+
+
+class MultipartStream(object):
+    """multipart/form-data body streamed from its parts in bounded memory.
+
+    Behaves as a read-only file of known length so that ``requests`` sends
+    it with a Content-Length header, reading the data files a block at a
+    time instead of building the whole body in memory. When a part cannot
+    tell its length (e.g. a data frame serialized on the fly) len is None
+    and the body is sent with chunked transfer encoding instead.
+
+    Parameters
+    ----------
+    fields : dict
+            requests style fields {name: (filename, value)}. Values are
+            file objects, bytes or anything convertible to str; None values
+            are skipped.
+    progress : callable
+            Called with (bytes sent, total bytes) after each block.
+    """
+
+    def __init__(self, fields, progress=None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary={}'.format(
+            self.boundary)
+        self.progress = progress
+        self._parts = []
+        for name, (filename, value) in fields.items():
+            if value is None:
+                continue
+            if filename is not None:
+                header = ('--{}\r\nContent-Disposition: form-data; '
+                          'name="{}"; filename="{}"\r\n'
+                          'Content-Type: application/octet-stream\r\n\r\n'
+                          ).format(self.boundary, name, filename)
+            else:
+                header = ('--{}\r\nContent-Disposition: form-data; '
+                          'name="{}"\r\n\r\n').format(self.boundary, name)
+            if not hasattr(value, 'read') and not isinstance(value, bytes):
+                value = str(value).encode('utf-8')
+            self._parts.extend([header.encode('utf-8'), value, b'\r\n'])
+        self._parts.append('--{}--\r\n'.format(self.boundary).encode('utf-8'))
+        lengths = [len(p) if isinstance(p, bytes) else _length(p)
+                   for p in self._parts]
+        self.len = None if None in lengths else sum(lengths)
+        self._starts = [p.tell() if n is not None else None
+                        for p, n in zip(self._parts, lengths)
+                        if not isinstance(p, bytes)]
+        self.sent = 0
+        self._index = 0
+        self._offset = 0
+
+    def rewind(self):
+        """Restart the body from the beginning, e.g. to retry a request"""
+        files = [p for p in self._parts if not isinstance(p, bytes)]
+        for f, start in zip(files, self._starts):
+            if start is not None:
+                f.seek(start)
+            else:
+                f.rewind()
+        self.sent = 0
+        self._index = 0
+        self._offset = 0
+
+    def __len__(self):
+        return self.len
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b''.join(iter(lambda: self.read(1 << 20), b''))
+        out = []
+        while size > 0 and self._index < len(self._parts):
+            part = self._parts[self._index]
+            if isinstance(part, bytes):
+                chunk = part[self._offset:self._offset + size]
+                self._offset += len(chunk)
+                done = self._offset >= len(part)
+            else:
+                chunk = part.read(size)
+                done = not chunk
+            if done:
+                self._index += 1
+                self._offset = 0
+            out.append(chunk)
+            size -= len(chunk)
+        data = b''.join(out)
+        self.sent += len(data)
+        if self.progress is not None and data:
+            self.progress(self.sent, self.len)
+        return data
+
+    def close(self):
+        """Close the file objects of the parts"""
+        for part in self._parts:
+            if hasattr(part, 'close'):
+                part.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ChunkedBody(object):
+    """Iterable of the blocks of a stream of unknown length.
+
+    Sent by ``requests`` with chunked transfer encoding; rewind() restarts
+    the stream for a retry.
+    """
+
+    def __init__(self, stream, chunk_size=1 << 16):
+        self.stream = stream
+        self.chunk_size = chunk_size
+
+    @property
+    def sent(self):
+        return self.stream.sent
+
+    def rewind(self):
+        self.stream.rewind()
+
+    def __iter__(self):
+        return iter(lambda: self.stream.read(self.chunk_size), b'')
+
+
+def post_multipart(cli, path, fields, headers=None, token=None, progress=None,
+                   compress=None, datafiles=()):
+    """POST fields as a streamed multipart body and close the data files
+
+    The body is compressed on the fly as chosen by compress (the client's
+    default if None) for the given data files, see compression.choose_encoding.
+    """
+    from .compression import CompressedBody, choose_encoding
+    encoding = choose_encoding(compress if compress is not None
+                               else cli.compress, datafiles)
+    with MultipartStream(fields, progress) as body:
+        headers = dict(headers) if headers else dict()
+        headers['Content-Type'] = body.content_type
+        data = body
+        if encoding is not None:
+            headers['Content-Encoding'] = encoding
+            data = CompressedBody(body, encoding)
+        elif body.len is None:
+            data = ChunkedBody(body)
+        start = time.perf_counter()
+        res = cli.post(path, data=data, headers=headers, token=token)
+        elapsed = time.perf_counter() - start
+    if encoding is None:
+        cli.stats.add(uploads=1, upload_bytes=body.sent,
+                      upload_seconds=elapsed)
+    else:
+        cli.stats.add(uploads=1, upload_bytes=data.sent,
+                      upload_seconds=elapsed,
+                      compressed_raw_bytes=data.raw,
+                      compressed_sent_bytes=data.sent,
+                      compress_seconds=data.seconds)
+    return res
+
+
+def upload_resumable(datafile,
+                     token=None,
+                     chunk_size=8 << 20,
+                     progress=None,
+                     retries=5,
+                     upload_url=None,
+                     client=None):
+    """Upload a file in chunks, resuming after network failures
+
+    Uses the tus resumable upload protocol (core 1.0.0) at /api/upload.
+    Each chunk is read from disk only when it is sent; after a failed
+    chunk the server is asked how much it has received and the upload
+    continues from that offset. Falls back to a streamed single request
+    upload when the server does not offer resumable uploads. With an
+    endpoint pool the whole upload goes to one server, which then owns
+    the returned file reference.
+
+    Parameters
+    ----------
+    datafile : string
+            File to upload (.csv or .xls)
+    token : string
+            Authentication token.
+    chunk_size : int
+            Bytes sent per request.
+    progress : callable
+            Called with (bytes received by the server, total bytes).
+    retries : int
+            Consecutive failed chunks tolerated before giving up.
+    upload_url : string
+            URL of an interrupted upload to continue. With an endpoint pool
+            it must be on one of the pool's servers.
+    client : PcatsClient
+            Client to use (the shared default client if not given).
+
+    Returns
+    -------
+    backend filename reference
+    """
+
+    cli = pcats_api._client(client)
+    owner = None
+    if cli.pool is not None and upload_url is not None:
+        owner = next((url for url in cli.pool.urls
+                      if upload_url.startswith(url + '/')), None)
+        if owner is None:
+            raise ValueError('upload {} is not on a server of the pool '
+                             '{}'.format(upload_url, cli.pool.urls))
+
+    def upload():
+        fileref = _upload_tus(cli, datafile, token, chunk_size, progress,
+                              retries, upload_url)
+        if cli.pool is not None and fileref is not None:
+            cli.pool.assign(fileref, cli.base_url)
+        return fileref
+    return pcats_api._on_server(cli, upload, owner)
+
+
+def _upload_tus(cli, datafile, token, chunk_size, progress, retries,
+                upload_url):
+    size = os.path.getsize(datafile)
+    tus = {'Tus-Resumable': TUS_VERSION}
+    if upload_url is None:
+        name = base64.b64encode(
+            os.path.basename(datafile).encode('utf-8')).decode('ascii')
+        res = cli.post('/api/upload', token=token,
+                       headers=dict(tus, **{'Upload-Length': str(size),
+                                            'Upload-Metadata': 'filename ' + name}))
+        if res.status_code in (404, 405, 501):
+            return pcats_api.uploadfile(datafile, token=token, client=cli,
+                                        progress=progress)
+        if res.status_code != 201:
+            return None
+        upload_url = requests.compat.urljoin(cli.url('/api/upload'),
+                                             res.headers['Location'])
+        offset = 0
+    else:
+        offset = _upload_offset(cli, upload_url, tus, token)
+
+    failures = 0
+    res = None
+    with open(datafile, 'rb') as f:
+        while res is None or offset < size:
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            try:
+                res = cli.request(
+                    'PATCH', upload_url, data=chunk, token=token,
+                    headers=dict(tus, **{
+                        'Upload-Offset': str(offset),
+                        'Content-Type': 'application/offset+octet-stream'}))
+            except requests.ConnectionError:
+                failures += 1
+                if failures > retries:
+                    raise
+                res = None
+                offset = _upload_offset(cli, upload_url, tus, token)
+                continue
+            if res.status_code == 409:
+                res = None
+                offset = _upload_offset(cli, upload_url, tus, token)
+                continue
+            if res.status_code not in (200, 204):
+                return None
+            failures = 0
+            offset = int(res.headers['Upload-Offset'])
+            if progress is not None:
+                progress(offset, size)
+    if res.status_code == 200:
+        res_json = res.json()
+        if 'fileref' in res_json:
+            return res_json['fileref']
+    return None
+
+
+def _upload_offset(cli, upload_url, tus, token):
+    res = cli.request('HEAD', upload_url, headers=tus, token=token)
+    res.raise_for_status()
+    return int(res.headers['Upload-Offset'])
@@ -0,0 +1,174 @@
+"""
+Content addressed cache of uploaded data files.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Arguments that do not change what a job computes
+_IGNORED = ('token', 'client', 'compress', 'use_cache', 'reuse_cached_jobid')
+
+_FILES = ('datafile', 'mi_datafile')
+
+
+def default_cache_dir():
+    """Return the directory holding the client's local caches"""
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or
+                        os.path.join(os.path.expanduser('~'), '.cache'),
+                        'pcats_api_client')
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """Return the SHA-256 hex digest of a file"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class _SqliteStore(object):
+    """SQLite database shared by threads, with memoized file digests"""
+
+    def __init__(self, path, filename):
+        if path is None:
+            os.makedirs(default_cache_dir(), exist_ok=True)
+            path = os.path.join(default_cache_dir(), filename)
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS digests ('
+                            'path TEXT PRIMARY KEY, size INTEGER, '
+                            'mtime INTEGER, digest TEXT)')
+
+    def close(self):
+        self.db.close()
+
+    def digest(self, datafile):
+        """Return the content digest of a file, reusing a memoized value
+
+        In-memory data (a Dataset) is digested by itself; None if that is
+        not possible.
+        """
+        if not isinstance(datafile, (str, os.PathLike)):
+            return datafile.digest() if hasattr(datafile, 'digest') else None
+        path = os.path.abspath(datafile)
+        st = os.stat(path)
+        with self.lock:
+            row = self.db.execute('SELECT size, mtime, digest FROM digests '
+                                  'WHERE path=?', (path,)).fetchone()
+        if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        digest = file_digest(path)
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO digests VALUES (?,?,?,?)',
+                            (path, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def fingerprint(self, endpoint, params):
+        """Return the canonical fingerprint of a submission, or None if
+        its data cannot be digested
+
+        Parameters
+        ----------
+        endpoint : string
+                API path of the submission.
+        params : dict
+                Arguments of the submitting function.
+        """
+        canon = {'endpoint': endpoint}
+        for name, value in params.items():
+            if name in _IGNORED or value is None:
+                continue
+            if name in _FILES:
+                value = self.digest(value)
+                if value is None:
+                    return None
+            canon[name] = value
+        return hashlib.sha256(json.dumps(canon, sort_keys=True, default=str)
+                              .encode('utf-8')).hexdigest()
+
+
+class UploadCache(_SqliteStore):
+    """Map data files to the server references returned by uploadfile.
+
+    Entries are keyed by server URL, SHA-256 of the file content and
+    optionally the sheet name, so renamed or copied files still hit the
+    cache while edited files do not. Digests are memoized by path, size and
+    modification time so unchanged files are not re-hashed. Entries expire
+    after `ttl` seconds and the least recently used ones are evicted above
+    `max_entries`.
+
+    Parameters
+    ----------
+    path : string
+            SQLite database file (":memory:" for a process local cache).
+            The default value is uploads.sqlite in the user cache directory.
+    ttl : float
+            Seconds after which an entry is no longer used (None keeps it).
+    max_entries : int
+            Maximum number of entries kept.
+    """
+
+    def __init__(self, path=None, ttl=7 * 24 * 3600, max_entries=1000):
+        _SqliteStore.__init__(self, path, 'uploads.sqlite')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS uploads ('
+                            'key TEXT PRIMARY KEY, fileref TEXT, '
+                            'created REAL, used REAL)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS uploads_used '
+                            'ON uploads (used)')
+
+    def key(self, base_url, datafile, sheet=None):
+        digest = self.digest(datafile)
+        if digest is None:
+            return None
+        key = '{} {}'.format(base_url, digest)
+        if sheet is not None:
+            key += ' {}'.format(sheet)
+        return key
+
+    def get(self, key):
+        """Return the cached reference for a key or None"""
+        now = time.time()
+        with self.lock, self.db:
+            row = self.db.execute('SELECT fileref, created FROM uploads '
+                                  'WHERE key=?', (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and now - row[1] > self.ttl:
+                self.db.execute('DELETE FROM uploads WHERE key=?', (key,))
+                return None
+            self.db.execute('UPDATE uploads SET used=? WHERE key=?',
+                            (now, key))
+            return row[0]
+
+    def put(self, key, fileref):
+        """Store a reference and evict the least recently used entries"""
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO uploads VALUES (?,?,?,?)',
+                            (key, fileref, now, now))
+            self.db.execute('DELETE FROM uploads WHERE key NOT IN ('
+                            'SELECT key FROM uploads ORDER BY used DESC '
+                            'LIMIT ?)', (self.max_entries,))
+
+    def invalidate(self, fileref):
+        """Forget a reference, e.g. after the server rejected it"""
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM uploads WHERE fileref=?', (fileref,))
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM uploads')
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM uploads').fetchone()[0]
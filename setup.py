@@ -8,6 +8,16 @@ setup(
     packages=['pcats_api_client'],
     # Needed for dependencies
     install_requires=['requests'],
+    extras_require={
+        'async': ['aiohttp'],
+        'zstd': ['zstandard'],
+        'pandas': ['pandas'],
+        'arrow': ['pandas', 'pyarrow'],
+        'yaml': ['pyyaml'],
+    },
+    entry_points={
+        'console_scripts': ['pcats=pcats_api_client.cli:main'],
+    },
     # *strongly* suggested for sharing
     version='1.1.1',
     # The license can be anything you like